@@ -1,4 +1,5 @@
 from flask import Flask, jsonify
+import random
 import sqlite3
 import re
 
@@ -16,10 +17,35 @@ def remove_emote_ids(phrase: str) -> str:
     return phrase
 
 
+GUILD_ID = 747752542741725244
+MAX_SAMPLE_TRIES = 20
+
+
+def sample_quote(conn: sqlite3.Connection):
+    """Picks a uniformly random quote of the guild without sorting the whole table.
+    A random QuoteID between the smallest and largest ID is drawn until it hits a quote
+    of the guild. Only if that fails too often it falls back to ORDER BY RANDOM().
+    """
+    values = "QuoteID, Quote, Name, CreatedAt, Elo"
+    min_id, max_id = conn.execute("SELECT MIN(QuoteID), MAX(QuoteID) FROM Quotes").fetchone()
+    if min_id is None:
+        return None
+    for _ in range(MAX_SAMPLE_TRIES):
+        res = conn.execute(
+            f"SELECT {values} FROM Quotes WHERE QuoteID=? AND DiscordGuildID=?",
+            (random.randint(min_id, max_id), GUILD_ID)).fetchone()
+        if res is not None:
+            return res
+    return conn.execute(f"SELECT {values} FROM Quotes WHERE DiscordGuildID=? ORDER BY RANDOM() LIMIT 1", (GUILD_ID,)).fetchone()
+
+
 @app.route("/api/random-quote")
 def random_quote():
     conn = sqlite3.connect("./data/discord.db")
-    res = conn.execute("SELECT QuoteID, Quote, Name, CreatedAt, Elo FROM Quotes WHERE DiscordGuildID=747752542741725244 ORDER BY RANDOM() LIMIT 1").fetchone()
+    res = sample_quote(conn)
+    conn.close()
+    if res is None:
+        return jsonify({"error": "There are no quotes yet."}), 404
     return jsonify({
         "id": res[0],
         "quote": remove_emote_ids(res[1]),
@@ -5,28 +5,17 @@ import traceback
 import discord
 from discord.ext import commands
 
-from cogs.quote import quote_setup_hook
+from helper import image_jobs
+from helper.sql import AsyncSQLFunctions, SQLFunctions, WALCheckpoint
 
-# makes sure the correct files exist
-from helper import file_creator
-from helper.sql import SQLFunctions
-from dotenv import load_dotenv
-
-file_creator.createFiles()
-
-load_dotenv()
-prefix = os.getenv("BOT_PREFIX")
-guild_id = os.getenv("TEST_GUILD_ID")
-TEST_GUILD = None
-if guild_id:
-    TEST_GUILD = discord.Object(int(guild_id))
-assert prefix
+# Everything with side effects happens in main(). The image job workers are
+# spawned processes, which import this module again as __mp_main__.
 
 
 class Bot(commands.Bot):
-    def __init__(self):
+    def __init__(self, prefix: str, test_guild: discord.Object | None = None):
         intents = discord.Intents()
-        assert prefix  # to shut the linter up
+        self.test_guild = test_guild
         super().__init__(
             command_prefix=prefix,
             intents=intents.all(),
@@ -35,28 +24,56 @@ class Bot(commands.Bot):
         )
 
     async def setup_hook(self):
+        from cogs.quote import quote_setup_hook
+
+        SQLFunctions.pool.open()
+        SQLFunctions.permission_index.load()
+        SQLFunctions.quote_ranking.load()
+        WALCheckpoint.start()
         await self.load_extension("cogs.lecture_updates.slash")
         await self.load_extension("cogs.lecture_updates.task")
         await self.load_extension("cogs.moderate")
-        if TEST_GUILD:
-            self.tree.copy_global_to(guild=TEST_GUILD)
-            synced = await self.tree.sync(guild=TEST_GUILD)
+        if self.test_guild:
+            self.tree.copy_global_to(guild=self.test_guild)
+            synced = await self.tree.sync(guild=self.test_guild)
         else:
             synced = await self.tree.sync()
         print(f"Synced {len(synced)} slash commands")
         await quote_setup_hook(self)
 
+    async def close(self):
+        # closing the bot unloads all cogs, which can still write to the db
+        await super().close()
+        WALCheckpoint.stop()
+        AsyncSQLFunctions.close()
+        image_jobs.close()
+        SQLFunctions.pool.close()
+
 
 async def main():
+    from dotenv import load_dotenv
+
+    # makes sure the correct files exist
+    from helper import file_creator
+
+    # the .env is loaded first, as the migrations already connect with its StorageConfig
+    load_dotenv()
+    file_creator.createFiles()
+
+    prefix = os.getenv("BOT_PREFIX")
+    assert prefix
+    test_guild = None
+    guild_id = os.getenv("TEST_GUILD_ID")
+    if guild_id:
+        test_guild = discord.Object(int(guild_id))
+
     # Load the token
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         print("DISCORD_TOKEN environment variable doesn't exist")
         exit()
 
-    # connects to the db
-    conn = SQLFunctions.connect()
-    async with Bot() as bot:
+    async with Bot(prefix, test_guild) as bot:
         # Loads the sub_bot cog, which can then easily be reloaded
         await bot.load_extension("cogs.mainbot")
 
@@ -80,13 +97,12 @@ async def main():
             command_name = ctx.command.name
             if ctx.command.root_parent is not None:
                 command_name = ctx.command.root_parent.name
-            permission_level = SQLFunctions.get_command_level(
+            permission_level = SQLFunctions.permission_index.get_level(
                 command_name,
                 ctx.message.author.id,
                 role_ids,
                 ctx.message.channel.id,
                 guild_id,
-                conn,
             )
             return permission_level != -1
 
@@ -22,7 +22,7 @@ class Admin(commands.Cog):
         with open(self.bot_prefix_path, "r", encoding="utf8") as f:
             self.all_prefix = json.load(f)
         self.db_path = "./data/discord.db"
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
         self.welcome_message_id = SQLFunctions.get_config("WelcomeMessage", self.conn)
         self.requested_help = []  # list of DiscordUserIDs of who requested help
         self.bot.add_view(WelcomeViewPersistent())
@@ -44,12 +44,18 @@ class Admin(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_remove(self, member):
+        SQLFunctions.invalidate_member(member.id, member.guild.id)
         if member.bot:
             return
         if member.guild.id == 747752542741725244:
             channel = self.bot.get_channel(815936830779555841)
             await self.send_leave_message(channel, member, member.guild)
 
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.nick != after.nick:
+            SQLFunctions.invalidate_member(after.id, after.guild.id)
+
     @commands.Cog.listener()
     async def on_message_delete(self, message):
         if message.author.bot:
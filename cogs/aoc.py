@@ -82,7 +82,7 @@ class AdventOfCode(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db_path = "./data/discord.db"
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
         self.aoc_path = "./data/aoc_data.json"
         self.data: list[AoCMember] = []
         if os.path.isfile(self.aoc_path):
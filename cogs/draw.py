@@ -7,76 +7,33 @@ import aiohttp
 import discord
 from discord.ext import commands, tasks
 from discord.ext.commands.cooldowns import BucketType
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 
 from helper import image2queue as im2q
+from helper import image_jobs
+from helper.image2queue import rgb2hex
 from helper.sql import SQLFunctions
 
 
-def rgb2hex(r, g, b):
-    return '#{:02x}{:02x}{:02x}'.format(r, g, b)
-
-
 def loading_bar_draw(a, b):
     prog = int(10 * a / b)
     return "<:green_box:944973724803817522>" * prog + (10 - prog) * "<:grey_box:944973724371779594>"
 
 
-def modifiers(img: im2q.PixPlace, mods: tuple) -> int:
-    drawn = 0
-    start = -1
-    end = -1
-    for i in range(len(mods)):
-        m = mods[i]
-        last = i == len(mods) - 1
-        if m.startswith("p"):  # percent start
-            if not last:
-                if mods[i + 1].isnumeric():
-                    start = int(mods[i + 1])
-                    i += 1
-        if m.startswith("e"):  # percent end
-            if not last:
-                if mods[i + 1].isnumeric():
-                    end = int(mods[i + 1])
-                    i += 1
-        elif m.startswith("f"):  # flip
-            img.flip()
-        elif m.startswith("c"):  # center
-            img.center_first()
-        elif m.startswith("r"):  # low to high def
-            img.low_to_high_res()
-        elif m.startswith("l"):  # left to right
-            img.left_to_right()
-
-    if start != -1 or end != -1:
-        print("Modfiers", start, end)
-        if start != -1 != end:
-            drawn = img.perc_to_perc(start, end)
-        elif start != -1:
-            drawn = img.resume_progress(start)
-        else:
-            img.end_at(end)
-    return drawn
-
-
-async def create_buffer(ctx, x1, x2, y1, y2):
+async def read_attachment(ctx) -> bytes:
     async with aiohttp.ClientSession() as cs:
         async with cs.get(ctx.message.attachments[0].url) as r:
-            buffer = io.BytesIO(await r.read())
-    im = Image.open(buffer)
-    x1 = int(x1)
-    x2 = int(x2)
-    y1 = int(y1)
-    y2 = int(y2)
-    width, height = im.size
-    if x2 - x1 != width or y2 - y1 != height:
-        im = im.resize((x2 - x1, y2 - y1), Image.NEAREST)
-        buff = io.BytesIO()
-        im.save(buff, format="PNG")
-        buff.seek(0)
-        return buff
-    buffer.seek(0)
-    return buffer
+            return await r.read()
+
+
+def parse_coordinates(x1, x2, y1, y2) -> tuple[tuple[int, int], tuple[int, int]]:
+    """
+    :return: (top left, bottom right)
+    """
+    try:
+        return (int(x1), int(y1)), (int(x2), int(y2))
+    except (ValueError, TypeError):
+        raise ValueError("Not all coordinates given.")
 
 
 def is_valid_msg(msg):
@@ -104,15 +61,14 @@ class Draw(commands.Cog):
         self.background_draw.start() # pylint: disable=no-member
         self.db_path = "./data/discord.db"
         self.place_path = "./place/"
-        self.conn = SQLFunctions.connect()
-        
+        self.conn = SQLFunctions.pool.get()
+        # the text is drawn after the previous text, so only one text can be rendered at a time
+        self.text_lock = asyncio.Lock()
+
         # ensures the /place dir exists
         if not os.path.exists(self.place_path):
             os.mkdir(self.place_path)
 
-        self.LINE_HEIGHT = 62  # amount of lines which fit on the place canvas
-        self.CHAR_WIDTH = 166  # amount of chars which fit in a line on the place canvas
-        self.font = ImageFont.truetype("./config/nk57-monospace-cd-rg.ttf", 12)
         self.userToCopyTextFrom = -1
         self.last_line = SQLFunctions.get_config("Draw_Last_Line", self.conn)
         if len(self.last_line) == 0:
@@ -243,15 +199,40 @@ class Draw(commands.Cog):
         if message.author.id == self.userToCopyTextFrom and message.channel.id != 813430350965375046 and is_valid_msg(message.content):
             if len(self.queue) > 50:
                 return
-            pil_img, self.last_line, self.last_char = self.draw_text(message.content, self.last_line, self.last_char)
-            SQLFunctions.insert_or_update_config("Draw_Last_Line", self.last_line, self.conn)
-            SQLFunctions.insert_or_update_config("Draw_Last_Char", self.last_char, self.conn)
             # id to stop specific draw
             ID = str(random.randint(1000, 10000))
-            img = im2q.PixPlace(ID, ID, False, pil_img=pil_img)
-            img.left_to_right()
+            async with self.text_lock:
+                job = image_jobs.TextJob(ID, message.content, self.last_line, self.last_char)
+                try:
+                    img, self.last_line, self.last_char = await image_jobs.run(job)
+                except image_jobs.QueueFull:
+                    return
+            SQLFunctions.insert_or_update_config("Draw_Last_Line", self.last_line, self.conn)
+            SQLFunctions.insert_or_update_config("Draw_Last_Char", self.last_char, self.conn)
             self.handle_image(img, 0, ID)
 
+    async def run_job(self, ctx, job):
+        """
+        Runs the image job in a worker process and keeps a message
+        in the channel updated with the progress of the job.
+        """
+        if image_jobs.pending() >= image_jobs.MAX_PENDING:
+            await ctx.send("Too many images are being processed right now. Try again later.")
+            raise commands.errors.BadArgument()
+        msg = await ctx.send(f"Queued. `{image_jobs.pending()}` other image jobs are in progress.")
+
+        async def progress(stage, done, total):
+            bar = f"\n{loading_bar_draw(done, total)}" if total > 0 else ""
+            await msg.edit(content=f"{stage}...{bar}")
+
+        try:
+            return await image_jobs.run(job, progress)
+        except image_jobs.QueueFull:
+            await ctx.send("Too many images are being processed right now. Try again later.")
+            raise commands.errors.BadArgument()
+        finally:
+            await msg.delete()
+
     def draw_desc(self, ID):
         if ID not in self.progress:
             return "Project has no info"
@@ -303,16 +284,17 @@ class Draw(commands.Cog):
                 await ctx.send("Command not found. Right now only `cancel`, `image` and `square` exist.")
 
     def handle_image(self, img: im2q.PixPlace, drawn: int, ID: str):
+        queue = img.get_queue()
         self.progress[ID] = {
             "count": drawn,
             "img": img,
-            "queue": img.get_queue()
+            "queue": queue
         }
         self.queue.append({
             "ID": ID,
             "size": img.size,
             "img": img,
-            "queue": img.get_queue()
+            "queue": queue
         })
 
         SQLFunctions.insert_or_update_config(f"Start_{ID}", 0, self.conn)
@@ -342,20 +324,18 @@ class Draw(commands.Cog):
             await ctx.send("No image given")
             raise commands.errors.BadArgument()
         try:
-            buffer = await create_buffer(ctx, x1, x2, y1, y2)
-        except ValueError:
-            await ctx.send("Not all coordinates given.")
+            top_left, bot_right = parse_coordinates(x1, x2, y1, y2)
+        except ValueError as e:
+            await ctx.send(str(e))
             raise commands.errors.BadArgument()
+        data = await read_attachment(ctx)
 
         self.cancel_all = False
 
         # id to stop specific draw
         ID = str(random.randint(1000, 10000))
 
-        top_left = (x1, y1)
-        bot_right = (x2, y2)
-        img = im2q.PixPlace(buffer, ID, top_left=top_left, bot_right=bot_right)
-        drawn = modifiers(img, mods)
+        img, drawn = await self.run_job(ctx, image_jobs.QueueJob(ID, data, top_left, bot_right, mods))
 
         self.handle_image(img, drawn, ID)
 
@@ -380,7 +360,7 @@ class Draw(commands.Cog):
         # id to stop specific draw
         ID = str(random.randint(1000, 10000))
 
-        img = im2q.PixPlace(ID, ID, setup=False, setpixels=setpixels_file)
+        img = await self.run_job(ctx, image_jobs.SetpixelsJob(ID, setpixels_file))
 
         self.handle_image(img, 0, ID)
 
@@ -408,39 +388,14 @@ class Draw(commands.Cog):
             await ctx.send("No image given")
             raise commands.errors.BadArgument()
         try:
-            buffer = await create_buffer(ctx, x1, x2, y1, y2)
-        except ValueError:
-            await ctx.send("Not all coordinates given.")
+            top_left, bot_right = parse_coordinates(x1, x2, y1, y2)
+        except ValueError as e:
+            await ctx.send(str(e))
             raise commands.errors.BadArgument()
-
-        top_left = (x1, y1)
-        bot_right = (x2, y2)
-        img = im2q.PixPlace(buffer, "multi", top_left=top_left, bot_right=bot_right)
-        modifiers(img, mods)
-        pixels_queue = img.get_queue()
+        data = await read_attachment(ctx)
 
         # makes txt files instead
-        file_count = 0
-        files = []
-        while len(pixels_queue) > 0:
-            file_count += 1
-            content = ""
-            pixels_added = 0
-            for i in range(80000):
-                if len(pixels_queue) == 0:
-                    break
-                pix = pixels_queue.pop(0)
-                pX = pix[0]
-                pY = pix[1]
-                pHex = rgb2hex(pix[2], pix[3], pix[4])
-                content += f"{pX} {pY} {pHex}"
-                if len(pixels_queue) != 0:
-                    content += "|"
-                pixels_added += 1
-            filename = f"{file_count}-{pixels_added}.txt"
-            files.append(filename)
-            with open(filename, "a") as f:
-                f.write(content)
+        files = await self.run_job(ctx, image_jobs.SetpixelFilesJob("multi", data, top_left, bot_right, mods))
 
         for f in files:
             file = discord.File(f)
@@ -500,8 +455,10 @@ class Draw(commands.Cog):
         else:
             async with ctx.typing():
                 img = self.progress[ID]["img"]
-                gif = await img.create_gif()
-                file = discord.File(fp=gif, filename="prev.gif")
+                place = await img.get_place()
+                job = image_jobs.GifJob(img.pixel_array, img.top_left_corner, img.bot_right_corner, place)
+                gif = await self.run_job(ctx, job)
+                file = discord.File(fp=io.BytesIO(gif), filename="prev.gif")
             await ctx.send(file=file)
 
     @commands.is_owner()
@@ -562,66 +519,6 @@ class Draw(commands.Cog):
                         im.putpixel((x, y), (r, g, b, a))
         return im, count
 
-    def draw_text(self, text, last_line, last_char) -> tuple[Image.Image, int, int]:
-        img = Image.new("RGBA", (1000, 1000), (0, 0, 0, 0))
-        d = ImageDraw.Draw(img)
-
-        text = " | " + text.replace("\n", " ")
-
-        # splits the text into lines
-        lines, last_char = self.write_lines(text, last_char)
-
-        # draws the lines
-        while len(lines) > 0:
-            empty_lines = ["" for _ in range(last_line)]
-
-            if len(lines) > self.LINE_HEIGHT - last_line:
-                li = lines[:self.LINE_HEIGHT - last_line]
-                lines = lines[self.LINE_HEIGHT - last_line:]
-            else:
-                li = lines
-                lines = []
-
-            last_line = (last_line + len(li)) % self.LINE_HEIGHT
-
-            text = "\n".join(empty_lines + li)
-            r = random.randrange  # for readability on the next line
-            d.text((0, 0), text, fill=(r(256), r(256), r(256), 255), font=self.font)
-
-        if last_char > 0:
-            last_line -= 1
-        return img, last_line, last_char
-
-    def write_lines(self, text: str, last_char: int) -> tuple[list[str], int]:
-        """Last char is the last character of the last line
-
-        Args:
-            text (str): The string which should be split into lines
-            last_char (int): The last character of the last line
-
-        Returns:
-            (list[str], int): A list with all the lines and an int where the last character was placed.
-        """
-        lines = []
-        while len(text) > 0:
-            t = " " * last_char  # we add spaces to move the text to the right by enough
-            chars_added = 0  # amount of characters added to the line
-
-            # if the text is too long to add to the line, we cut it so it fits perfectly
-            if len(text) > self.CHAR_WIDTH - last_char:
-                t += text[:self.CHAR_WIDTH - last_char]
-                chars_added = len(text[:self.CHAR_WIDTH - last_char])
-                text = text[self.CHAR_WIDTH - last_char:]
-            else:
-                t += text
-                chars_added = len(text)
-                text = ""
-
-            last_char = (last_char + chars_added) % self.CHAR_WIDTH
-            lines.append(t)
-
-        return lines, last_char
-
 
 async def setup(bot):
     await bot.add_cog(Draw(bot))
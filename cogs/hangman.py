@@ -1,3 +1,5 @@
+import asyncio
+import os
 import random
 import string
 
@@ -17,6 +19,11 @@ class Hangman(commands.Cog):
         self.bot = bot
         self.sending = False
 
+    async def cog_load(self):
+        # loads the word lists in the background, so the first games don't have to wait for them
+        if os.getenv("HANGMAN_PRELOAD") in ["true", "t", "1"]:
+            asyncio.get_running_loop().run_in_executor(None, hangman.word_lists.warm_up)
+
     def clean_string(self, inp):
         inp = inp.lower()
         valid = string.ascii_lowercase + "_äöüàéè"
@@ -35,7 +42,9 @@ class Hangman(commands.Cog):
         The game ends after **100** seconds.
         """
         if ctx.invoked_subcommand is None:
-            await ctx.send(view=HangmanGuesserView(ctx.author, ctx.message))
+            view = HangmanGuesserView(ctx.author, ctx.message)
+            await view.load_words()
+            await ctx.send(view=view)
 
     @commands.cooldown(1, 5, BucketType.user)
     @hangman.command(name="solve", usage="solve <word up till now> <wrong letters or 0> <language>")
@@ -68,7 +77,8 @@ class Hangman(commands.Cog):
                     return
 
                 # Sets up the variables
-                result = hangman.solve(inputted_word, list(unused_letters), language)
+                # the word list might still have to be loaded, which takes seconds for the big lists
+                result = await asyncio.to_thread(hangman.solve, inputted_word, list(unused_letters), language)
                 alphabet = result[0]
                 fitting_words = result[1]
                 total = sum(alphabet.values())
@@ -140,15 +150,27 @@ class HangmanGuesserView(discord.ui.View):
     def __init__(self, user: discord.Member | discord.User, message: discord.Message):
         super().__init__()
         self.word_length = random.randint(5, 15)
-        self.previous = []
         self.ignored = []
         self.current_word = ["_"] * self.word_length
         self.guesses = 0
         self.user = user
         self.message = message
         self.sent_message: discord.Message | None = None
+        self.words: hangman.WordList | None = None
+        self.candidates = 0  # bitset of the words that are still possible, set by load_words()
         
         self.add_item(LetterSelect(self.ignored, self.current_word, self.callback))
+
+    async def load_words(self):
+        """
+        Loads the word list of the current word length and finds the words fitting the guesses so far.
+        Building the index of a big word list takes seconds, so it's done outside of the event loop.
+        """
+        self.words = await asyncio.to_thread(hangman.word_lists.get, "english", self.word_length)
+        if self.words is None:
+            self.candidates = 0
+        else:
+            self.candidates = hangman.get_fitting(self.words, "".join(self.current_word), self.ignored)
     
     async def callback(self, interaction: discord.Interaction, guess: str):
         """
@@ -161,10 +183,13 @@ class HangmanGuesserView(discord.ui.View):
             return
 
         self.ignored.append(guess)
-        letter_count, fitting = hangman.solve("".join(self.current_word), ignore=self.ignored)
+        # the possible words only get fewer, so only the remaining candidates have to be checked
+        fitting = 0
+        if self.words is not None:
+            fitting = self.candidates & ~self.words.contains.get(guess, 0)
         
         # now we try to figure out if the new guess resulted in 0 matches
-        if len(fitting) == 0: # no words with these ignored letters
+        if fitting == 0: # no words with these ignored letters
             if self.guesses == 0: # first guess. No words of this length with this letter
                 self.word_length -= 1
                 if self.word_length <= 0:
@@ -172,19 +197,23 @@ class HangmanGuesserView(discord.ui.View):
                     self.stop()
                     return
                 self.current_word = ["_"] * self.word_length # regenerate empty word
+                # the interaction has to be responded to within 3 seconds
+                await interaction.response.defer()
+                await self.load_words()
             
             else: # randomly pick one of the previous words and fill in the letters there
-                assert len(self.previous) > 0
-                random_word = random.choice(self.previous)
+                assert self.words is not None and self.candidates != 0
+                random_word = random.choice(self.words.get_words(self.candidates))
                 if guess in random_word:
                     # update current_word to include the new guess at the correct spots
                     for i, c in enumerate(random_word):
                         if guess == c:
                             self.current_word[i] = guess
+                            self.candidates &= self.words.positions[i][guess]
                     # remove the guessed letter from the ignored list again
                     self.ignored.pop(self.ignored.index(guess))
         else:
-            self.previous = fitting.copy()
+            self.candidates = fitting
         self.guesses += 1
         self.clear_items()
         
@@ -198,7 +227,7 @@ class HangmanGuesserView(discord.ui.View):
                             f"Amount of guesses: {self.guesses}"
             )
             embed.set_author(name=str(self.user), icon_url=self.user.avatar.url if self.user.avatar else None)
-            await interaction.response.edit_message(embed=embed, view=None)
+            await self.edit_message(interaction, embed=embed, view=None)
             
         else: # add select options back
             self.add_item(LetterSelect(self.ignored, self.current_word, self.callback))
@@ -210,14 +239,21 @@ class HangmanGuesserView(discord.ui.View):
                             f"**Guess a letter:**"
             )
             embed.set_author(name=str(self.user), icon_url=self.user.avatar.url if self.user.avatar else None)
-            await interaction.response.edit_message(embed=embed, view=self)
+            await self.edit_message(interaction, embed=embed, view=self)
+
+    async def edit_message(self, interaction: discord.Interaction, **kwargs):
+        if interaction.response.is_done():
+            # the interaction was deferred while loading the words
+            await interaction.edit_original_response(**kwargs)
+        else:
+            await interaction.response.edit_message(**kwargs)
         
         
     async def on_timeout(self):
-        if self.guesses == 0 or not self.sent_message: # we won't have any fitting words
+        if self.guesses == 0 or not self.sent_message or self.words is None or self.candidates == 0: # we won't have any fitting words
             return
         
-        random_word = random.choice(self.previous)
+        random_word = random.choice(self.words.get_words(self.candidates))
         await self.message.channel.send(f"{self.user.mention}! You guessed the word!\n`{random_word}`")
         embed = discord.Embed(
             title="Hangman Game",
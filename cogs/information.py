@@ -1,3 +1,5 @@
+import asyncio
+import heapq
 import math
 import random
 import string
@@ -12,8 +14,12 @@ from discord.ext.commands import has_permissions
 from discord.ext.commands.cooldowns import BucketType
 from pytz import timezone
 
+from helper.dm_dispatcher import dispatcher
+from helper.log import log
 from helper.sql import SQLFunctions
 
+EDIT_DEBOUNCE = 3  # seconds to wait for more reactions before editing an event message
+
 
 def get_formatted_time(rem):
     if rem < 0:
@@ -156,12 +162,85 @@ def add_event_fields(embed, event, joined_users_msg):
     embed.add_field(name="Event Description", value=event.EventDescription)
 
 
+class EventScheduler:
+    """
+    Keeps the start times of all pending events in a heap, so the events loop
+    can sleep until the next event starts instead of polling the db.
+    Deleted or moved events stay in the heap and are skipped once they're popped.
+    """
+
+    def __init__(self):
+        self.heap: list[tuple[datetime, int]] = []
+        self.starting_at: dict[int, datetime] = {}
+        self.changed = asyncio.Event()
+
+    def load(self, events: list[SQLFunctions.Event]):
+        self.starting_at = {e.EventID: e.EventStartingAt for e in events}
+        self.heap = [
+            (starting_at, event_id)
+            for event_id, starting_at in self.starting_at.items()
+        ]
+        heapq.heapify(self.heap)
+        self.changed.set()
+
+    def add(self, event_id: int, starting_at: datetime):
+        if self.starting_at.get(event_id) == starting_at:
+            return
+        self.starting_at[event_id] = starting_at
+        heapq.heappush(self.heap, (starting_at, event_id))
+        if self.heap[0] == (starting_at, event_id):
+            self.changed.set()
+
+    def remove(self, event_id: int):
+        self.starting_at.pop(event_id, None)
+
+    def next_start(self) -> datetime | None:
+        while len(self.heap) > 0:
+            starting_at, event_id = self.heap[0]
+            if self.starting_at.get(event_id) == starting_at:
+                return starting_at
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, current_time: datetime) -> list[int]:
+        """
+        Removes and returns the IDs of all events starting at or before the given time
+        """
+        due = []
+        next_start = self.next_start()
+        while next_start is not None and next_start <= current_time:
+            _, event_id = heapq.heappop(self.heap)
+            self.starting_at.pop(event_id)
+            due.append(event_id)
+            next_start = self.next_start()
+        return due
+
+    async def wait(self):
+        """
+        Sleeps until the next event starts or an earlier event is added
+        """
+        self.changed.clear()
+        next_start = self.next_start()
+        timeout = None
+        if next_start is not None:
+            timeout = max(0.0, (next_start - datetime.now()).total_seconds())
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
 class Information(commands.Cog):
     def __init__(self, bot):
         self.bot: discord.Client = bot
         self.script_start = time.time()
         self.db_path = "./data/discord.db"
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
+        self.scheduler = EventScheduler()
+        # start DMs and event message edits are run in the background
+        self.background_tasks: set[asyncio.Task] = set()
+        # EventIDs with an event message edit waiting for EDIT_DEBOUNCE
+        self.pending_edits: set[int] = set()
         self.background_events.start()  # pylint: disable=no-member
         # emote used for adding users to an event
         self.emote = "949669955413114960"
@@ -172,40 +251,40 @@ class Information(commands.Cog):
     def cog_unload(self) -> None:
         self.background_events.cancel()  # pylint: disable=no-member
 
-    @tasks.loop(seconds=20)
+    @tasks.loop(seconds=0)  # the loop itself sleeps until the next event starts
     async def background_events(self):
-        await self.bot.wait_until_ready()
-        # iterates through all events to check if an event is starting
-        results = SQLFunctions.get_events(self.conn, is_done=False)
+        await self.scheduler.wait()
         current_time = datetime.now()
-        for event in results:
-            joined_members = SQLFunctions.get_event_joined_users(event, self.conn)
-            # ping users if event starts
-            if event.EventStartingAt <= current_time:
-                # creates the embed for the starting event
-                embed = discord.Embed(
-                    title="Event Starting!",
-                    description=f"`{event.EventName}` is starting! Here just a few details of the event:",
-                    color=0xFCF4A3,
-                )
-                embed.add_field(name="Event ID", value=event.EventID)
-                embed.add_field(
-                    name="Host", value=f"<@{event.DiscordMember.DiscordUserID}>"
-                )
-                embed.add_field(name="Description", value=event.EventDescription)
-
-                for member in joined_members:
-                    user = self.bot.get_user(member.DiscordUserID)
-                    if user is None:
-                        print(f"Did not find user with ID {member.DiscordUserID}")
-                        continue
-                    try:
-                        await user.send(embed=embed)
-                    except discord.Forbidden:
-                        print(f"Can't dm {user.name}")
+        for event_id in self.scheduler.pop_due(current_time):
+            event = SQLFunctions.get_event_by_id(event_id, self.conn)
+            if event is not None:
+                task = asyncio.create_task(self.send_event_start(event))
+                self.background_tasks.add(task)
+                task.add_done_callback(self.background_tasks.discard)
         # Marks all older events as done
         SQLFunctions.mark_events_done(current_time, conn=self.conn)
 
+    @background_events.before_loop
+    async def load_events(self):
+        await self.bot.wait_until_ready()
+        self.scheduler.load(SQLFunctions.get_events(self.conn, is_done=False))
+
+    async def send_event_start(self, event: SQLFunctions.Event):
+        # creates the embed for the starting event
+        embed = discord.Embed(
+            title="Event Starting!",
+            description=f"`{event.EventName}` is starting! Here just a few details of the event:",
+            color=0xFCF4A3,
+        )
+        embed.add_field(name="Event ID", value=event.EventID)
+        embed.add_field(name="Host", value=f"<@{event.DiscordMember.DiscordUserID}>")
+        embed.add_field(name="Description", value=event.EventDescription)
+
+        joined_members = SQLFunctions.get_event_joined_users(event, self.conn)
+        users = [self.bot.get_user(member.DiscordUserID) for member in joined_members]
+        stats = await dispatcher.send_many(users, embed=embed)
+        log(f"Sent start DMs for the event with ID {event.EventID}: {stats}")
+
     @commands.Cog.listener()
     async def on_ready(self):
         self.script_start = time.time()
@@ -222,36 +301,27 @@ class Information(commands.Cog):
     async def join_leave_event(
         self, member, guild_id, command, message_id=None, event_id: int = -1
     ) -> SQLFunctions.Event | None:
-        event_results = SQLFunctions.get_events(self.conn, guild_id=guild_id)
-        for e in event_results:
-            if message_id is not None and e.UpdatedMessageID == message_id:
-                event = e
-                break
-            if event_id is not None and e.EventID == event_id:
-                event = e
-                break
-        else:  # no matching event was found otherwise
+        if message_id is not None:
+            event_id = SQLFunctions.event_index.get_event_id(message_id)
+        if event_id is None:
+            return None
+        event = SQLFunctions.get_event_by_id(event_id, self.conn)
+        if (
+            event is None
+            or event.DiscordMember is None
+            or event.DiscordMember.DiscordGuildID != guild_id
+        ):
             return None
         # check if the user already joined the event
-        joined_members = SQLFunctions.get_event_joined_users(
-            event=event, conn=self.conn
+        discord_member = SQLFunctions.event_index.get_joined_member(
+            event.EventID, member.id, self.conn
         )
-        joined = False
-        discord_member = None
-        for m in joined_members:
-            if m.DiscordUserID == member.id:
-                discord_member = m
-                joined = True
-                break
-        if command == "join" and not joined:
+        if command == "join" and discord_member is None:
             # Adds the user to the event
             sql_member = SQLFunctions.get_or_create_discord_member(member)
-            joined_members.append(sql_member)
             SQLFunctions.add_member_to_event(event, sql_member, self.conn)
-        elif command == "leave" and joined:
+        elif command == "leave" and discord_member is not None:
             # Removes the user from the event
-            assert discord_member
-            joined_members = [x for x in joined_members if x.DiscordUserID != member.id]
             SQLFunctions.remove_member_from_event(event, discord_member, self.conn)
         else:
             return None
@@ -260,22 +330,47 @@ class Information(commands.Cog):
         except discord.Forbidden:
             pass
 
-        try:  # updates the event message with the newly joined/leaving user
+        if event.IsDone:
+            # members of finished events aren't kept in memory
+            SQLFunctions.event_index.forget_joined(event.EventID)
+        # updates the event message with the newly joined/leaving user
+        self.update_event_message(event.EventID)
+        return event
+
+    def update_event_message(self, event_id: int):
+        """
+        Edits the updating event message after EDIT_DEBOUNCE seconds,
+        so a burst of reactions only results in a single edit.
+        """
+        if event_id in self.pending_edits:
+            return
+        self.pending_edits.add(event_id)
+        task = asyncio.create_task(self.edit_event_message(event_id))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def edit_event_message(self, event_id: int):
+        await asyncio.sleep(EDIT_DEBOUNCE)
+        self.pending_edits.discard(event_id)
+        event = SQLFunctions.get_event_by_id(event_id, self.conn)
+        if event is None or event.UpdatedChannelID is None:
+            return
+        try:
             channel = self.bot.get_channel(event.UpdatedChannelID)
             if (
                 channel is None or channel.guild is None
             ):  # channel is not visible to the bot or it's a private channel
-                return event
-            msg = await channel.fetch_message(event.UpdatedMessageID)
+                return
+            joined_members = SQLFunctions.event_index.get_joined_members(
+                event.EventID, self.conn
+            )
             embed = create_event_embed(event, joined_members)
-            await msg.edit(embed=embed)
+            await channel.get_partial_message(event.UpdatedMessageID).edit(embed=embed)
         except (discord.NotFound, discord.errors.Forbidden):
             print(
                 f"Have no access to the events update message for the event with ID {event.EventID}."
             )
 
-        return event
-
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         if (
@@ -297,12 +392,9 @@ class Information(commands.Cog):
             )
             if not event:
                 return
-            try:
-                await payload.member.send(
-                    f"Added you to the event **{event.EventName}**"
-                )
-            except discord.Forbidden:
-                pass
+            await dispatcher.send(
+                payload.member, content=f"Added you to the event **{event.EventName}**"
+            )
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
@@ -328,11 +420,9 @@ class Information(commands.Cog):
             SQLFunctions.logger.debug(f"Member {str(member)} leaving Event: {event}")
             if not event:
                 return
-            try:
-                user = self.bot.get_user(payload.user_id)
-                await user.send(f"Removed you from the event **{event.EventName}**")
-            except discord.Forbidden:
-                pass
+            await dispatcher.send(
+                member, content=f"Removed you from the event **{event.EventName}**"
+            )
 
     @commands.cooldown(4, 10, BucketType.user)
     @commands.command(usage="guild")
@@ -576,6 +666,7 @@ class Information(commands.Cog):
             event = SQLFunctions.create_event(
                 event_name, dt, event_description, member, self.conn
             )
+            self.scheduler.add(event.EventID, event.EventStartingAt)
             # Additionally joins the host as a joined user
             SQLFunctions.add_member_to_event(event, member, self.conn, host=True)
 
@@ -706,6 +797,7 @@ class Information(commands.Cog):
             )
             raise commands.errors.BadArgument()
         SQLFunctions.delete_event(event, self.conn)
+        self.scheduler.remove(event.EventID)
         embed = discord.Embed(
             title="Deleted Event",
             description=f"**Name of deleted event:** {event.EventName}\n"
@@ -858,7 +950,9 @@ class Information(commands.Cog):
                 pass
 
         # Creates embed and sends the message
-        joined_members = SQLFunctions.get_event_joined_users(event, self.conn)
+        joined_members = SQLFunctions.event_index.get_joined_members(
+            event.EventID, self.conn
+        )
         embed = create_event_embed(event, joined_members)
         msg = await ctx.send(embed=embed)
         await msg.add_reaction(f"<a:{self.emote}>")
@@ -866,6 +960,8 @@ class Information(commands.Cog):
         SQLFunctions.add_event_updated_message(
             msg.id, msg.channel.id, event.EventID, self.conn
         )
+        if not event.IsDone:
+            self.scheduler.add(event.EventID, event.EventStartingAt)
         await ctx.send("Successfully added updating event to DB.", delete_after=3)
         try:
             await ctx.message.delete()
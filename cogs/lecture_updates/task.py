@@ -1,22 +1,44 @@
 from discord.ext import tasks, commands
 import discord
 from discord import app_commands
+import asyncio
 import datetime
+from dataclasses import dataclass, field
 from helper.log import log
 import helper.sql.SQLFunctions as sql
 from pytz import timezone
 import re
 
-# list of all times during the day in 5 minute intervals so that tasks
-# always start at the beginning of a minute
-times_to_check = [datetime.time(h, m) for h in range(24) for m in range(0, 60, 5)]
+ZURICH = timezone("Europe/Zurich")
+# the loop also runs daily just after the DST switch, so the
+# lecture times are converted to UTC with the new offset
+REARM_TIME = (3, 5)
+MAX_CONCURRENT_SENDS = 5
 weekdays = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday", "None"]
 
+
+def get_times_to_check(lecture_times: list[tuple[int, int]]) -> list[datetime.time]:
+    """Converts the lecture start times in Zurich to UTC times with today's offset
+
+    Args:
+        lecture_times (list[tuple[int, int]]): (hour, minute) at which lectures start
+
+    Returns:
+        list[datetime.time]: The times for the tasks loop
+    """
+    today = datetime.datetime.now(ZURICH).date()
+    times = []
+    for hour, minute in sorted(set(lecture_times) | {REARM_TIME}):
+        start = ZURICH.localize(datetime.datetime.combine(today, datetime.time(hour, minute)))
+        times.append(start.astimezone(datetime.timezone.utc).timetz())
+    return times
+
+
 def create_lecture_embed(course_name, course_link, stream_link, secondary_link, on_site_location, course_id):
     embed = discord.Embed(
         title=f"Lecture Starting: {course_name}",
         color=discord.colour.Color.light_gray(),
-        timestamp=datetime.datetime.now(timezone("Europe/Zurich"))
+        timestamp=datetime.datetime.now(ZURICH)
     )
     if stream_link is not None:
         stream_link = f"[Click Here]({stream_link})"
@@ -31,30 +53,106 @@ def create_lecture_embed(course_name, course_link, stream_link, secondary_link,
                         f"**Course Website URL:** {course_link}"
     return embed
 
+
+@dataclass
+class Delivery:
+    channel_id: int
+    course_name: str
+    latency: float | None  # seconds from the scheduled time until the message was sent, None if it failed
+
+
+@dataclass
+class TickReport:
+    """The lecture updates sent for a single start time"""
+    scheduled: datetime.datetime
+    deliveries: list[Delivery] = field(default_factory=list)
+
+    def failed(self) -> int:
+        return sum(d.latency is None for d in self.deliveries)
+
+    def format(self) -> str:
+        lines = [f"**{self.scheduled.strftime('%A %H:%M')}:** {len(self.deliveries)} updates, {self.failed()} failed"]
+        for d in sorted(self.deliveries, key=lambda d: d.channel_id):
+            latency = "failed" if d.latency is None else f"{d.latency:.2f}s"
+            lines.append(f"- <#{d.channel_id}> ({d.course_name}): {latency}")
+        return "\n".join(lines)
+
+
 class Task(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.latest_minute = 0
-        self.check_lectures.start()  # pylint: disable=no-member
         self.bot = bot
+        self.send_limit = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+        self.embeds: dict[tuple, discord.Embed] = {}  # lecture row -> embed without timestamp
+        self.last_report: TickReport | None = None
+        self.rearm()
+        sql.lecture_timetable.listeners.append(self.timetable_changed)
+        self.check_lectures.start()  # pylint: disable=no-member
     
     def heartbeat(self):
         return self.check_lectures.is_running()  # pylint: disable=no-member
     
     def cog_unload(self):
+        sql.lecture_timetable.listeners.remove(self.timetable_changed)
         self.check_lectures.cancel()  # pylint: disable=no-member
-        
-    @tasks.loop(time=times_to_check)
+
+    def rearm(self):
+        """Only runs the loop at the times lectures start at"""
+        times = get_times_to_check(sql.lecture_timetable.get_times())
+        if set(times) != set(self.check_lectures.time or []):  # pylint: disable=no-member
+            self.check_lectures.change_interval(time=times)  # pylint: disable=no-member
+
+    def timetable_changed(self):
+        # the lectures can also be changed from the db thread
+        self.bot.loop.call_soon_threadsafe(self.rearm)
+        self.bot.loop.call_soon_threadsafe(self.embeds.clear)
+
+    def get_embed(self, lecture: tuple) -> discord.Embed:
+        embed = self.embeds.get(lecture)
+        if embed is None:
+            name, _, _, link, stream_link, secondary_link, location, course_id = lecture
+            embed = create_lecture_embed(name, link, stream_link, secondary_link, location, course_id)
+            self.embeds[lecture] = embed
+        embed = embed.copy()
+        embed.timestamp = datetime.datetime.now(ZURICH)
+        return embed
+
+    async def send_lectures(self, lectures: list[tuple], scheduled: datetime.datetime, test=False) -> TickReport:
+        """Sends the updates of all lectures concurrently, but at most MAX_CONCURRENT_SENDS at once"""
+        report = TickReport(scheduled)
+
+        async def send(lecture: tuple):
+            name, role_id, channel_id = lecture[:3]
+            channel = self.bot.get_channel(channel_id)
+            if not channel or not isinstance(channel, discord.abc.Messageable):
+                report.deliveries.append(Delivery(channel_id, name, None))
+                log(f"{'TEST: ' if test else ''}Didn't find channel {channel_id} to send lecture updates to.", True, True)
+                return
+            ping = f"`<@{role_id}>`" if test else f"<@&{role_id}>"
+            try:
+                async with self.send_limit:
+                    await channel.send(ping, embed=self.get_embed(lecture))
+            except discord.HTTPException as e:
+                report.deliveries.append(Delivery(channel_id, name, None))
+                log(f"Failed to send lecture update to {channel_id}: {e}", True, True)
+                return
+            latency = (datetime.datetime.now(ZURICH) - scheduled).total_seconds()
+            report.deliveries.append(Delivery(channel_id, name, latency))
+
+        await asyncio.gather(*(send(lecture) for lecture in lectures))
+        return report
+
+    @tasks.loop(time=get_times_to_check([]))
     async def check_lectures(self):
         await self.bot.wait_until_ready()
-        now = datetime.datetime.now(timezone("Europe/Zurich"))
+        now = datetime.datetime.now(ZURICH)
+        # updates the UTC offset of the times after a DST switch
+        self.rearm()
         result = sql.get_lectures_by_time(weekdays[now.weekday()], now.hour, now.minute)
-        for name, role_id, channel_id, link, stream_link, secondary_link, location, course_id in result:
-            embed = create_lecture_embed(name, link, stream_link, secondary_link, location, course_id)
-            channel = self.bot.get_channel(channel_id)
-            if channel and isinstance(channel, discord.abc.Messageable):
-                await channel.send(f"<@&{role_id}>", embed=embed)
-            else:
-                log(f"Didn't find channel {channel_id} to send lecture updates to.", True, True)
+        if len(result) == 0:
+            return
+        scheduled = now.replace(second=0, microsecond=0)
+        self.last_report = await self.send_lectures(result, scheduled)
     
     @check_lectures.before_loop
     async def before_check_lectures(self):
@@ -69,20 +167,20 @@ class Task(commands.Cog):
     @app_commands.choices(day=[app_commands.Choice(name=x, value=x) for x in weekdays])
     async def test(self, inter: discord.Interaction, day: str, hour: int, minute: int):
         result = sql.get_lectures_by_time(day, hour, minute)
-        count = 0
-        failed = 0  # to keep track if and how many updates failed
-        for name, role_id, channel_id, link, stream_link, secondary_link, location, course_id in result:
-            embed = create_lecture_embed(name, link, stream_link, secondary_link, location, course_id)
-            channel = self.bot.get_channel(channel_id)
-            if channel and isinstance(channel, discord.abc.Messageable):
-                await channel.send(f"`<@{role_id}>`", embed=embed)
-            else:
-                failed += 1
-                log(f"TEST: Didn't find channel {channel_id} to send lecture updates to.", True, True)
-        if count == 0:
-            await inter.response.send_message(f"No lectures at this time. Failed: {failed}", ephemeral=True)
+        if len(result) == 0:
+            msg = "No lectures at this time."
+        else:
+            # sending can take longer than the 3 seconds we have to respond
+            await inter.response.defer(ephemeral=True)
+            report = await self.send_lectures(result, datetime.datetime.now(ZURICH), test=True)
+            msg = f"Sent updates in the corresponding channels.\n{report.format()}"
+        if self.last_report is not None:
+            msg += f"\n\n**Last lecture updates**\n{self.last_report.format()}"
+        msg = msg[:2000]
+        if inter.response.is_done():
+            await inter.followup.send(msg, ephemeral=True)
         else:
-            await inter.response.send_message(f"Sent updates in the corresponding channels. Failed: {failed}", ephemeral=True)
+            await inter.response.send_message(msg, ephemeral=True)
 
 
 def get_course_id_from_embed(message):
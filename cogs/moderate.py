@@ -7,6 +7,7 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import helper.sql.SQLFunctions as sql
+from helper.dm_dispatcher import dispatcher
 from helper.log import log
 
 
@@ -124,12 +125,12 @@ class ModerateGroup(
             except discord.Forbidden:
                 log("Lacking permissions to delete message")
                 return
-            try:
-                await message.author.send(
-                    f"You have reached the message limit for <#{message.channel.id}> of {channel_limit.message_limit} messages.\nPlease wait until your limit resets <t:{user_count.resets_at()}:R>."
-                )
-            except discord.Forbidden:
-                log("Lacking permissions to DM user: " + str(message.author.id))
+            sent = await dispatcher.send(
+                message.author,
+                content=f"You have reached the message limit for <#{message.channel.id}> of {channel_limit.message_limit} messages.\nPlease wait until your limit resets <t:{user_count.resets_at()}:R>.",
+            )
+            if not sent:
+                log("Could not DM user: " + str(message.author.id))
             return
 
         sql.increment_message_limit(message.author.id, message.channel.id)
@@ -44,7 +44,7 @@ class Owner(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db_path = "./data/discord.db"
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
 
         temp_count_channel_id = SQLFunctions.get_config("CountChannelID", self.conn)
         self.count_channel_id = temp_count_channel_id[0] if len(temp_count_channel_id) > 0 else 996746797236105236
@@ -192,8 +192,9 @@ class Owner(commands.Cog):
         Permissions: Owner
         """
         conn = self.conn
-        conn.row_factory = sqlite3.Row
+        # only this cursor returns named rows, as the pooled connection is shared
         c = conn.cursor()
+        c.row_factory = sqlite3.Row
         start_time = time.perf_counter()
         sql = sql.replace("insert", "insert or ignore").replace("INSERT", "INSERT OR IGNORE")
         error = False
@@ -206,6 +207,15 @@ class Owner(commands.Cog):
             conn.commit()
         if error:
             return
+        # the query might have changed cached rows
+        SQLFunctions.user_cache.clear()
+        SQLFunctions.guild_cache.clear()
+        SQLFunctions.member_cache.clear()
+        SQLFunctions.permission_index.load()
+        SQLFunctions.quote_sampler.reset()
+        SQLFunctions.quote_ranking.reset()
+        SQLFunctions.event_index.reset()
+        SQLFunctions.lecture_timetable.reset()
         rows = c.fetchall()
         if rows is None:
             await ctx.send("Rows is a None Object. Might have failed getting a connection to the DB?")
@@ -266,6 +276,27 @@ class Owner(commands.Cog):
                 msg += f"\n**{name}:** <a:checkmark:944970382522351627>"
             else:
                 msg += f"\n**{name}:** <a:cross:944970382694314044>"
+        voice = self.bot.get_cog("Voice")
+        msg += f"\nLast voice XP tick: `{voice.last_tick_members}` members in `{round(voice.last_tick_duration * 1000, 2)}` ms"
+        await ctx.send(msg)
+
+    @commands.is_owner()
+    @commands.command(usage="caches")
+    async def caches(self, ctx):
+        """
+        Displays the size and hit rate of the in-memory db caches
+        Permissions: Owner
+        """
+        all_caches = {
+            "Users": SQLFunctions.user_cache,
+            "Guilds": SQLFunctions.guild_cache,
+            "Members": SQLFunctions.member_cache,
+        }
+        msg = ""
+        for name, cache in all_caches.items():
+            total = cache.hits + cache.misses
+            hit_rate = round(cache.hits / total * 100, 1) if total > 0 else 0
+            msg += f"\n**{name}:** `{len(cache)}/{cache.maxsize}` entries | `{cache.hits}` hits | `{cache.misses}` misses | `{hit_rate}%`"
         await ctx.send(msg)
 
     @commands.is_owner()
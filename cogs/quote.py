@@ -9,7 +9,7 @@ from pytz import timezone
 
 from helper.sql import SQLFunctions
 
-active_battles = []  # list of quote ids currently in a battle (not in use right now)
+active_battles: set[int] = set()  # set of quote ids currently in a battle
 
 configs = SQLFunctions.get_config("QuoteBattleChannel")
 BATTLE_CHANNEL_ID = configs[0] if len(configs) > 0 else 0
@@ -19,7 +19,7 @@ class Quote(commands.Cog):
         self.bot = bot
         self.time = 0
         self.db_path = "./data/discord.db"
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
@@ -332,20 +332,25 @@ class Quote(commands.Cog):
                 member = SQLFunctions.get_or_create_discord_member(discord_member, 0, self.conn)
 
         # executes query to get all quotes
+        guild_id = ctx.message.guild.id
         if member is not None:
-            all_quotes = SQLFunctions.get_quotes(unique_member_id=member.UniqueMemberID, guild_id=ctx.message.guild.id, conn=self.conn)
+            filters = {"unique_member_id": member.UniqueMemberID, "guild_id": guild_id, "conn": self.conn}
+            cache_key = (guild_id, "all", member.UniqueMemberID)
         else:
-            all_quotes = SQLFunctions.get_quotes(name=user, guild_id=ctx.message.guild.id, conn=self.conn)
+            filters = {"name": user, "guild_id": guild_id, "conn": self.conn}
+            cache_key = (guild_id, "all", user.lower())
+        pages = QuotePages(
+            lambda: SQLFunctions.count_quotes(**filters),
+            lambda limit, offset: SQLFunctions.get_quotes(**filters, limit=limit, offset=offset),
+            cache_key=cache_key)
 
         # If there are no quotes for the given person;
-        if len(all_quotes) == 0:
+        if len(pages) == 0:
             embed = discord.Embed(title="Quotes Error", description=f"{user} doesn't have any quotes.", color=0xFF0000)
             await ctx.send(embed=embed)
             raise commands.errors.BadArgument()
 
-        pages = create_pages(all_quotes)
-
-        view = PagesView(self.bot, ctx, pages, ctx.message.author.id, f"All quotes from {all_quotes[0].Name}", 180)
+        view = PagesView(self.bot, ctx, pages, ctx.message.author.id, f"All quotes from {pages.first.Name}", 180)
         if len(pages) > 1:
             msg = await ctx.send(embed=view.embed, view=view)
             view.add_message(msg)
@@ -449,31 +454,17 @@ class Quote(commands.Cog):
     @commands.guild_only()
     @quote.command(usage="search <part of quote>")
     async def search(self, ctx: commands.Context, *, args):
+        """
+        Searches for quotes containing all the given words. The last word \
+        can also just be the start of a word. Best matches are shown first.
+        """
         assert ctx.message.guild
-        quotes = SQLFunctions.get_quotes(guild_id=ctx.message.guild.id, quote=args, conn=self.conn)
-        quotes_list = ""
-        i = 1
-        for q in quotes:
-            idx = q.QuoteText.lower().find(args.lower())
-            formatted_quote = q.QuoteText[:idx] + f"**{q.QuoteText[idx: idx + len(args)]}**" + q.QuoteText[idx + len(args):]
-            quotes_list += f"\n**{i}**: {formatted_quote} `[{q.QuoteID}]`"
-            i += 1
-            # creates the pages
-        pages = []
-        while len(quotes_list) > 0:
-            # split quotes into multiple fields of max 1000 chars
-            if len(quotes_list) >= 1000:
-                rind2 = quotes_list.rindex("\n", 0, 1000)
-                if rind2 == 0:
-                    # one quote is more than 1000 chars
-                    rind2 = quotes_list.rindex(" ", 0, 1000)
-                    if rind2 == 0:
-                        # the quote is longer than 1000 chars and has no spaces
-                        rind2 = 1000
-            else:
-                rind2 = len(quotes_list)
-            pages.append(quotes_list[0:rind2])
-            quotes_list = quotes_list[rind2:]
+        guild_id = ctx.message.guild.id
+        pages = QuotePages(
+            lambda: SQLFunctions.count_quote_search(args, guild_id, conn=self.conn),
+            lambda limit, offset: SQLFunctions.search_quotes(args, guild_id, limit, offset, conn=self.conn),
+            search_lines,
+            per_page=3)
         if len(args) > 200:
             args = args[:200] + "[...]"
         if len(pages) == 0:
@@ -487,7 +478,7 @@ class Quote(commands.Cog):
             ctx,
             pages,
             ctx.message.author.id,
-            f"Quotes containing string: {args}")
+            f"Quotes matching: {args}")
         msg = await ctx.send(embed=view.embed, view=view)
         view.add_message(msg)
         
@@ -542,21 +533,15 @@ class Quote(commands.Cog):
             messages_to_send.append(mention_message)
 
         # splits the names into the given amount of MAX_FIELDS
-        names_message = ""
+        name_lines = []
         for name in quoted_names:
             name_to_use = name.quote.Name
             if name.member is not None:
                 name_to_use = f"<@{name.member.DiscordUserID}>"
-            names_message += f"-{name_to_use} `({name.total_quotes} quotes)`\n"
+            name_lines.append(f"-{name_to_use} `({name.total_quotes} quotes)`\n")
 
-        # splits the messages into sub 2000 char chunks
-        pages = []
-        while len(names_message) > 1000:
-            index = names_message.rindex("\n", 0, 1000)
-            pages.append(names_message[:index])
-            names_message = names_message[index:]
-        if len(names_message) > 0:
-            pages.append(names_message)
+        # splits the messages into sub 1000 char chunks
+        pages = split_pages(name_lines)
 
         # sends the initial message, then edits it to a mention message and deletes it afterwards
         for m in messages_to_send:
@@ -597,27 +582,40 @@ class Quote(commands.Cog):
         Picks two random quotes and allows users to vote on which quote they find better. \
         Each vote from a user counts as a win for that quote and immediately takes effect.
         """
-        view = BattleView(ctx.channel, 30, self.conn)
+        try:
+            view = BattleView(ctx.channel, 30, self.conn)
+        except IndexError:
+            await ctx.send("There aren't enough free quotes for a battle right now.")
+            raise commands.errors.BadArgument()
         msg = await ctx.send(embed=view.embed, view=view)
         view.add_message(msg)
 
     @commands.guild_only()
     @quote.command(aliases=["lb", "top"], usage="leaderboard [user ID | mention]")
     async def leaderboard(self, ctx, user=None):
+        guild_id = ctx.message.guild.id
         if user is None:
             title = "Quote Leaderboard"
-            quotes = SQLFunctions.get_quotes(guild_id=ctx.message.guild.id, rank_by_elo=True)
+            # the leaderboard of the whole guild is already kept in memory
+            pages = QuotePages(
+                lambda: SQLFunctions.quote_ranking.count(guild_id),
+                lambda limit, offset: SQLFunctions.quote_ranking.get_quotes(guild_id, limit, offset),
+                cache_key=(guild_id, "leaderboard", None))
         else:
             user_id: str = user.replace("<@", "").replace(">", "").replace("!", "")
             if not user_id.isnumeric():
                 await ctx.reply(f"Did not find a user with the given ID/mention.")
                 raise commands.errors.BadArgument()
-            quotes = SQLFunctions.get_quotes(guild_id=ctx.message.guild.id, rank_by_elo=True, discord_user_id=int(user_id))
-            if len(quotes) == 0:
+            pages = QuotePages(
+                lambda: SQLFunctions.count_quotes(discord_user_id=int(user_id), guild_id=guild_id),
+                lambda limit, offset: SQLFunctions.get_quotes(
+                    guild_id=guild_id, rank_by_elo=True, discord_user_id=int(user_id), limit=limit, offset=offset),
+                cache_key=(guild_id, "leaderboard", int(user_id)))
+            if len(pages) == 0:
                 await ctx.reply(f"Did not find any quotes from the given user.")
                 raise commands.errors.BadArgument()
-            title = f"Quote Leaderboard from {quotes[0].Name}"
-        view = PagesView(self.bot, ctx, create_pages(quotes), ctx.message.author.id, title)
+            title = f"Quote Leaderboard from {pages.first.Name}"
+        view = PagesView(self.bot, ctx, pages, ctx.message.author.id, title)
         msg = await ctx.send(embed=view.embed, view=view)
         view.add_message(msg)
 
@@ -629,9 +627,12 @@ class Quote(commands.Cog):
         """
         if ctx.invoked_subcommand is not None:
             return
-        quotes = SQLFunctions.get_favorite_quotes_of_user(ctx.author, self.conn)
+        pages = QuotePages(
+            lambda: SQLFunctions.count_favorite_quotes_of_user(ctx.author, self.conn),
+            lambda limit, offset: SQLFunctions.get_favorite_quotes_of_user(ctx.author, self.conn, limit, offset),
+            cache_key=(ctx.message.guild.id, "favorites", ctx.author.id))
         # If there are no quotes for the given person;
-        if len(quotes) == 0:
+        if len(pages) == 0:
             embed = discord.Embed(
                 title="Quotes Error",
                 description=f"You don't have any favorite quotes yet.\nCheck out the subcommand `add` to add your first favorite command!",
@@ -640,7 +641,6 @@ class Quote(commands.Cog):
             await ctx.send(embed=embed)
             raise commands.errors.BadArgument()
 
-        pages = create_pages(quotes)
         view = PagesView(self.bot, ctx, pages, ctx.author.id, "Favorite Quotes")
         msg = await ctx.send(embed=view.embed, view=view)
         view.add_message(msg)
@@ -684,6 +684,7 @@ class Quote(commands.Cog):
 
         # add favorite
         SQLFunctions.add_favorite_quote(ctx.author, quote_id, self.conn)
+        page_cache.invalidate((ctx.message.guild.id, "favorites", ctx.author.id))
         embed = discord.Embed(description=f"Successfully favorited quote ID `{quote_id}` by {quote.Name}!", color=discord.Color.green())
         embed.set_author(name=str(ctx.message.author), icon_url=ctx.message.author.avatar.url if ctx.message.author.avatar else None)
         await ctx.reply(embed=embed)
@@ -730,6 +731,7 @@ class Quote(commands.Cog):
 
         # remove favorite
         SQLFunctions.remove_favorite_quote(ctx.author, quote_id, self.conn)
+        page_cache.invalidate((ctx.message.guild.id, "favorites", ctx.author.id))
         embed = discord.Embed(description=f"Successfully unfavorited quote ID `{quote_id}`!", color=discord.Color.blurple())
         embed.set_author(name=str(ctx.message.author), icon_url=ctx.message.author.avatar.url if ctx.message.author.avatar else None)
         await ctx.reply(embed=embed)
@@ -834,10 +836,38 @@ class QuotesToRemove(menus.Menu):
         await self.message.edit(embed=embed)
 
 
-def create_pages(quotes: list[SQLFunctions.Quote]) -> list[str]:
-    quotes_list = ""
-    i = 1
-    for q in quotes:
+def split_pages(lines: list[str], max_length=1000) -> list[str]:
+    """
+    Joins the lines into pages of less than max_length chars. Lines that
+    don't fit on a single page are split up at a space if possible.
+    """
+    pages = []
+    page: list[str] = []
+    page_length = 0
+    for line in lines:
+        while len(line) >= max_length:
+            # the line doesn't fit on a single page
+            index = line.rfind(" ", 1, max_length)
+            if index == -1:
+                index = max_length - 1
+            if page_length > 0:
+                pages.append("".join(page))
+                page, page_length = [], 0
+            pages.append(line[:index])
+            line = line[index:]
+        if page_length + len(line) >= max_length:
+            pages.append("".join(page))
+            page, page_length = [], 0
+        page.append(line)
+        page_length += len(line)
+    if page_length > 0:
+        pages.append("".join(page))
+    return pages
+
+
+def quote_lines(quotes: list[SQLFunctions.Quote], start=1) -> list[str]:
+    lines = []
+    for i, q in enumerate(quotes, start=start):
         quote_to_add = q.QuoteText.replace("*", "").replace("~", "").replace("\\", "").replace("`", "").replace("||", "")
         if quote_to_add.count("\n") > 2:
             # makes multiline quotes not fill too many lines
@@ -845,25 +875,89 @@ def create_pages(quotes: list[SQLFunctions.Quote]) -> list[str]:
             quote_to_add = "\n".join(split_lines[:2]) + "\n **[...]**"
         if len(quote_to_add) > 150:
             quote_to_add = quote_to_add[:150] + "**[...]**"
-        quotes_list += f"\n**{i}**: {quote_to_add} `[{q.QuoteID}][Elo: {round(q.Elo)}]`"
-        i += 1
-    # creates the pages
-    pages = []
-    while len(quotes_list) > 0:
-        # split quotes into multiple fields of max 1000 chars
-        if len(quotes_list) >= 1000:
-            rind2 = quotes_list.rindex("\n", 0, 1000)
-            if rind2 == 0:
-                # one quote is more than 1000 chars
-                rind2 = quotes_list.rindex(" ", 0, 1000)
-                if rind2 == 0:
-                    # the quote is longer than 1000 chars and has no spaces
-                    rind2 = 1000
-        else:
-            rind2 = len(quotes_list)
-        pages.append(quotes_list[0:rind2])
-        quotes_list = quotes_list[rind2:]
-    return pages
+        lines.append(f"\n**{i}**: {quote_to_add} `[{q.QuoteID}][Elo: {round(q.Elo)}]`")
+    return lines
+
+
+def search_lines(results: list[tuple[SQLFunctions.Quote, str]], start=1) -> list[str]:
+    return [f"\n**{i}**: {snippet} `[{q.QuoteID}]`" for i, (q, snippet) in enumerate(results, start=start)]
+
+
+QUOTES_PER_PAGE = 5  # quote lines are at most ~200 chars, so the pages stay below 1000 chars
+EMBED_FIELD_LIMIT = 1024
+
+
+def fit_lines(lines: list[str], limit=EMBED_FIELD_LIMIT) -> str:
+    """
+    Joins the lines of a page. If they're too long for an embed field, whole lines are
+    left out at the end instead of cutting a quote and its markdown in the middle.
+    """
+    page = "".join(lines)
+    shown = len(lines)
+    while len(page) > limit and shown > 1:
+        shown -= 1
+        page = "".join(lines[:shown]) + f"\n*[{len(lines) - shown} more not shown]*"
+    return page
+
+
+class CachedPages:
+    def __init__(self, version: int, total: int):
+        self.version = version  # quotes version the pages were created with
+        self.total = total  # total amount of quotes
+        self.pages: dict[int, str] = {}
+        self.first = None  # first item on the first page
+
+
+# (guild ID, kind of query, member) -> CachedPages
+page_cache = SQLFunctions.LRUCache(256)
+
+
+class QuotePages:
+    """
+    Pages for the PagesView, which only queries and formats the pages that are looked at.
+    If a cache key is given, the created pages are reused until a quote is added, deleted or rated.
+    """
+
+    def __init__(self, count, fetch, format_lines=quote_lines, cache_key: tuple | None = None, per_page=QUOTES_PER_PAGE):
+        """
+        :param count: function returning the total amount of items
+        :param fetch: function taking (limit, offset) and returning the items of a page
+        :param format_lines: function taking (items, number of the first item) and returning the lines of a page
+        """
+        self.fetch = fetch
+        self.format_lines = format_lines
+        self.per_page = per_page
+        # the first part of the cache key is the guild ID
+        version = 0 if cache_key is None else SQLFunctions.quote_ranking.get_version(cache_key[0])
+        cached = None if cache_key is None else page_cache.get(cache_key)
+        if cached is None or cached.version != version:
+            cached = CachedPages(version, count())
+            if cache_key is not None:
+                page_cache.put(cache_key, cached)
+        self.cached = cached
+
+    def __len__(self) -> int:
+        return -(-self.cached.total // self.per_page)
+
+    def __getitem__(self, index: int) -> str:
+        page = self.cached.pages.get(index)
+        if page is None:
+            offset = index * self.per_page
+            items = self.fetch(self.per_page, offset)
+            if index == 0 and len(items) > 0:
+                self.cached.first = items[0]
+            page = fit_lines(self.format_lines(items, offset + 1))
+            self.cached.pages[index] = page
+        return page
+
+    @property
+    def first(self):
+        """
+        The first item on the first page or None if there are no items
+        """
+        if self.cached.first is None and len(self) > 0:
+            _ = self[0]  # loading the first page sets the first item
+        return self.cached.first
 
 
 class PagesButton(discord.ui.Button["PagesView"]):
@@ -888,7 +982,7 @@ class PagesView(discord.ui.View):
         self.bot = bot  # bot object required so we can wait for the button click
         self.ctx = ctx  # so that we can remove the original message in the end
         self.page_count = 0  # current page
-        self.pages = pages  # list of strings
+        self.pages = pages  # list of strings or QuotePages, which only loads the viewed pages
         self.start_time = time.time()
         self.user_id = user_id  # the user ID that can change the pages
         self.embed_title = embed_title  # the title of each page
@@ -1093,15 +1187,21 @@ def set_new_elo(score1, score2, quote1: SQLFunctions.Quote, quote2: SQLFunctions
     return current_elo1, current_elo2
 
 
+RANK_WINDOW = 20  # max rank difference between the two quotes of a battle
+PICK_TRIES = 10  # attempts to find a quote that isn't taken before falling back
+
+
 class BattleView(discord.ui.View):
-    def __init__(self, channel: discord.TextChannel | None, time_for_battle=0, conn: SQLFunctions.sqlite3.Connection | None=None):
+    def __init__(self, channel: discord.TextChannel | None, time_for_battle=0, conn: SQLFunctions.sqlite3.Connection | None=None,
+                 quote1: SQLFunctions.Quote | None = None, quote2: SQLFunctions.Quote | None = None):
         super().__init__(timeout=None)
         self.initialized = False
+        self.battle_quote_ids: tuple[int, ...] = ()  # quote ids this battle added to active_battles
         if not channel:
             return
         self.conn = conn
         if self.conn is None:
-            self.conn = SQLFunctions.connect()
+            self.conn = SQLFunctions.pool.get()
         self.channel = channel
         self.paused = time_for_battle == 0
         self.time_for_battle = 30 if time_for_battle == 0 else time_for_battle
@@ -1109,7 +1209,7 @@ class BattleView(discord.ui.View):
         self.voted_users = []
         self.battle_scores = [0, 0]
         self.in_play = False
-        self.init_battle()
+        self.init_battle(quote1, quote2)
         self.initialized = True
         self.last_edited = time.time()
     
@@ -1117,7 +1217,8 @@ class BattleView(discord.ui.View):
         self.message = message
     
     def init_battle(self, quote1: Quote | None = None, quote2: Quote | None = None):
-        quotes = SQLFunctions.get_quotes(conn=self.conn, guild_id=self.channel.guild.id, rank_by_elo=True)
+        guild_id = self.channel.guild.id
+        self.release_quotes()
         random.seed()
 
         embed = discord.Embed(
@@ -1131,19 +1232,14 @@ class BattleView(discord.ui.View):
             rank1, rank2 = 0, 0
         elif random.random() <= 0.03:  # there's a 3% chance for a top battle to show up
             embed.title = "TOP QUOTE BATTLE"
-            (rank1, quote1), (rank2, quote2) = self.pick_top_quotes(quotes)
+            (rank1, quote1), (rank2, quote2) = self.pick_top_quotes(guild_id)
             embed.set_thumbnail(url="https://media4.giphy.com/media/LO8oXHPum0xworIyk4/giphy.gif")
         else:
             embed.title = "Epic Quote Battle"
-            min_battles = 99999
-            max_battles = 0
-            for q in quotes:
-                min_battles = min(q.AmountBattled, min_battles)
-                max_battles = max(q.AmountBattled, max_battles)
-            # Tokens is what is used to give weights to quotes so quotes that have been shown less are more likely to be shown
-            tokens = max_battles - min_battles + 1
-            quote_weights = [tokens - x.AmountBattled for x in quotes]
-            (rank1, quote1), (rank2, quote2) = self.pick_random_quotes(quotes, quote_weights)
+            # quotes that have been shown less are more likely to be shown. The weights
+            # are kept up to date by quote_ranking, so drawing a quote is O(log n)
+            (rank1, quote1), (rank2, quote2) = self.pick_random_quotes(
+                guild_id, lambda: SQLFunctions.quote_ranking.draw_battle_rank(guild_id) - 1)
         
         assert quote1 is not None
         assert quote2 is not None
@@ -1164,68 +1260,104 @@ class BattleView(discord.ui.View):
         self.quote2 = quote2
         self.rank1 = rank1
         self.rank2 = rank2
+        # keeps the quotes out of other battles until this one is over
+        self.battle_quote_ids = (quote1.QuoteID, quote2.QuoteID)
+        active_battles.update(self.battle_quote_ids)
+
+    def release_quotes(self):
+        """
+        Allows the quotes of this battle to be picked by other battles again
+        """
+        active_battles.difference_update(self.battle_quote_ids)
+        self.battle_quote_ids = ()
 
-    def pick_random_quotes(self, quotes, quote_weights) -> tuple[tuple[int, SQLFunctions.Quote], tuple[int, SQLFunctions.Quote]]:
+    def pick_random_quotes(self, guild_id: int, draw) -> tuple[tuple[int, SQLFunctions.Quote], tuple[int, SQLFunctions.Quote]]:
         """
-        Picks two random quotes and assumes the given quotes list is order by rank.
+        Picks two random quotes of the guild that aren't in another battle.
+        The first quote is picked with the draw function, the second one is picked uniformly out of
+        the quotes with at most 20 rank difference to the first quote.
+        :param draw: function returning the index of a quote in the ranking, starting at 0
         :returns Two tuples each including the rank of the quote and the quote object itself.
+        :raises IndexError: If there aren't two free quotes
         """
-        # Re-raffles until we have two unique quotes
-        quotes_with_rank = [(i + 1, quotes[i]) for i in range(len(quotes))]
-        while True:
-            (rank1, quote1) = random.choices(quotes_with_rank, weights=quote_weights, k=1)[0]
-            # adjust the weights to favor quotes that are similar in rank (max 20 rank difference)
-            new_weights = [1 if abs(rank1 - rank) <= 20 else 0 for [rank, _] in quotes_with_rank]
-            (rank2, quote2) = random.choices(quotes_with_rank, weights=new_weights, k=1)[0]
-            if quote1.Name == "test" or quote2.Name == "test":
+        n = SQLFunctions.quote_ranking.count(guild_id)
+        if n < 2:
+            raise IndexError("There need to be at least two quotes for a battle")
+
+        def get(index: int) -> SQLFunctions.Quote:
+            return SQLFunctions.quote_ranking.get_quote(guild_id, index + 1)
+
+        def is_free(index: int) -> bool:
+            quote = get(index)
+            return quote.Name != "test" and quote.QuoteID not in active_battles
+
+        def pick_partner(index: int) -> int | None:
+            low, high = max(0, index - RANK_WINDOW), min(n - 1, index + RANK_WINDOW)
+            for _ in range(PICK_TRIES):
+                # picks an index out of the window, skipping the first quote itself
+                partner = random.randrange(low, high)
+                if partner >= index:
+                    partner += 1
+                if is_free(partner):
+                    return partner
+            # the window has a lot of taken quotes, so look through the whole window
+            free = [i for i in range(low, high + 1) if i != index and is_free(i)]
+            return random.choice(free) if free else None
+
+        for _ in range(PICK_TRIES):
+            first = draw()
+            if not is_free(first):
                 continue
-            for b in active_battles:  # if one of the quotes is already in a battle, continue
-                if b.quote1 is None or b.quote2 is None:  # one of the other battles messed up and resulted in a None quote
-                    continue
-                if b.quote1.QuoteID in [quote1.QuoteID, quote2.QuoteID] or b.quote2.QuoteID in [quote1.QuoteID, quote2.QuoteID]:
-                    break
-            else:  # if there are no issues, check quote IDs and break
-                if quote1.QuoteID != quote2.QuoteID:
-                    break
-            # if there was a duplicate quote, the else isn't called and another while iteration is executed
-        return (rank1, quote1), (rank2, quote2)
-
-    def pick_top_quotes(self, quotes) -> tuple[tuple[int, SQLFunctions.Quote], tuple[int, SQLFunctions.Quote]]:
+            second = pick_partner(first)
+            if second is not None:
+                return (first + 1, get(first)), (second + 1, get(second))
+
+        # most quotes are taken, so settle for any two free quotes next to each other in rank
+        free = [i for i in range(n) if is_free(i)]
+        if len(free) < 2:
+            raise IndexError("There are no free quotes for a battle")
+        pos = random.randrange(len(free))
+        first = free[pos]
+        second = free[pos + 1] if pos + 1 < len(free) else free[pos - 1]
+        return (first + 1, get(first)), (second + 1, get(second))
+
+    def pick_top_quotes(self, guild_id: int) -> tuple[tuple[int, SQLFunctions.Quote], tuple[int, SQLFunctions.Quote]]:
         """
         Picks two quotes that are at the top of the leaderboards
-        85% to pick 2 top 10 quotes
-        10% to pick a top 50 quote
+        85% to pick 2 top 20 quotes
+        10% to pick a top 100 quote
         5% to pick some other quote
         """
-        n = len(quotes)
+        n = SQLFunctions.quote_ranking.count(guild_id)
         chance_for_first = 0.85  # chance for a quote to be of the first category
         chance_for_second = 0.10 # chance for a quote to be of the second category
         first_cat = 20  # amount in first category
         second_cat = 80  # amount in second category
         chance_for_rest = 1 - chance_for_first - chance_for_second
-        """
-        The min/max methods make sure that there are the same amount of weights
-        as there are quotes.
-        min(n, 10) = n if n<10, else it's just 10
-        min(max(0, n-10)) = 0 if n<10, else = n-10 if n<40, else its 40
-        max(0, n-50) = 0 if n<50, else it's =n-50
-        """
-        quote_weights = [chance_for_first / first_cat for _ in range(min(n, first_cat))] + \
-                        [chance_for_second / second_cat for _ in range(min(max(0, n - first_cat), second_cat))] + \
-                        [chance_for_rest / (n - first_cat - second_cat) for _ in range(max(0, n - first_cat - second_cat))]
-        return self.pick_random_quotes(quotes, quote_weights)
+        # (first index, end index, weight of each quote) of each category. The categories
+        # are cut off if there are less quotes, the same as the weights used to be.
+        categories = [
+            (0, min(n, first_cat), chance_for_first / first_cat),
+            (first_cat, min(n, first_cat + second_cat), chance_for_second / second_cat),
+            (first_cat + second_cat, n, chance_for_rest / max(1, n - first_cat - second_cat)),
+        ]
+        categories = [(start, end, weight) for start, end, weight in categories if end > start]
 
-    def get_rank_of_quote(self, quote_id: int, guild_id: int):
+        def draw() -> int:
+            target = random.random() * sum((end - start) * weight for start, end, weight in categories)
+            for start, end, weight in categories:
+                if target < (end - start) * weight:
+                    return min(start + int(target / weight), end - 1)
+                target -= (end - start) * weight
+            return n - 1
+
+        return self.pick_random_quotes(guild_id, draw)
+
+    def get_rank_of_quote(self, quote_id: int):
         """
-        Gets the rank of a quote. Not the most efficient so should be avoided to be used a lot.
+        Gets the rank of a quote in its guild. -1 if the quote doesn't exist.
         """
-        quotes = SQLFunctions.get_quotes(guild_id=guild_id, conn=self.conn, rank_by_elo=True)
-        i = 1
-        for q in quotes:
-            if q.QuoteID == quote_id:
-                return i
-            i += 1
-        return -1
+        return SQLFunctions.quote_ranking.rank(quote_id)
 
     async def start_battle(self):
         """
@@ -1254,8 +1386,8 @@ class BattleView(discord.ui.View):
         msg = self.message
         
         if self.paused:  # the battle was paused, so we have to get the new ranks of the quotes incase they changed
-            rank1 = self.get_rank_of_quote(self.quote1.QuoteID, self.channel.guild.id)
-            rank2 = self.get_rank_of_quote(self.quote2.QuoteID, self.channel.guild.id)
+            rank1 = self.get_rank_of_quote(self.quote1.QuoteID)
+            rank2 = self.get_rank_of_quote(self.quote2.QuoteID)
         
         start_time = time.time()
         while start_time + self.time_for_battle > time.time():
@@ -1275,18 +1407,11 @@ class BattleView(discord.ui.View):
 
         score1, score2 = self.battle_scores
         new_elo1, new_elo2 = set_new_elo(score1, score2, quote1, quote2, self.conn)
+        self.release_quotes()
 
         # gets the new ranks
-        quotes = SQLFunctions.get_quotes(conn=self.conn, guild_id=self.channel.guild.id, rank_by_elo=True)
-        new_rank1 = 0
-        new_rank2 = 0
-        for i, q in enumerate(quotes):
-            if q.QuoteID == quote1.QuoteID:
-                new_rank1 = i + 1
-            elif q.QuoteID == quote2.QuoteID:
-                new_rank2 = i + 1
-            if new_rank1 != 0 and new_rank2 != 0:
-                break
+        new_rank1 = self.get_rank_of_quote(quote1.QuoteID)
+        new_rank2 = self.get_rank_of_quote(quote2.QuoteID)
 
         quote1_text = quote1.QuoteText
         quote2_text = quote2.QuoteText
@@ -1308,7 +1433,10 @@ class BattleView(discord.ui.View):
 
         # automatically sends the battle again once it ends if its in the battle channel
         if self.channel.id == BATTLE_CHANNEL_ID:
-            view = BattleView(self.channel, 0, self.conn)
+            try:
+                view = BattleView(self.channel, 0, self.conn)
+            except IndexError:
+                return  # all quotes are in other battles
             msg = await self.channel.send(embed=view.embed, view=view)
             view.add_message(msg)
 
@@ -1319,16 +1447,15 @@ class BattleView(discord.ui.View):
         assert isinstance(interaction.channel, discord.TextChannel)
         channel = interaction.channel
         await interaction.response.send_message("Restarting battle...", ephemeral=True)
-        view = BattleView(channel, 0, None)
         
         def get_quote_id(field_name: str) -> int:
             quote_id = int(field_name[field_name.index("ID:")+4: field_name.index("| Name:")])
             return quote_id
         
         embed: discord.Embed = interaction.message.embeds[0]
-        quote1 = SQLFunctions.get_quote(get_quote_id(embed.fields[0].name), interaction.guild_id, view.conn)
-        quote2 = SQLFunctions.get_quote(get_quote_id(embed.fields[1].name), interaction.guild_id, view.conn)
-        view.init_battle(quote1, quote2)
+        quote1 = SQLFunctions.get_quote(get_quote_id(embed.fields[0].name), interaction.guild_id)
+        quote2 = SQLFunctions.get_quote(get_quote_id(embed.fields[1].name), interaction.guild_id)
+        view = BattleView(channel, 0, None, quote1, quote2)
         
         msg = await channel.send(embed=view.embed, view=view)
         view.add_message(msg)
@@ -1366,6 +1493,10 @@ class BattleView(discord.ui.View):
             await interaction.response.send_message(f"Successfully voted on quote {self.quote2.QuoteID}", ephemeral=True)
         # increment vote statistic
         SQLFunctions.update_statistics(interaction.user, conn=self.conn, vote_count=1)
+        statistics = interaction.client.get_cog("Statistics")
+        if statistics is not None:
+            dm = SQLFunctions.get_or_create_discord_member(interaction.user, conn=self.conn)
+            await statistics.update_leaderboards([dm.UniqueMemberID])
         await self.start_battle()
 
     @discord.ui.button(custom_id="battle_view:1", style=discord.ButtonStyle.blurple, emoji="1️⃣")
@@ -31,7 +31,7 @@ class Reputation(commands.Cog):
         with open("./data/ignored_users.json") as f:
             self.ignored_users = json.load(f)
         self.db_path = "./data/discord.db"
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
         self.time_to_wait = 20 * 3600  # Wait 20 hours before repping again
 
     @commands.Cog.listener()
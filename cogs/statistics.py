@@ -10,7 +10,54 @@ from discord.ext.commands.cooldowns import BucketType
 from emoji import demojize
 
 from helper.git_backup import gitpush
-from helper.sql import SQLFunctions
+from helper.leaderboard import Leaderboards
+from helper.log import log
+from helper.sql import AsyncSQLFunctions, SQLFunctions, WALCheckpoint
+
+# how often the buffered statistics are written to the db
+FLUSH_INTERVAL = int(os.getenv("STATISTICS_FLUSH_INTERVAL", 30))
+
+
+class StatisticsBuffer:
+    """
+    Accumulates statistics deltas per UniqueMemberID in memory, so that
+    the db only has to be written to once every few seconds.
+    """
+
+    def __init__(self):
+        self.deltas: dict[int, list[int]] = {}
+        self.column_index = {
+            col: i for i, col in enumerate(SQLFunctions.STATISTICS_COLUMNS)
+        }
+
+    def add(self, unique_member_id: int, **kwargs):
+        """
+        Adds the given deltas to the member. The keys are the column names
+        of the UserStatistics table (e.g. MessagesSent=1).
+        """
+        values = self.deltas.get(unique_member_id)
+        if values is None:
+            values = [0] * len(SQLFunctions.STATISTICS_COLUMNS)
+            self.deltas[unique_member_id] = values
+        for col, amount in kwargs.items():
+            values[self.column_index[col]] += amount
+
+    def pop_all(self) -> dict[int, list[int]]:
+        deltas = self.deltas
+        self.deltas = {}
+        return deltas
+
+    def merge(self, deltas: dict[int, list[int]]):
+        """
+        Adds popped deltas back, for example if writing them failed
+        """
+        for unique_member_id, values in deltas.items():
+            current = self.deltas.get(unique_member_id)
+            if current is None:
+                self.deltas[unique_member_id] = values
+            else:
+                for i, amount in enumerate(values):
+                    current[i] += amount
 
 
 def is_in(word, list_to_check):
@@ -30,13 +77,76 @@ class Statistics(commands.Cog):
         self.background_git_backup.start()  # pylint: disable=no-member
         self.sent_file = False
         self.current_subject = [-1, 0]
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
+        self.stats_buffer = StatisticsBuffer()
+        self.leaderboards = Leaderboards()
+        self.background_flush_statistics.start()  # pylint: disable=no-member
 
     def heartbeat(self):
         return self.background_git_backup.is_running()  # pylint: disable=no-member
 
     def cog_unload(self) -> None:
         self.background_git_backup.cancel()  # pylint: disable=no-member
+        self.background_flush_statistics.cancel()  # pylint: disable=no-member
+        # cogs also get unloaded when the bot is closed, so nothing is lost on shutdown
+        self.flush_statistics()
+
+    async def cog_load(self):
+        await AsyncSQLFunctions.run(self.leaderboards.refresh)
+
+    async def cog_before_invoke(self, ctx):
+        # makes sure the statistics commands show the most recent numbers
+        await self.flush_statistics_async()
+
+    def add_statistics(self, member: discord.Member, **kwargs):
+        dm = SQLFunctions.get_or_create_discord_member(member, conn=self.conn)
+        self.stats_buffer.add(dm.UniqueMemberID, **kwargs)
+
+    def flush_statistics(self):
+        deltas = self.stats_buffer.pop_all()
+        try:
+            SQLFunctions.update_statistics_batch(deltas, self.conn)
+        except Exception as e:
+            self.stats_buffer.merge(deltas)
+            log(
+                f"Failed flushing statistics of {len(deltas)} members: {e}",
+                warning=True,
+            )
+
+    async def flush_statistics_async(self):
+        deltas = self.stats_buffer.pop_all()
+        if len(deltas) == 0:
+            return
+        try:
+            await AsyncSQLFunctions.update_statistics_batch(deltas)
+        except Exception as e:
+            # kept for the next flush
+            self.stats_buffer.merge(deltas)
+            log(
+                f"Failed flushing statistics of {len(deltas)} members: {e}",
+                warning=True,
+            )
+            return
+        await self.update_leaderboards(list(deltas))
+
+    async def update_leaderboards(self, unique_member_ids: list[int]):
+        """
+        Reloads the statistics of the given members into the leaderboards.
+        Has to be called whenever UserStatistics is written to outside of the buffer.
+        """
+        try:
+            rows = await AsyncSQLFunctions.get_all_statistics(
+                unique_member_ids=unique_member_ids
+            )
+        except Exception as e:
+            log(f"Failed updating the leaderboards: {e}", warning=True)
+            return
+        # applied on the event loop, so commands never see a half updated leaderboard
+        self.leaderboards.update(rows)
+
+    @tasks.loop(seconds=FLUSH_INTERVAL)
+    async def background_flush_statistics(self):
+        await self.flush_statistics_async()
 
     @tasks.loop(seconds=10)
     async def background_git_backup(self):
@@ -47,6 +157,7 @@ class Statistics(commands.Cog):
             # Backs the data files up to github
             if os.getenv("BACKUP_TO_GIT") in ["true", "t", "1"]:
                 self.sent_file = True
+                await WALCheckpoint.checkpoint()
                 commit, push = gitpush("./data")
                 user = self.bot.get_user(self.bot.owner_id)
                 if push != 0:
@@ -132,24 +243,23 @@ class Statistics(commands.Cog):
             if f.height is not None and f.height > 0:
                 images_amt += 1
 
-        SQLFunctions.update_statistics(
+        self.add_statistics(
             message.author,
-            conn=self.conn,
-            messages_sent=1,
-            characters_sent=char_count,
-            words_sent=word_count,
-            spoilers_sent=spoiler_count,
-            emojis_sent=emoji_count,
-            files_sent=files_amount,
-            file_size_sent=file_sizes,
-            images_sent=images_amt,
+            MessagesSent=1,
+            CharactersSent=char_count,
+            WordsSent=word_count,
+            SpoilersSent=spoiler_count,
+            EmojisSent=emoji_count,
+            FilesSent=files_amount,
+            FileSizeSent=file_sizes,
+            ImagesSent=images_amt,
         )
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
         if not message.guild or not isinstance(message.author, discord.Member):
             return
-        SQLFunctions.update_statistics(message.author, messages_deleted=1)
+        self.add_statistics(message.author, MessagesDeleted=1)
 
     @commands.Cog.listener()
     async def on_message_edit(self, before, message):
@@ -169,13 +279,13 @@ class Statistics(commands.Cog):
         after_emoji_count = a_cont.count(":") // 2
         after_spoiler_count = a_cont.count("||") // 2
 
-        SQLFunctions.update_statistics(
+        self.add_statistics(
             message.author,
-            messages_edited=1,
-            characters_sent=after_char_count - before_char_count,
-            words_sent=after_word_count - before_word_count,
-            emojis_sent=after_emoji_count - before_emoji_count,
-            spoilers_sent=after_spoiler_count - before_spoiler_count,
+            MessagesEdited=1,
+            CharactersSent=after_char_count - before_char_count,
+            WordsSent=after_word_count - before_word_count,
+            EmojisSent=after_emoji_count - before_emoji_count,
+            SpoilersSent=after_spoiler_count - before_spoiler_count,
         )
 
     @commands.Cog.listener()
@@ -184,11 +294,9 @@ class Statistics(commands.Cog):
             return
         if member.id == reaction.message.author.id:
             return
-        SQLFunctions.update_statistics(
-            member, reactions_added=1
-        )  # reactions added by the user
-        SQLFunctions.update_statistics(
-            reaction.message.author, reactions_received=1
+        self.add_statistics(member, ReactionsAdded=1)  # reactions added by the user
+        self.add_statistics(
+            reaction.message.author, ReactionsReceived=1
         )  # reactions received by the user
 
     @commands.Cog.listener()
@@ -197,8 +305,8 @@ class Statistics(commands.Cog):
             return
         if member.id == reaction.message.author.id:
             return
-        SQLFunctions.update_statistics(member, reactions_removed=1)
-        SQLFunctions.update_statistics(reaction.message.author, reactions_taken_away=1)
+        self.add_statistics(member, ReactionsRemoved=1)
+        self.add_statistics(reaction.message.author, ReactionsTakenAway=1)
 
     async def create_embed(
         self,
@@ -306,13 +414,13 @@ class Statistics(commands.Cog):
         of each category.
         """
         if ctx.invoked_subcommand is None:
+            leaderboard = self.leaderboards.get(ctx.message.guild.id)
             if user is None:
-                stats = SQLFunctions.get_statistics_per_user(
-                    ctx.author.id, ctx.message.guild.id, True, conn=self.conn
-                )
-                total = SQLFunctions.get_total_statistics_score_user(
-                    ctx.author.id, ctx.message.guild.id, False, conn=self.conn
-                )
+                stats = leaderboard.get_statistics_per_user(ctx.author.id)
+                total = leaderboard.get_total_statistics_score_user(ctx.author.id)
+                if stats is None or total is None:
+                    await ctx.send("There are no statistics for you yet.")
+                    return
                 embed = await self.create_embed(ctx.message.author, stats, total)
                 await ctx.send(embed=embed)
             else:
@@ -322,12 +430,11 @@ class Statistics(commands.Cog):
                 except commands.errors.BadArgument:
                     await ctx.send("Invalid user. Mention the user for this to work.")
                     raise commands.errors.BadArgument()
-                stats = SQLFunctions.get_statistics_per_user(
-                    member.id, member.guild.id, True, conn=self.conn
-                )
-                total = SQLFunctions.get_total_statistics_score_user(
-                    member.id, ctx.message.guild.id, False, conn=self.conn
-                )
+                stats = leaderboard.get_statistics_per_user(member.id)
+                total = leaderboard.get_total_statistics_score_user(member.id)
+                if stats is None or total is None:
+                    await ctx.send("There are no statistics for that user yet.")
+                    return
                 embed = await self.create_embed(member, stats, total)
                 await ctx.send(embed=embed)
 
@@ -350,14 +457,13 @@ class Statistics(commands.Cog):
             "ReactionsReceived": [],
             "ReactionsTakenAway": [],
         }
+        leaderboard = self.leaderboards.get(ctx.message.guild.id)
         for key in statistic_columns.keys():
-            statistic_columns[key] = SQLFunctions.get_statistic_rows(key, 3, self.conn)
+            statistic_columns[key] = leaderboard.get_statistic_rows(key, 3)
         embed = await self.get_top_users(statistic_columns)
 
         # additionally adds total score
-        result = SQLFunctions.get_total_statistics_score(
-            ctx.message.guild.id, 3, False, conn=self.conn
-        )
+        result = leaderboard.get_total_statistics_score(3)
         lb_msg = "\n".join(
             [f"**{i + 1}.** <@{x[0]}> *({x[1]})*" for i, x in enumerate(result)]
         )
@@ -378,7 +484,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("MessagesSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "MessagesSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Messages Sent"
         )
@@ -397,7 +505,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("MessagesDeleted", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "MessagesDeleted", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Messages Deleted"
         )
@@ -416,7 +526,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("MessagesEdited", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "MessagesEdited", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Messages Edited"
         )
@@ -436,7 +548,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("CharactersSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "CharactersSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Characters Sent"
         )
@@ -455,7 +569,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("WordsSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "WordsSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Words Sent"
         )
@@ -474,7 +590,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("SpoilersSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "SpoilersSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Spoilers Sent"
         )
@@ -493,7 +611,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("EmojisSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "EmojisSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Emojis Sent"
         )
@@ -512,7 +632,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("FilesSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "FilesSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Files Sent"
         )
@@ -532,7 +654,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("FileSizeSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "FileSizeSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Total File Size Sent"
         )
@@ -552,7 +676,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("ImagesSent", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "ImagesSent", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Images Sent"
         )
@@ -572,7 +698,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("ReactionsAdded", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "ReactionsAdded", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Reactions Added"
         )
@@ -591,7 +719,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("ReactionsRemoved", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "ReactionsRemoved", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Reactions Removed"
         )
@@ -610,7 +740,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("ReactionsReceived", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "ReactionsReceived", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Reactions Received"
         )
@@ -629,7 +761,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("ReactionsTakenAway", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "ReactionsTakenAway", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Reactions Taken Away"
         )
@@ -648,7 +782,9 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        column = SQLFunctions.get_statistic_rows("VoteCount", mx, self.conn)
+        column = self.leaderboards.get(ctx.message.guild.id).get_statistic_rows(
+            "VoteCount", mx
+        )
         embed = await self.get_top_users(
             single_statistic=column, single_statistic_name="Quote Battles voted on"
         )
@@ -667,8 +803,8 @@ class Statistics(commands.Cog):
             mx = 1
         elif mx > 20:
             mx = 20
-        result = SQLFunctions.get_total_statistics_score(
-            ctx.message.guild.id, mx, False, conn=self.conn
+        result = self.leaderboards.get(ctx.message.guild.id).get_total_statistics_score(
+            mx
         )
         lb_msg = "\n".join(
             [f"**{i + 1}.** <@{x[0]}> *({x[1]})*" for i, x in enumerate(result)]
@@ -320,7 +320,7 @@ class StealEmote(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
 
     @commands.command(
         usage="stealemote {emote_ids | emote_names}",
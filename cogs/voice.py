@@ -1,12 +1,14 @@
 import math
 import random
+import time
 from sqlite3 import Error
 
 import discord
 from discord.ext import commands, tasks
 from discord.ext.commands.cooldowns import BucketType
 
-from helper.sql import SQLFunctions
+from helper.log import log
+from helper.sql import AsyncSQLFunctions, SQLFunctions
 
 
 def xpfier(n):
@@ -31,7 +33,11 @@ def number_split(num):
 class Voice(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.conn = SQLFunctions.connect()
+        self.conn = SQLFunctions.pool.get()
+        # xp which is yet to be written to the db. (member id, guild id) -> (member, xp)
+        self.pending_xp: dict[tuple[int, int], tuple[discord.Member, int]] = {}
+        self.last_tick_members = 0
+        self.last_tick_duration = 0.0
         self.background_save_levels.start()  # pylint: disable=no-member
 
     def heartbeat(self):
@@ -39,6 +45,12 @@ class Voice(commands.Cog):
 
     def cog_unload(self) -> None:
         self.background_save_levels.cancel()  # pylint: disable=no-member
+        experience = self.pop_pending_xp()
+        try:
+            SQLFunctions.add_voice_levels(experience, self.conn)
+        except Exception as e:
+            self.merge_pending_xp(experience)
+            log(f"Failed saving voice xp of {len(experience)} members on unload: {e}", warning=True)
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -54,11 +66,13 @@ class Voice(commands.Cog):
 
     async def give_users_xp(self, amount_min, amount_max):
         """
-        Function that gives each member in the voice channel XP that is not muted or afk
+        Function that gives each member in the voice channel XP that is not muted or afk.
+        The xp of all members is written to the db in a single transaction.
         :param amount_min: minimum random xp to give
         :param amount_max: maximum random xp to give
         :return: None
         """
+        start = time.perf_counter()
         for guild in self.bot.guilds:
             # Goes through every guild the bot is on
             for v_ch in guild.voice_channels:
@@ -68,10 +82,35 @@ class Voice(commands.Cog):
                     # If the user is afk, a bot or muted
                     if not (u.voice.afk or u.bot or u.voice.self_mute or u.voice.self_deaf or u.voice.mute):
                         await self.add_xp(u, amount_min, amount_max)
+        experience = self.pop_pending_xp()
+        try:
+            await AsyncSQLFunctions.add_voice_levels(experience)
+        except Exception as e:
+            # kept for the next tick
+            self.merge_pending_xp(experience)
+            log(f"Failed saving voice xp of {len(experience)} members: {e}", warning=True)
+        self.last_tick_members = len(experience)
+        self.last_tick_duration = time.perf_counter() - start
+        if self.last_tick_duration > 1:
+            log(f"Voice xp tick for {self.last_tick_members} members took {round(self.last_tick_duration, 2)}s", warning=True)
+
+    def pop_pending_xp(self) -> list[tuple[discord.Member, int]]:
+        experience = list(self.pending_xp.values())
+        self.pending_xp = {}
+        return experience
+
+    def merge_pending_xp(self, experience: list[tuple[discord.Member, int]]):
+        """
+        Adds popped xp back, for example if writing it failed
+        """
+        for member, amount in experience:
+            key = (member.id, member.guild.id)
+            _, pending = self.pending_xp.get(key, (member, 0))
+            self.pending_xp[key] = (member, pending + amount)
 
     async def add_xp(self, member: discord.Member, amount_min, amount_max):
         """
-        Adds xp to a specific user in that guild
+        Adds xp to a specific user in that guild. The xp is saved with the next voice xp tick.
         :param member:
         :param amount_min:
         :param amount_max:
@@ -79,8 +118,9 @@ class Voice(commands.Cog):
         """
         rand_amount = random.randrange(amount_min, amount_max)
 
-        SQLFunctions.insert_or_update_voice_level(
-            member, rand_amount, self.conn)
+        key = (member.id, member.guild.id)
+        _, pending = self.pending_xp.get(key, (member, 0))
+        self.pending_xp[key] = (member, pending + rand_amount)
 
     @commands.cooldown(4, 10, BucketType.user)
     @commands.guild_only()
@@ -104,6 +144,8 @@ class Voice(commands.Cog):
 
         # Query User experience
         voice_level = SQLFunctions.get_voice_level(member, self.conn)
+        _, pending = self.pending_xp.get((member.id, member.guild.id), (member, 0))
+        voice_level.experience += pending
 
         level = levefier(voice_level.experience)
         pre_level = round(voice_level.experience - xpfier(level))
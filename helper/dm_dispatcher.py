@@ -0,0 +1,109 @@
+"""
+Sends DMs with a bounded amount of concurrent requests.
+
+Awaiting `user.send` for one user after the other takes over a minute for
+events with hundreds of joined members. The dispatcher sends the DMs
+concurrently, but never more than MAX_CONCURRENT at once across all cogs.
+Rate limits, server errors and connection errors are retried with an
+exponential backoff.
+
+    from helper.dm_dispatcher import dispatcher
+    stats = await dispatcher.send_many(users, embed=embed)
+    log(f"Event start DMs: {stats}")
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+
+import aiohttp
+import discord
+
+from helper.log import log
+
+MAX_CONCURRENT = 10
+MAX_RETRIES = 3
+BACKOFF = 1  # seconds, doubled on every retry
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    forbidden: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+    def __str__(self):
+        return f"sent: {self.sent}, forbidden: {self.forbidden}, failed: {self.failed}, elapsed: {self.elapsed:.2f}s"
+
+
+class DMDispatcher:
+    def __init__(self, max_concurrent=MAX_CONCURRENT):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def send(
+        self,
+        user: discord.abc.Messageable,
+        stats: DeliveryStats | None = None,
+        **kwargs,
+    ) -> bool:
+        """
+        Sends a DM to the user, retrying on rate limits, server errors and connection errors.
+        The kwargs are passed on to `user.send`.
+
+        :return: True if the DM was sent
+        """
+        if stats is None:
+            stats = DeliveryStats()
+        for attempt in range(MAX_RETRIES + 1):
+            delay = BACKOFF * 2**attempt * random.uniform(1, 1.5)
+            try:
+                async with self.semaphore:
+                    await user.send(**kwargs)
+                stats.sent += 1
+                return True
+            except discord.Forbidden:
+                # the user has DMs turned off or blocked the bot
+                stats.forbidden += 1
+                return False
+            except discord.RateLimited as e:
+                delay = max(delay, e.retry_after)
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    log(f"Failed to DM {user}: {e}", warning=True)
+                    stats.failed += 1
+                    return False
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # retried the same as server errors
+                pass
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(delay)
+        log(f"Failed to DM {user} after {MAX_RETRIES} retries", warning=True)
+        stats.failed += 1
+        return False
+
+    async def send_many(
+        self, users: list[discord.abc.Messageable | None], **kwargs
+    ) -> DeliveryStats:
+        """
+        Sends the same DM to all users concurrently. Users that are None,
+        for example because they aren't cached, are counted as failed.
+        """
+        start = time.perf_counter()
+        stats = DeliveryStats()
+        stats.failed = sum(user is None for user in users)
+        results = await asyncio.gather(
+            *(self.send(user, stats, **kwargs) for user in users if user is not None),
+            return_exceptions=True,
+        )
+        # any other error only fails its own DM instead of the whole batch
+        for result in results:
+            if isinstance(result, BaseException):
+                log(f"Unexpected error while sending a DM: {result!r}", warning=True)
+                stats.failed += 1
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+
+dispatcher = DMDispatcher()
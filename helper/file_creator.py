@@ -1,7 +1,7 @@
 import os
 from sqlite3 import connect
 from helper.log import log
-from helper.sql.SQLTables import create_tables, check_columns
+from helper.sql.SQLTables import create_tables, check_columns, run_migrations
 
 def createFiles():
     """
@@ -13,6 +13,7 @@ def createFiles():
             
     print("Making sure all DB tables exist")
     create_tables()
+    print(f"DB schema version: {run_migrations()}")
     check_columns()
     print("----- DB Check Complete -----")
 
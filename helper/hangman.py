@@ -48,12 +48,112 @@ v.5.0:  Turns out doing it sequential and without libraries turned out the best.
             English: 0.0306s
             German: 0.14996s
 
+v.6.0:  The word lists are only read from disk once. Each file is kept in memory as a single
+        string with all words of that length after each other, so the file doesn't have to be
+        read and split up on every search anymore.
+
+v.7.0:  Bitset index for each word list. For each position and letter there is a bitset of all
+        words with that letter at that position. Finding the fitting words is done by intersecting
+        the bitsets of the known letters and removing the bitsets of the ignored letters.
+        The letters are then counted with popcounts of the intersections instead of going
+        through every word letter by letter.
+
 German word list: https://gist.github.com/MarvinJWendt/2f4f4154b8ae218600eb091a5706b5f4
 English word list: https://github.com/dwyl/english-words
 
 """
 
 import os
+import threading
+
+LANGUAGES = ["english", "german"]
+
+
+class WordList:
+    """All words of one language and length stored in a single string.
+    As all words have the same length, the i-th word starts at i * length.
+
+    Sets of words are stored as bitsets in Python ints, where bit i is set if the
+    i-th word is in the set. For each position and letter there is a bitset of the words
+    with that letter at that position and for each letter a bitset of the words containing it.
+    """
+
+    def __init__(self, words: list[str], length: int):
+        self.length = length
+        self.words = "".join(w for w in words if len(w) == length)
+        self.all = (1 << len(self)) - 1
+        self.positions: list[dict[str, int]] = []
+        self.contains: dict[str, int] = {}
+        for position in range(length):
+            # all letters at this position, one per word. Letters outside of latin-1 can't be
+            # guessed, so they're all stored as "?"
+            column = self.words[position::length].encode("latin-1", errors="replace")
+            bitsets = {}
+            for letter in set(column):
+                table = bytearray(b"0" * 256)
+                table[letter] = ord("1")
+                # reversed so the first word ends up as the lowest bit
+                bitsets[chr(letter)] = int(column.translate(table)[::-1], 2)
+            for letter, bitset in bitsets.items():
+                self.contains[letter] = self.contains.get(letter, 0) | bitset
+            self.positions.append(bitsets)
+
+    def __len__(self):
+        return len(self.words) // self.length
+
+    def __getitem__(self, index: int) -> str:
+        start = index * self.length
+        return self.words[start:start + self.length]
+
+    def __iter__(self):
+        for start in range(0, len(self.words), self.length):
+            yield self.words[start:start + self.length]
+
+    def get_words(self, bitset: int) -> list[str]:
+        """Returns the words in the given bitset"""
+        bits = bin(bitset)[:1:-1]  # the i-th char is the bit of the i-th word
+        words = []
+        i = bits.find("1")
+        while i != -1:
+            words.append(self[i])
+            i = bits.find("1", i + 1)
+        return words
+
+
+class WordLists:
+    """Loads the word list of each language and word length the first time it's needed
+    and keeps it in memory afterwards.
+    """
+
+    def __init__(self):
+        self.lists: dict[tuple[str, int], WordList] = {}
+        self._lock = threading.Lock()
+
+    def get(self, language: str, length: int) -> WordList | None:
+        key = (language, length)
+        word_list = self.lists.get(key)
+        if word_list is not None:
+            return word_list
+        with self._lock:
+            if key not in self.lists:
+                word_list_path = get_filename("_" * length, language)
+                if word_list_path is None:
+                    return None
+                with open(word_list_path, "r", encoding='utf-8') as f:
+                    self.lists[key] = WordList(f.read().split("\n"), length)
+            return self.lists[key]
+
+    def warm_up(self, languages=None):
+        """Loads all word lists of the given languages, so the first searches don't have to"""
+        for language in languages or LANGUAGES:
+            directory = f"./data/{language}"
+            if not os.path.isdir(directory):
+                continue
+            for length in range(1, max_length(directory) + 1):
+                self.get(language, length)
+
+
+word_lists = WordLists()
 
 
 def solve(wtg: str, ignore=None, language="english") -> tuple[dict[str, int], list[str]]:
@@ -72,54 +172,46 @@ def solve(wtg: str, ignore=None, language="english") -> tuple[dict[str, int], li
 
     if ignore is None:
         ignore = []
-    word_list_path = get_filename(wtg, language)
+    words = word_lists.get(language, len(wtg))
 
-    if word_list_path is None:
+    if words is None:
         return {}, []
 
-    # get the word list
-    with open(word_list_path, "r", encoding='utf-8') as f:
-        cont = f.read()
-    words = cont.split("\n")
+    fitting = get_fitting(words, wtg, ignore)
+    letter_count = count_chars(words, fitting, wtg, ignore)
+
+    return letter_count, words.get_words(fitting)
 
+
+def count_chars(words: WordList, fitting: int, wtg, ignore) -> dict[str, int]:
+    """
+    Count the amount of times each letter is in the fitting words.
+    Instead of going through the words, the bitsets of each letter and position
+    are intersected with the fitting words and counted.
+    """
     letter_count = {'a': 0, 'b': 0, 'c': 0, 'd': 0, 'e': 0, 'f': 0, 'g': 0, 'h': 0, 'i': 0, 'j': 0, 'k': 0, 'l': 0,
                     'm': 0, 'n': 0, 'o': 0, 'p': 0, 'q': 0, 'r': 0, 's': 0, 't': 0, 'u': 0, 'v': 0, 'w': 0, 'x': 0,
                     'y': 0, 'z': 0, 'ä': 0, 'ö': 0, 'ü': 0}
-    fitting: list[str] = []
-
-    get_fitting(words, wtg, fitting, ignore)
-    count_chars(fitting, wtg, letter_count, ignore)
+    for bitsets in words.positions:
+        for c, bitset in bitsets.items():
+            c = c.lower()
+            if c not in ignore and c not in wtg and c in letter_count:
+                letter_count[c] += (bitset & fitting).bit_count()
+    return letter_count
 
-    return letter_count, fitting
 
-
-def count_chars(words, wtg, letter_count, ignore):
+def get_fitting(words: WordList, wtg, ignore) -> int:
     """
-    Count the amount of words each letter is in.
-    
-    Note: we don't want to count all letters in each word,
-          only the amount of words a letter is in.
+    Returns the bitset of the words that have the known letters at the right
+    positions and don't contain any of the ignored letters.
     """
-
-    for w in words:
-        if len(w) == len(wtg):  # only consider words of the same length
-            for c in w:
-                c = c.lower()
-                if c not in ignore and c not in wtg:
-                    try:
-                        letter_count[c] += 1
-                    except KeyError:
-                        pass
-
-
-def get_fitting(words, wtg, fitting_words, ignore):
-    for w in words:
-        if len(w) == len(wtg):  # only consider words of the same length
-            for i, c in enumerate(w):
-                if (wtg[i] != "_" and c != wtg[i]) or c in ignore:
-                    break
-            else:
-                fitting_words.append(w)
+    fitting = words.all
+    for bitsets, c in zip(words.positions, wtg):
+        if c != "_":
+            fitting &= bitsets.get(c, 0)
+    for c in set(ignore):
+        fitting &= ~words.contains.get(c, 0)
+    return fitting
 
 
 def get_filename(wtg: str, language: str):
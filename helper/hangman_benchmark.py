@@ -0,0 +1,299 @@
+"""
+Hangman Solver Benchmark
+
+Reproduces the timings in the docstring of helper/hangman.py without needing the real
+word lists. Synthetic word lists are generated with the letter frequencies of each language
+and the sizes of the real lists (English peaks at 53'403 words of length 9, German at
+190'217 words of length 13). solve() is then timed for patterns with different amounts of
+revealed letters and ignored letters.
+
+Usage:
+    python -m helper.hangman_benchmark
+    python -m helper.hangman_benchmark --save baseline.json
+    python -m helper.hangman_benchmark --compare baseline.json
+
+Exits with 1 if the p95 of a language is above its threshold or, when comparing, more
+than the tolerance slower than the baseline.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from helper import hangman
+
+# approximate letter frequencies in percent
+FREQUENCIES = {
+    "english": {
+        "a": 8.2,
+        "b": 1.5,
+        "c": 2.8,
+        "d": 4.3,
+        "e": 12.7,
+        "f": 2.2,
+        "g": 2.0,
+        "h": 6.1,
+        "i": 7.0,
+        "j": 0.2,
+        "k": 0.8,
+        "l": 4.0,
+        "m": 2.4,
+        "n": 6.7,
+        "o": 7.5,
+        "p": 1.9,
+        "q": 0.1,
+        "r": 6.0,
+        "s": 6.3,
+        "t": 9.1,
+        "u": 2.8,
+        "v": 1.0,
+        "w": 2.4,
+        "x": 0.2,
+        "y": 2.0,
+        "z": 0.1,
+    },
+    "german": {
+        "a": 6.5,
+        "b": 1.9,
+        "c": 3.1,
+        "d": 5.1,
+        "e": 17.4,
+        "f": 1.7,
+        "g": 3.0,
+        "h": 4.8,
+        "i": 7.6,
+        "j": 0.3,
+        "k": 1.2,
+        "l": 3.4,
+        "m": 2.5,
+        "n": 9.8,
+        "o": 2.5,
+        "p": 0.8,
+        "q": 0.1,
+        "r": 7.0,
+        "s": 7.3,
+        "t": 6.2,
+        "u": 4.4,
+        "v": 0.7,
+        "w": 1.9,
+        "x": 0.1,
+        "y": 0.1,
+        "z": 1.1,
+        "ä": 0.5,
+        "ö": 0.3,
+        "ü": 0.7,
+    },
+}
+# (word length with the most words, amount of words of that length)
+PEAKS = {
+    "english": (9, 53_403),
+    "german": (13, 190_217),
+}
+# word lengths to benchmark: short, the biggest list and long
+LENGTHS = {
+    "english": [4, 9, 14],
+    "german": [6, 13, 20],
+}
+DENSITIES = [0, 0.25, 0.5, 0.75]  # share of revealed letters in the pattern
+IGNORE_SIZES = [0, 3, 6]  # amount of wrongly guessed letters
+# max p95 per language in ms. Roughly 2.5x the p95 of v.7.0, as patterns
+# without revealed letters return (and list) almost the whole word list
+THRESHOLDS = {
+    "english": 20,
+    "german": 80,
+}
+
+
+def word_count(language: str, length: int, scale=1.0) -> int:
+    """Amount of words of the given length, roughly following the distribution of the real lists"""
+    peak_length, peak_count = PEAKS[language]
+    return max(
+        1, int(scale * peak_count * math.exp(-(((length - peak_length) / 4) ** 2)))
+    )
+
+
+def generate_word_lists(directory: str, scale=1.0, seed=0):
+    """Writes the synthetic word lists to <directory>/data/<language>/<length>.txt"""
+    rnd = random.Random(seed)
+    for language, frequencies in FREQUENCIES.items():
+        os.makedirs(os.path.join(directory, "data", language), exist_ok=True)
+        letters, weights = list(frequencies.keys()), list(frequencies.values())
+        for length in LENGTHS[language]:
+            count = word_count(language, length, scale)
+            words = set()
+            # there are only so many different short words
+            for _ in range(count * 2):
+                if len(words) >= count:
+                    break
+                words.add("".join(rnd.choices(letters, weights, k=length)))
+            with open(
+                os.path.join(directory, "data", language, f"{length}.txt"),
+                "w",
+                encoding="utf-8",
+            ) as f:
+                f.write("\n".join(sorted(words)))
+
+
+def create_pattern(
+    word: str, density: float, ignore_size: int, letters: list[str], rnd: random.Random
+):
+    """Reveals whole letters of the word until the given share of the word is revealed
+    and picks ignored letters that aren't in the word.
+    """
+    revealed = set()
+    for c in rnd.sample(sorted(set(word)), len(set(word))):
+        if sum(letter in revealed for letter in word) >= density * len(word):
+            break
+        revealed.add(c)
+    pattern = "".join(c if c in revealed else "_" for c in word)
+    ignore = rnd.sample([c for c in letters if c not in word], ignore_size)
+    return pattern, ignore
+
+
+def index_size(word_list: hangman.WordList) -> int:
+    """Bytes used by the words and bitsets of a word list"""
+    size = sys.getsizeof(word_list.words)
+    size += sum(
+        sys.getsizeof(b) for bitsets in word_list.positions for b in bitsets.values()
+    )
+    size += sum(sys.getsizeof(b) for b in word_list.contains.values())
+    return size
+
+
+def percentile(times: list[float], p: int) -> float:
+    return statistics.quantiles(times, n=100, method="inclusive")[p - 1]
+
+
+def benchmark(runs=20, scale=1.0, seed=0) -> dict[str, dict[str, float]]:
+    """Generates the word lists and times solve() for each language
+
+    Args:
+        runs (int, optional): Solves per word length, density and ignore size. Defaults to 20.
+        scale (float, optional): Factor for the word list sizes. Defaults to 1.0.
+        seed (int, optional): Seed for the word lists and patterns. Defaults to 0.
+
+    Returns:
+        dict: language -> {"p50", "p95" in ms, "build" in s, "memory" in MB, "solves"}
+    """
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        generate_word_lists(directory, scale, seed)
+        # the word lists are always read from ./data
+        os.chdir(directory)
+        try:
+            hangman.word_lists = hangman.WordLists()
+            rnd = random.Random(seed)
+            for language in FREQUENCIES:
+                letters = list(FREQUENCIES[language].keys())
+                times = []
+                build = 0
+                memory = 0
+                for length in LENGTHS[language]:
+                    start = time.perf_counter()
+                    word_list = hangman.word_lists.get(language, length)
+                    build += time.perf_counter() - start
+                    memory += index_size(word_list)
+                    for density in DENSITIES:
+                        for ignore_size in IGNORE_SIZES:
+                            for _ in range(runs):
+                                word = word_list[rnd.randrange(len(word_list))]
+                                pattern, ignore = create_pattern(
+                                    word, density, ignore_size, letters, rnd
+                                )
+                                start = time.perf_counter()
+                                hangman.solve(pattern, ignore, language)
+                                times.append(time.perf_counter() - start)
+                results[language] = {
+                    "p50": percentile(times, 50) * 1000,
+                    "p95": percentile(times, 95) * 1000,
+                    "build": build,
+                    "memory": memory / 1_000_000,
+                    "solves": len(times),
+                }
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def find_regressions(
+    results: dict, thresholds: dict, baseline: dict | None = None, tolerance=0.2
+) -> list[str]:
+    """Returns a message for every language that is slower than its threshold or the baseline"""
+    regressions = []
+    for language, result in results.items():
+        if result["p95"] > thresholds[language]:
+            regressions.append(
+                f"{language}: p95 of {result['p95']:.2f}ms is above the threshold of {thresholds[language]}ms"
+            )
+        if baseline is not None and language in baseline:
+            allowed = baseline[language]["p95"] * (1 + tolerance)
+            if result["p95"] > allowed:
+                regressions.append(
+                    f"{language}: p95 of {result['p95']:.2f}ms is more than {round(tolerance * 100)}% "
+                    f"slower than the baseline of {baseline[language]['p95']:.2f}ms"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the hangman solver on synthetic word lists"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=20,
+        help="solves per word length, density and ignore size",
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="factor for the word list sizes"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--save", help="saves the results as a baseline to the given file"
+    )
+    parser.add_argument(
+        "--compare",
+        help="fails if the results are slower than the baseline in the given file",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slowdown compared to the baseline",
+    )
+    args = parser.parse_args()
+
+    results = benchmark(args.runs, args.scale, args.seed)
+    print(
+        f"{'Language':<10}{'Solves':>8}{'p50':>10}{'p95':>10}{'Build':>10}{'Memory':>11}"
+    )
+    for language, r in results.items():
+        print(
+            f"{language:<10}{r['solves']:>8}{r['p50']:>8.2f}ms{r['p95']:>8.2f}ms{r['build']:>9.2f}s{r['memory']:>9.1f}MB"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=4)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    regressions = find_regressions(results, THRESHOLDS, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,10 @@ def hex_to_rgb(value):
     return tuple(int(value[i:i + lv // 3], 16) for i in range(0, lv, lv // 3))
 
 
+def rgb2hex(r, g, b):
+    return '#{:02x}{:02x}{:02x}'.format(r, g, b)
+
+
 class PixPlace:
     def __init__(self, fp, name, setup=True, setpixels=None, pil_img: Image.Image | None = None, top_left=None, bot_right=None):
         self.fp = fp
@@ -85,17 +89,23 @@ class PixPlace:
         if bytes is None:
             print("No image received")
             return
+        return self.decode_place(bytes)
+
+    def decode_place(self, bytes):
         # p = imread(bytes)
         # im = Image.open(bytes)
-        p = np.fromstring(bytes, np.uint8)
+        p = np.frombuffer(bytes, np.uint8)
         p = np.reshape(p[1:], (1000, 1000, 3))
         return p
 
-    async def add_place(self):
-        arr = await self.get_image()
+    def set_place(self, arr):
+        arr = arr.copy()
         arr[:, :, 0] = arr[:, :, 1] = arr[:, :, 2] = np.mean(arr, 2)
         self.place_board = arr.astype("uint8")
 
+    async def add_place(self):
+        self.set_place(await self.get_image())
+
     def get_preview(self):
         pix = self.pixel_array
         self.place_board[pix[:, 1], pix[:, 0]] = pix[:, 2:5]
@@ -103,6 +113,13 @@ class PixPlace:
 
     async def create_gif(self) -> io.BytesIO:
         await self.add_place()
+        return self.build_gif()
+
+    def build_gif(self, progress=None) -> io.BytesIO:
+        """
+        Draws the pixels onto the place board in 100 steps and saves each step as a frame.
+        `progress(done, total)` is called after every frame.
+        """
         cur = 0
         rem = len(self.pixel_array)
         n = rem // 100 + 1
@@ -120,6 +137,8 @@ class PixPlace:
                 cur += rem - cur
             # crops the gif to the image
             images.append(Image.fromarray(blank_place).crop((max(x1 - 10, 0), max(y1 - 10, 0), min(x2 + 10, 999), min(y2 + 10, 999))))
+            if progress is not None:
+                progress(cur, rem)
         buffer = io.BytesIO()
         images[0].save(buffer, format="GIF", append_images=images[1:], save_all=True, duration=50, loop=0)
         buffer.seek(0)
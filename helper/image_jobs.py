@@ -0,0 +1,398 @@
+"""
+Runs the CPU heavy image work of the draw cog in worker processes.
+
+Reading images, ordering their pixels, rendering text and building preview
+GIFs take seconds for big images and used to block the event loop. Every
+piece of work is described by a job, which only holds picklable data, so it
+can be sent to a worker process. The jobs report their progress back, which
+can be forwarded to a channel:
+
+    from helper import image_jobs
+    img = await image_jobs.run(image_jobs.QueueJob(ID, data, (x1, y1), (x2, y2), mods), progress)
+
+At most MAX_PENDING jobs are queued or running at once. Further jobs are
+rejected with QueueFull instead of piling up.
+"""
+
+import asyncio
+import io
+import itertools
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from queue import Empty
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from helper import image2queue as im2q
+
+MAX_WORKERS = 2
+MAX_PENDING = 6  # running and waiting jobs
+PROGRESS_INTERVAL = 2  # seconds between progress updates
+
+LINE_HEIGHT = 62  # amount of lines which fit on the place canvas
+CHAR_WIDTH = 166  # amount of chars which fit in a line on the place canvas
+FONT_PATH = "./config/nk57-monospace-cd-rg.ttf"
+PIXELS_PER_FILE = 80000
+
+_executor: ProcessPoolExecutor | None = None
+_progress_queue = None  # (job id, stage, done, total) sent by the workers
+_progress: dict[int, tuple[str, int, int]] = {}
+_pending = 0
+_job_ids = itertools.count()
+
+# only set inside the worker processes
+_worker_queue = None
+_font: ImageFont.FreeTypeFont | None = None
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _init_worker(queue):
+    global _worker_queue
+    _worker_queue = queue
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _progress_queue
+    if _executor is None:
+        # spawn, as forking the bot with its running threads isn't safe
+        context = multiprocessing.get_context("spawn")
+        _progress_queue = context.Queue()
+        _executor = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(_progress_queue,),
+        )
+    return _executor
+
+
+def report(job_id: int, stage: str, done=0, total=0):
+    """
+    Sends the progress of a job to the bot. Does nothing if not run in a worker.
+    """
+    if _worker_queue is not None:
+        _worker_queue.put((job_id, stage, done, total))
+
+
+def _read_progress():
+    while _progress_queue is not None:
+        try:
+            job_id, stage, done, total = _progress_queue.get_nowait()
+        except Empty:
+            return
+        _progress[job_id] = (stage, done, total)
+
+
+def _execute(job):
+    return job.run()
+
+
+async def run(job, progress=None):
+    """
+    Runs the job in a worker process and returns its result.
+
+    Args:
+        job: Any job of this module
+        progress (optional): Coroutine function called with (stage, done, total) when the job progresses
+
+    Raises:
+        QueueFull: If MAX_PENDING jobs are already queued or running
+    """
+    global _pending
+    if _pending >= MAX_PENDING:
+        raise QueueFull(f"{_pending} image jobs are already queued")
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_get_executor(), _execute, job)
+        last = None
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=PROGRESS_INTERVAL)
+            if done:
+                break
+            _read_progress()
+            current = _progress.get(job.id)
+            if progress is not None and current is not None and current != last:
+                last = current
+                await progress(*current)
+        return future.result()
+    finally:
+        _pending -= 1
+        _read_progress()
+        _progress.pop(job.id, None)
+
+
+def pending() -> int:
+    return _pending
+
+
+def close():
+    """
+    Stops the worker processes after all queued jobs are done
+    """
+    global _executor, _progress_queue
+    if _executor is None:
+        return
+    _executor.shutdown(wait=True)
+    _executor = None
+    _progress_queue = None
+    _progress.clear()
+
+
+def modifiers(img: im2q.PixPlace, mods: tuple, job_id: int | None = None) -> int:
+    drawn = 0
+    start = -1
+    end = -1
+    for i in range(len(mods)):
+        m = mods[i]
+        last = i == len(mods) - 1
+        if job_id is not None:
+            report(job_id, f"Applying modifier `{m}`", i, len(mods))
+        if m.startswith("p"):  # percent start
+            if not last:
+                if mods[i + 1].isnumeric():
+                    start = int(mods[i + 1])
+                    i += 1
+        if m.startswith("e"):  # percent end
+            if not last:
+                if mods[i + 1].isnumeric():
+                    end = int(mods[i + 1])
+                    i += 1
+        elif m.startswith("f"):  # flip
+            img.flip()
+        elif m.startswith("c"):  # center
+            img.center_first()
+        elif m.startswith("r"):  # low to high def
+            img.low_to_high_res()
+        elif m.startswith("l"):  # left to right
+            img.left_to_right()
+
+    if start != -1 or end != -1:
+        if start != -1 != end:
+            drawn = img.perc_to_perc(start, end)
+        elif start != -1:
+            drawn = img.resume_progress(start)
+        else:
+            img.end_at(end)
+    return drawn
+
+
+def resize_image(data: bytes, x1: int, x2: int, y1: int, y2: int) -> io.BytesIO:
+    """
+    Resizes the image to fit into the given coordinates
+    """
+    buffer = io.BytesIO(data)
+    im = Image.open(buffer)
+    width, height = im.size
+    if x2 - x1 != width or y2 - y1 != height:
+        im = im.resize((x2 - x1, y2 - y1), Image.NEAREST)
+        buff = io.BytesIO()
+        im.save(buff, format="PNG")
+        buff.seek(0)
+        return buff
+    buffer.seek(0)
+    return buffer
+
+
+def get_font() -> ImageFont.FreeTypeFont:
+    global _font
+    if _font is None:
+        _font = ImageFont.truetype(FONT_PATH, 12)
+    return _font
+
+
+def write_lines(text: str, last_char: int) -> tuple[list[str], int]:
+    """Last char is the last character of the last line
+
+    Args:
+        text (str): The string which should be split into lines
+        last_char (int): The last character of the last line
+
+    Returns:
+        (list[str], int): A list with all the lines and an int where the last character was placed.
+    """
+    lines = []
+    while len(text) > 0:
+        t = " " * last_char  # we add spaces to move the text to the right by enough
+        chars_added = 0  # amount of characters added to the line
+
+        # if the text is too long to add to the line, we cut it so it fits perfectly
+        if len(text) > CHAR_WIDTH - last_char:
+            t += text[: CHAR_WIDTH - last_char]
+            chars_added = len(text[: CHAR_WIDTH - last_char])
+            text = text[CHAR_WIDTH - last_char :]
+        else:
+            t += text
+            chars_added = len(text)
+            text = ""
+
+        last_char = (last_char + chars_added) % CHAR_WIDTH
+        lines.append(t)
+
+    return lines, last_char
+
+
+def draw_text(text, last_line, last_char) -> tuple[Image.Image, int, int]:
+    img = Image.new("RGBA", (1000, 1000), (0, 0, 0, 0))
+    d = ImageDraw.Draw(img)
+
+    text = " | " + text.replace("\n", " ")
+
+    # splits the text into lines
+    lines, last_char = write_lines(text, last_char)
+
+    # draws the lines
+    while len(lines) > 0:
+        empty_lines = ["" for _ in range(last_line)]
+
+        if len(lines) > LINE_HEIGHT - last_line:
+            li = lines[: LINE_HEIGHT - last_line]
+            lines = lines[LINE_HEIGHT - last_line :]
+        else:
+            li = lines
+            lines = []
+
+        last_line = (last_line + len(li)) % LINE_HEIGHT
+
+        text = "\n".join(empty_lines + li)
+        r = random.randrange  # for readability on the next line
+        d.text((0, 0), text, fill=(r(256), r(256), r(256), 255), font=get_font())
+
+    if last_char > 0:
+        last_line -= 1
+    return img, last_line, last_char
+
+
+def write_setpixel_files(pixels_queue: list, job_id: int | None = None) -> list[str]:
+    """
+    Writes the pixels into txt files for setmultiplepixels with
+    PIXELS_PER_FILE pixels each and returns the filenames.
+    """
+    files = []
+    for file_count, i in enumerate(
+        range(0, len(pixels_queue), PIXELS_PER_FILE), start=1
+    ):
+        if job_id is not None:
+            report(job_id, "Writing files", i, len(pixels_queue))
+        pixels = pixels_queue[i : i + PIXELS_PER_FILE]
+        content = "|".join(
+            f"{pix[0]} {pix[1]} {im2q.rgb2hex(pix[2], pix[3], pix[4])}"
+            for pix in pixels
+        )
+        if i + PIXELS_PER_FILE < len(pixels_queue):
+            content += "|"
+        filename = f"{file_count}-{len(pixels)}.txt"
+        files.append(filename)
+        with open(filename, "a") as f:
+            f.write(content)
+    return files
+
+
+@dataclass
+class QueueJob:
+    """
+    Reads an image, resizes it to the coordinates and orders its pixels with the modifiers.
+    Returns (PixPlace, pixels drawn).
+    """
+
+    name: str
+    image: bytes
+    top_left: tuple[int, int]
+    bot_right: tuple[int, int]
+    mods: tuple[str, ...] = ()
+    id: int = field(default_factory=lambda: next(_job_ids))
+
+    def build(self) -> tuple[im2q.PixPlace, int]:
+        report(self.id, "Reading image")
+        (x1, y1), (x2, y2) = self.top_left, self.bot_right
+        buffer = resize_image(self.image, x1, x2, y1, y2)
+        img = im2q.PixPlace(
+            buffer, self.name, top_left=self.top_left, bot_right=self.bot_right
+        )
+        drawn = modifiers(img, self.mods, self.id)
+        # the buffer isn't needed anymore and would only be sent back
+        img.fp = self.name
+        return img, drawn
+
+    def run(self):
+        return self.build()
+
+
+@dataclass
+class SetpixelFilesJob(QueueJob):
+    """
+    Same as QueueJob, but writes the ordered pixels into setmultiplepixels txt files.
+    Returns the filenames.
+    """
+
+    def run(self):
+        img, _ = self.build()
+        return write_setpixel_files(img.get_queue(), self.id)
+
+
+@dataclass
+class SetpixelsJob:
+    """
+    Reads the pixels of a setpixel txt file. Returns the PixPlace.
+    """
+
+    name: str
+    setpixels: str
+    id: int = field(default_factory=lambda: next(_job_ids))
+
+    def run(self):
+        report(self.id, "Reading setpixels")
+        return im2q.PixPlace(
+            self.name, self.name, setup=False, setpixels=self.setpixels
+        )
+
+
+@dataclass
+class TextJob:
+    """
+    Renders the text onto the canvas after the last line and character.
+    Returns (PixPlace, last line, last char).
+    """
+
+    name: str
+    text: str
+    last_line: int
+    last_char: int
+    id: int = field(default_factory=lambda: next(_job_ids))
+
+    def run(self):
+        pil_img, last_line, last_char = draw_text(
+            self.text, self.last_line, self.last_char
+        )
+        img = im2q.PixPlace(self.name, self.name, False, pil_img=pil_img)
+        img.left_to_right()
+        return img, last_line, last_char
+
+
+@dataclass
+class GifJob:
+    """
+    Builds the preview GIF of the pixels on the given place board. Returns the GIF as bytes.
+    """
+
+    pixel_array: np.ndarray
+    top_left: tuple[int, int]
+    bot_right: tuple[int, int]
+    place: bytes
+    id: int = field(default_factory=lambda: next(_job_ids))
+
+    def run(self):
+        img = im2q.PixPlace("gif", "gif", setup=False)
+        img.pixel_array = self.pixel_array
+        img.top_left_corner = self.top_left
+        img.bot_right_corner = self.bot_right
+        img.set_place(img.decode_place(self.place))
+        return img.build_gif(
+            lambda done, total: report(self.id, "Building frames", done, total)
+        ).getvalue()
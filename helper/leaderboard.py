@@ -0,0 +1,163 @@
+"""
+In-memory statistics leaderboards
+
+The statistics commands used to compute a RANK() window for every column on
+each call. Instead the statistics of each guild are loaded once into sorted
+lists, after which single ranks are found with a binary search and top lists
+are simple slices. Flushed statistics only replace the rows of the members
+that changed. Ranks and top lists are per guild.
+"""
+
+from bisect import bisect_left, insort
+
+from helper.sql import SQLFunctions
+
+
+def remove_sorted(values: list, value):
+    del values[bisect_left(values, value)]
+
+
+class GuildLeaderboard:
+    def __init__(self, rows: list[tuple[SQLFunctions.DiscordMember, bool, list[int]]]):
+        """
+        :param rows: (member, is bot, values in the order of STATISTICS_COLUMNS) of a single guild
+        """
+        column_count = len(SQLFunctions.STATISTICS_COLUMNS)
+        self.rows = {
+            member.DiscordUserID: (member, is_bot, values)
+            for member, is_bot, values in rows
+        }
+
+        # (negated value, DiscordUserID) of the humans sorted ascending, so bisecting
+        # gives the amount of members with a higher value and the start is the top list
+        self.descending = [
+            sorted(
+                (-values[i], member.DiscordUserID)
+                for member, is_bot, values in rows
+                if not is_bot
+            )
+            for i in range(column_count)
+        ]
+        # the total score is the sum of the ascending ranks of all columns.
+        # Same as the previous queries, bots are counted in the total score.
+        self.ascending = [
+            sorted(values[i] for _, _, values in rows) for i in range(column_count)
+        ]
+        # the scores of all members change with every update, so they're only
+        # calculated once they're requested
+        self.scores: dict[int, int] | None = None
+        self.scores_descending: list[int] = []
+        self.score_order: list[tuple[int, int]] = []
+
+    def update(
+        self, member: SQLFunctions.DiscordMember, is_bot: bool, values: list[int]
+    ):
+        """
+        Replaces the statistics of a single member
+        """
+        old = self.rows.get(member.DiscordUserID)
+        self.rows[member.DiscordUserID] = (member, is_bot, values)
+        for i in range(len(values)):
+            if old is not None:
+                _, old_is_bot, old_values = old
+                if not old_is_bot:
+                    remove_sorted(
+                        self.descending[i], (-old_values[i], member.DiscordUserID)
+                    )
+                remove_sorted(self.ascending[i], old_values[i])
+            if not is_bot:
+                insort(self.descending[i], (-values[i], member.DiscordUserID))
+            insort(self.ascending[i], values[i])
+        self.scores = None
+
+    def calculate_scores(self) -> dict[int, int]:
+        if self.scores is None:
+            self.scores = {
+                user_id: sum(
+                    bisect_left(ascending, value) + 1
+                    for ascending, value in zip(self.ascending, values)
+                )
+                for user_id, (_, _, values) in self.rows.items()
+            }
+            self.scores_descending = sorted(-score for score in self.scores.values())
+            self.score_order = sorted(
+                self.scores.items(), key=lambda x: x[1], reverse=True
+            )
+        return self.scores
+
+    def rank(self, column: int, value: int) -> int:
+        # (-value,) is smaller than every (-value, DiscordUserID)
+        return bisect_left(self.descending[column], (-value,)) + 1
+
+    def get_statistics_per_user(
+        self, user_id: int
+    ) -> SQLFunctions.UserStatistics | None:
+        row = self.rows.get(user_id)
+        if row is None or row[1]:
+            return None
+        values = row[2]
+        ranks = [self.rank(i, value) for i, value in enumerate(values)]
+        return SQLFunctions.UserStatistics(*values, *ranks)
+
+    def get_statistic_rows(
+        self, column: str, limit: int
+    ) -> list[tuple[SQLFunctions.DiscordMember, int, int]]:
+        """
+        :return: list of (member, value, rank) of the top members
+        """
+        i = SQLFunctions.STATISTICS_COLUMNS.index(column)
+        return [
+            (self.rows[user_id][0], -value, self.rank(i, -value))
+            for value, user_id in self.descending[i][:limit]
+        ]
+
+    def get_total_statistics_score(self, limit: int) -> list[tuple[int, int]]:
+        """
+        :return: list of (DiscordUserID, score) of the top members
+        """
+        self.calculate_scores()
+        return self.score_order[:limit]
+
+    def get_total_statistics_score_user(self, user_id: int) -> tuple[int, int] | None:
+        """
+        :return: (score, rank)
+        """
+        score = self.calculate_scores().get(user_id)
+        if score is None:
+            return None
+        return score, bisect_left(self.scores_descending, -score) + 1
+
+
+class Leaderboards:
+    def __init__(self):
+        self.guilds: dict[int, GuildLeaderboard] = {}
+
+    def refresh(self, conn=None):
+        """
+        Reloads the statistics of all guilds from the db
+        """
+        rows_per_guild: dict[int, list] = {}
+        for row in SQLFunctions.get_all_statistics(conn):
+            rows_per_guild.setdefault(row[0].DiscordGuildID, []).append(row)
+        self.guilds = {
+            guild_id: GuildLeaderboard(rows)
+            for guild_id, rows in rows_per_guild.items()
+        }
+
+    def update(self, rows: list[tuple[SQLFunctions.DiscordMember, bool, list[int]]]):
+        """
+        Replaces the statistics of the given members, without touching the other members
+        :param rows: rows of `SQLFunctions.get_all_statistics`
+        """
+        for member, is_bot, values in rows:
+            leaderboard = self.guilds.get(member.DiscordGuildID)
+            if leaderboard is None:
+                leaderboard = GuildLeaderboard([])
+                self.guilds[member.DiscordGuildID] = leaderboard
+            leaderboard.update(member, is_bot, values)
+
+    def get(self, guild_id: int) -> GuildLeaderboard:
+        leaderboard = self.guilds.get(guild_id)
+        if leaderboard is None:
+            return GuildLeaderboard([])
+        return leaderboard
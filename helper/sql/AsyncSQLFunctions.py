@@ -0,0 +1,77 @@
+"""
+Awaitable versions of the functions in SQLFunctions.
+
+Every query is run on a single dedicated db thread with its own pooled
+connection, so slow queries and commits don't block the event loop.
+
+Only the functions in `THREAD_SAFE` can be awaited through this module. The
+other functions of SQLFunctions also update the in-memory indexes (quote ranking,
+events, permissions...), which aren't locked against the event loop reading them
+and therefore have to stay on the event loop. The `conn` argument should be
+left out, as the db thread uses its own connection:
+
+    from helper.sql import AsyncSQLFunctions
+    stats = await AsyncSQLFunctions.get_all_statistics(unique_member_ids=member_ids)
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from helper.sql import SQLFunctions
+
+_executor: ThreadPoolExecutor | None = None
+
+# functions that only touch the db and the locked caches
+THREAD_SAFE = {
+    "update_statistics_batch",
+    "get_all_statistics",
+    "add_voice_levels",
+    "checkpoint_wal",
+}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+    return _executor
+
+
+async def run(func, *args, **kwargs):
+    """
+    Runs a blocking function on the db thread and returns its result.
+    The function must not touch state the event loop reads at the same time.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def close():
+    """
+    Closes the connection of the db thread and stops the thread
+    after all queued queries are done
+    """
+    global _executor
+    if _executor is None:
+        return
+    _executor.submit(SQLFunctions.pool.release)
+    _executor.shutdown(wait=True)
+    _executor = None
+
+
+def __getattr__(name):
+    if name not in THREAD_SAFE:
+        raise AttributeError(
+            f"SQLFunctions.{name} isn't thread-safe and can't be run on the db thread"
+        )
+    attr = getattr(SQLFunctions, name)
+
+    @functools.wraps(attr)
+    async def wrapper(*args, **kwargs):
+        return await run(attr, *args, **kwargs)
+
+    globals()[name] = wrapper
+    return wrapper
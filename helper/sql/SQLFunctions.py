@@ -1,9 +1,16 @@
+from bisect import bisect_left, insort
+import copy
+import itertools
 from dataclasses import dataclass
 import logging
 import sqlite3
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
 import os
 import time
+import weakref
+from random import randrange, uniform
 from typing import Tuple
 import discord
 
@@ -12,15 +19,226 @@ logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.WARNING)
 
 
-def connect(fp="./data/discord.db") -> sqlite3.Connection:
+@dataclass
+class StorageConfig:
+    """
+    SQLite settings applied to every new connection.
+    Each value can be changed with the environment variable in the comment.
+    """
+
+    journal_mode: str = "WAL"  # SQLITE_JOURNAL_MODE
+    synchronous: str = "NORMAL"  # SQLITE_SYNCHRONOUS
+    mmap_size: int = 268435456  # SQLITE_MMAP_SIZE (bytes)
+    cache_size: int = -20000  # SQLITE_CACHE_SIZE (negative is in KiB)
+    temp_store: str = "MEMORY"  # SQLITE_TEMP_STORE
+    checkpoint_interval: int = 300  # SQLITE_CHECKPOINT_INTERVAL (seconds)
+
+    @classmethod
+    def from_env(cls) -> "StorageConfig":
+        default = cls()
+        config = cls(
+            journal_mode=os.getenv("SQLITE_JOURNAL_MODE", default.journal_mode).upper(),
+            synchronous=os.getenv("SQLITE_SYNCHRONOUS", default.synchronous).upper(),
+            mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", default.mmap_size)),
+            cache_size=int(os.getenv("SQLITE_CACHE_SIZE", default.cache_size)),
+            temp_store=os.getenv("SQLITE_TEMP_STORE", default.temp_store).upper(),
+            checkpoint_interval=int(
+                os.getenv("SQLITE_CHECKPOINT_INTERVAL", default.checkpoint_interval)
+            ),
+        )
+        # pragmas can't be parametrized, so only known values are allowed
+        if config.journal_mode not in [
+            "DELETE",
+            "TRUNCATE",
+            "PERSIST",
+            "MEMORY",
+            "WAL",
+            "OFF",
+        ]:
+            raise ValueError(f"Invalid SQLITE_JOURNAL_MODE: {config.journal_mode}")
+        if config.synchronous not in ["OFF", "NORMAL", "FULL", "EXTRA"]:
+            raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {config.synchronous}")
+        if config.temp_store not in ["DEFAULT", "FILE", "MEMORY"]:
+            raise ValueError(f"Invalid SQLITE_TEMP_STORE: {config.temp_store}")
+        return config
+
+
+def connect(fp="./data/discord.db", check_same_thread=True) -> sqlite3.Connection:
     if not os.path.exists("./data"):
         os.mkdir("data")
-    conn = sqlite3.connect(fp)
+    # the env is read on every connect, as the .env file is only loaded after this module is imported
+    config = StorageConfig.from_env()
+    conn = sqlite3.connect(fp, check_same_thread=check_same_thread)
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(f"PRAGMA journal_mode={config.journal_mode}")
+    conn.execute(f"PRAGMA synchronous={config.synchronous}")
+    conn.execute(f"PRAGMA mmap_size={config.mmap_size}")
+    conn.execute(f"PRAGMA cache_size={config.cache_size}")
+    conn.execute(f"PRAGMA temp_store={config.temp_store}")
     conn.commit()
     return conn
 
 
+def checkpoint_wal(conn=None) -> tuple[int, int, int, float]:
+    """
+    Moves all the changes in the WAL file into the db file and truncates the WAL file
+    :return: (busy, wal frames, checkpointed frames, duration in seconds)
+    """
+    if conn is None:
+        conn = pool.get()
+    start = time.perf_counter()
+    busy, log_frames, checkpointed = conn.execute(
+        "PRAGMA wal_checkpoint(TRUNCATE)"
+    ).fetchone()
+    return busy, log_frames, checkpointed, time.perf_counter() - start
+
+
+class PooledConnection:
+    """
+    Holds the connection of a single thread in its thread local data. Once the
+    thread exits, the holder is garbage collected and its finalizer gives the
+    connection back to the pool.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.finalizer: weakref.finalize | None = None
+
+
+class ConnectionPool:
+    """
+    Hands out the connections used by the functions in this file when no
+    connection is given. Every thread reuses its own connection and at most
+    `max_connections` connections are open at the same time. The connection
+    of a thread is closed when the thread exits or calls `release()`.
+    """
+
+    def __init__(self, fp="./data/discord.db", max_connections=8, timeout=10):
+        self.fp = fp
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._keys = itertools.count()
+        self._connections: dict[int, sqlite3.Connection] = {}
+
+    def open(self, fp: str | None = None):
+        """
+        Sets the db file and opens the connection of the calling thread
+        """
+        if fp is not None:
+            self.fp = fp
+        self.get()
+
+    def get(self) -> sqlite3.Connection:
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            return holder.conn
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RuntimeError("All pooled db connections are in use")
+        try:
+            # connections are only used by their own thread, but they can be closed from anywhere
+            conn = connect(self.fp, check_same_thread=False)
+        except Exception:
+            self._slots.release()
+            raise
+        key = next(self._keys)
+        with self._lock:
+            self._connections[key] = conn
+        holder = PooledConnection(conn)
+        holder.finalizer = weakref.finalize(holder, self._discard, key)
+        self._local.holder = holder
+        return conn
+
+    def _discard(self, key: int):
+        with self._lock:
+            conn = self._connections.pop(key, None)
+        if conn is None:
+            # already closed by close()
+            return
+        conn.close()
+        self._slots.release()
+
+    def release(self):
+        """
+        Closes the connection of the calling thread
+        """
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            return
+        self._local.holder = None
+        holder.finalizer()
+
+    def close(self):
+        """
+        Closes all open connections. Threads open a new one on their next query.
+        """
+        with self._lock:
+            connections = self._connections
+            self._connections = {}
+        for conn in connections.values():
+            conn.close()
+            self._slots.release()
+        # the other threads notice on their next get() that their connection was closed
+        self._local = threading.local()
+
+
+pool = ConnectionPool()
+
+
+class LRUCache:
+    """
+    Thread-safe dictionary which only keeps the `maxsize` most recently used entries
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# identity caches in front of the get_or_create functions. The IDs of users, guilds and members
+# never change, so the entries only have to be invalidated if the cached details change.
+user_cache = LRUCache(20000)  # DiscordUserID -> DiscordUser
+guild_cache = LRUCache(100)  # DiscordGuildID -> DiscordGuild
+member_cache = LRUCache(20000)  # (DiscordUserID, DiscordGuildID) -> DiscordMember
+
+
+def invalidate_member(user_id: int, guild_id: int):
+    member_cache.invalidate((user_id, guild_id))
+    user_cache.invalidate(user_id)
+
+
 def get_datetime(dt: str) -> datetime:
     if dt is None:
         return datetime.now()
@@ -42,8 +260,13 @@ class DiscordUser:
 
 
 def get_or_create_discord_user(
-    user: discord.User | discord.Member, conn=connect()
+    user: discord.User | discord.Member, conn=None
 ) -> DiscordUser:
+    cached = user_cache.get(user.id)
+    if cached is not None:
+        return cached
+    if conn is None:
+        conn = pool.get()
     result = conn.execute(
         "SELECT * FROM DiscordUsers WHERE DiscordUserID = ?", (user.id,)
     ).fetchone()
@@ -65,7 +288,7 @@ def get_or_create_discord_user(
         finally:
             conn.commit()
         return get_or_create_discord_user(user, conn)
-    return DiscordUser(
+    discord_user = DiscordUser(
         DiscordUserID=result[0],
         DisplayName=result[1],
         Discriminator=result[2],
@@ -73,6 +296,8 @@ def get_or_create_discord_user(
         AvatarURL=result[4],
         CreatedAt=result[5],
     )
+    user_cache.put(user.id, discord_user)
+    return discord_user
 
 
 class DiscordGuild:
@@ -85,7 +310,12 @@ class DiscordGuild:
         self.GuildRoleCount = args[5]
 
 
-def get_or_create_discord_guild(guild: discord.Guild, conn=connect()) -> DiscordGuild:
+def get_or_create_discord_guild(guild: discord.Guild, conn=None) -> DiscordGuild:
+    cached = guild_cache.get(guild.id)
+    if cached is not None:
+        return cached
+    if conn is None:
+        conn = pool.get()
     result = conn.execute(
         "SELECT * FROM DiscordGuilds WHERE DiscordGuildID = ?", (guild.id,)
     ).fetchone()
@@ -107,7 +337,9 @@ def get_or_create_discord_guild(guild: discord.Guild, conn=connect()) -> Discord
             conn.commit()
         return get_or_create_discord_guild(guild, conn)
     else:
-        return DiscordGuild(*result)
+        discord_guild = DiscordGuild(*result)
+        guild_cache.put(guild.id, discord_guild)
+        return discord_guild
 
 
 class DiscordMember:
@@ -131,8 +363,13 @@ class DiscordMember:
 
 
 def get_or_create_discord_member(
-    member: discord.Member, semester=0, conn=connect(), recursion_count=0
+    member: discord.Member, semester=0, conn=None, recursion_count=0
 ) -> DiscordMember:
+    cached = member_cache.get((member.id, member.guild.id))
+    if cached is not None:
+        return cached
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT  DM.UniqueMemberID, DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester,
                         DU.DiscordUserID, DU.DisplayName, DU.Discriminator, DU.IsBot, DU.AvatarURL, DU.CreatedAt
                 FROM DiscordMembers DM
@@ -162,10 +399,14 @@ def get_or_create_discord_member(
         return get_or_create_discord_member(member, semester, conn, recursion_count + 1)
     else:
         user = DiscordUser(*result[6:])
-        return DiscordMember(*result[:6], User=user)
+        discord_member = DiscordMember(*result[:6], User=user)
+        member_cache.put((member.id, member.guild.id), discord_member)
+        return discord_member
 
 
-def get_or_create_user_statistics(member: discord.Member, conn=connect()):
+def get_or_create_user_statistics(member: discord.Member, conn=None):
+    if conn is None:
+        conn = pool.get()
     result = conn.execute(
         """SELECT * FROM UserStatistics US
                  INNER JOIN DiscordMembers DM on DM.UniqueMemberID = US.UniqueMemberID
@@ -185,7 +426,7 @@ def get_or_create_user_statistics(member: discord.Member, conn=connect()):
 
 def update_statistics(
     member: discord.Member,
-    conn=connect(),
+    conn=None,
     messages_sent=0,
     messages_deleted=0,
     messages_edited=0,
@@ -206,6 +447,8 @@ def update_statistics(
     Updates the statistics table
     :return: True if a new entry was created, False otherwise
     """
+    if conn is None:
+        conn = pool.get()
     dm = get_or_create_discord_member(member, conn=conn)
     sql = """   UPDATE OR IGNORE UserStatistics
                 SET MessagesSent = MessagesSent + ?,
@@ -278,7 +521,55 @@ def update_statistics(
     return value
 
 
-def get_statistic_rows(column, limit, conn=connect()):
+STATISTICS_COLUMNS = [
+    "MessagesSent",
+    "MessagesDeleted",
+    "MessagesEdited",
+    "CharactersSent",
+    "WordsSent",
+    "SpoilersSent",
+    "EmojisSent",
+    "FilesSent",
+    "FileSizeSent",
+    "ImagesSent",
+    "ReactionsAdded",
+    "ReactionsRemoved",
+    "ReactionsReceived",
+    "ReactionsTakenAway",
+    "VoteCount",
+]
+
+
+def update_statistics_batch(deltas: dict[int, list[int]], conn=None):
+    """
+    Adds the statistics deltas of multiple members in a single transaction
+    :param deltas: UniqueMemberID -> deltas in the order of STATISTICS_COLUMNS
+    """
+    if conn is None:
+        conn = pool.get()
+    if len(deltas) == 0:
+        return
+    set_columns = ", ".join([f"{col} = {col} + ?" for col in STATISTICS_COLUMNS])
+    try:
+        conn.executemany(
+            """ INSERT INTO UserStatistics(UniqueMemberID)
+                SELECT ? WHERE NOT EXISTS (SELECT 1 FROM UserStatistics WHERE UniqueMemberID = ?)""",
+            [(unique_id, unique_id) for unique_id in deltas],
+        )
+        conn.executemany(
+            f"UPDATE UserStatistics SET {set_columns} WHERE UniqueMemberID = ?",
+            [(*values, unique_id) for unique_id, values in deltas.items()],
+        )
+        conn.commit()
+    except Exception:
+        # either all deltas are written or none, so they can be retried
+        conn.rollback()
+        raise
+
+
+def get_statistic_rows(column, limit, conn=None):
+    if conn is None:
+        conn = pool.get()
     sql = f"""  SELECT
                     ums.UniqueMemberID,
                     dm.DiscordUserID,
@@ -381,8 +672,10 @@ def get_statistics_per_user(
     member_id: discord.abc.Snowflake,
     guild_id: discord.abc.Snowflake,
     order_desc=True,
-    conn=connect(),
+    conn=None,
 ) -> UserStatistics:
+    if conn is None:
+        conn = pool.get()
     desc = "desc" if order_desc else "asc"
     sql = f"""  SELECT
                     MessagesSent, rank.ms,
@@ -463,8 +756,10 @@ def get_statistics_per_user(
 
 
 def get_total_statistics_score(
-    guild_id: discord.abc.Snowflake, limit: int, include_bots=False, conn=connect()
+    guild_id: discord.abc.Snowflake, limit: int, include_bots=False, conn=None
 ):
+    if conn is None:
+        conn = pool.get()
     sql = f"""
         SELECT
             DiscordUserID,
@@ -497,8 +792,10 @@ def get_total_statistics_score_user(
     member_id: discord.abc.Snowflake,
     guild_id: discord.abc.Snowflake,
     include_bots=False,
-    conn=connect(),
+    conn=None,
 ) -> Tuple[int, int]:
+    if conn is None:
+        conn = pool.get()
     sql = f"""
         SELECT
             score,
@@ -538,6 +835,36 @@ def get_total_statistics_score_user(
     return result
 
 
+def get_all_statistics(
+    conn=None, unique_member_ids: list[int] | None = None
+) -> list[tuple[DiscordMember, bool, list[int]]]:
+    """
+    Returns the statistics of every member of every guild
+    :param unique_member_ids: Only returns the statistics of these members if given
+    :return: list of (member, is bot, values in the order of STATISTICS_COLUMNS)
+    """
+    if conn is None:
+        conn = pool.get()
+    sums = ", ".join([f"SUM(US.{col})" for col in STATISTICS_COLUMNS])
+    sql = f"""  SELECT  DM.UniqueMemberID, DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester,
+                        DU.IsBot, {sums}
+                FROM UserStatistics US
+                INNER JOIN DiscordMembers DM on DM.UniqueMemberID = US.UniqueMemberID
+                LEFT JOIN DiscordUsers DU on DU.DiscordUserID = DM.DiscordUserID
+                {{}}
+                GROUP BY US.UniqueMemberID"""
+    if unique_member_ids is None:
+        result = conn.execute(sql.format("")).fetchall()
+    else:
+        result = []
+        # stays below the limit of variables in a single query
+        for i in range(0, len(unique_member_ids), 500):
+            chunk = unique_member_ids[i : i + 500]
+            where = f"WHERE US.UniqueMemberID IN ({', '.join('?' * len(chunk))})"
+            result += conn.execute(sql.format(where), chunk).fetchall()
+    return [(DiscordMember(*row[:6]), bool(row[6]), list(row[7:])) for row in result]
+
+
 class Event:
     def __init__(
         self,
@@ -567,7 +894,7 @@ class Event:
 
 
 def get_events(
-    conn=connect(),
+    conn=None,
     is_done=None,
     limit=None,
     guild_id: int | None = None,
@@ -589,6 +916,8 @@ def get_events(
     :param limit:
     :return:
     """
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT  E.EventID, E.EventName, E.EventCreatedAt, E.EventStartingAt, E.EventDescription, E.UniqueMemberID,
                         E.UpdatedChannelID, E.UpdatedMessageID, E.SpecificChannelID, E.IsDone, DM.UniqueMemberID,
                         DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester
@@ -645,7 +974,9 @@ def get_events(
     return events
 
 
-def get_event_by_id(event_id, conn=connect()) -> Event | None:
+def get_event_by_id(event_id, conn=None) -> Event | None:
+    if conn is None:
+        conn = pool.get()
     event_results = get_events(conn, event_id=int(event_id))
     if len(event_results) == 0:
         return None
@@ -657,8 +988,10 @@ def create_event(
     event_starting_at,
     event_description,
     member: DiscordMember,
-    conn=connect(),
+    conn=None,
 ) -> Event:
+    if conn is None:
+        conn = pool.get()
     try:
         row_id = conn.execute(
             "INSERT INTO Events(EventName, EventStartingAt, EventDescription, UniqueMemberID) VALUES (?,?,?,?)",
@@ -675,14 +1008,19 @@ def create_event(
     return events[0]
 
 
-def delete_event(event: Event, conn=connect()):
+def delete_event(event: Event, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute("DELETE FROM Events WHERE EventID=?", (event.EventID,))
     finally:
         conn.commit()
+    event_index.remove_event(event.EventID)
 
 
-def get_event_joined_users(event: Event, conn=connect()) -> list[DiscordMember]:
+def get_event_joined_users(event: Event, conn=None) -> list[DiscordMember]:
+    if conn is None:
+        conn = pool.get()
     if type(event) is int:
         event_id = int(event)
     else:
@@ -706,19 +1044,120 @@ def get_event_joined_users(event: Event, conn=connect()) -> list[DiscordMember]:
     return joined_members
 
 
-def mark_events_done(current_time=datetime.now(), conn=connect()) -> int:
+class EventIndex:
+    """
+    The EventIDs of the updating event messages and the joined members of events
+    kept in memory, so a reaction on an event message doesn't have to load all events
+    of the guild and their joined members. Joined members are loaded per event on first use.
+    """
+
+    def __init__(self):
+        self.messages: dict[int, int] = {}  # UpdatedMessageID -> EventID
+        # EventID -> DiscordUserID -> DiscordMember, in the order they joined
+        self.joined: dict[int, dict[int, DiscordMember]] = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, conn=None):
+        if conn is None:
+            conn = pool.get()
+        rows = conn.execute(
+            "SELECT UpdatedMessageID, EventID FROM Events WHERE UpdatedMessageID IS NOT NULL"
+        ).fetchall()
+        with self._lock:
+            self.messages = {message_id: event_id for message_id, event_id in rows}
+            self.joined = {}
+            self.loaded = True
+
+    def reset(self):
+        """
+        Forces the index to be reloaded on the next lookup
+        """
+        with self._lock:
+            self.loaded = False
+
+    def get_event_id(self, message_id: int) -> int | None:
+        if not self.loaded:
+            self.load()
+        return self.messages.get(message_id)
+
+    def set_message(self, message_id: int, event_id: int):
+        with self._lock:
+            # there is only a single updating message per event
+            self.messages = {m: e for m, e in self.messages.items() if e != event_id}
+            self.messages[message_id] = event_id
+
+    def remove_event(self, event_id: int):
+        with self._lock:
+            self.messages = {m: e for m, e in self.messages.items() if e != event_id}
+            self.joined.pop(event_id, None)
+
+    def forget_joined(self, event_id: int):
+        """
+        Drops the cached joined members of an event, for example once it's done.
+        They're loaded again if they're needed after all.
+        """
+        with self._lock:
+            self.joined.pop(event_id, None)
+
+    def _get_joined(self, event_id: int, conn=None) -> dict[int, DiscordMember]:
+        if not self.loaded:
+            self.load(conn)
+        joined = self.joined.get(event_id)
+        if joined is None:
+            members = get_event_joined_users(event_id, conn)
+            joined = {m.DiscordUserID: m for m in members}
+            with self._lock:
+                self.joined[event_id] = joined
+        return joined
+
+    def get_joined_members(self, event_id: int, conn=None) -> list[DiscordMember]:
+        return list(self._get_joined(event_id, conn).values())
+
+    def get_joined_member(
+        self, event_id: int, user_id: int, conn=None
+    ) -> DiscordMember | None:
+        return self._get_joined(event_id, conn).get(user_id)
+
+    def add_member(self, event_id: int, member: DiscordMember):
+        with self._lock:
+            joined = self.joined.get(event_id)
+            if joined is not None:
+                joined[member.DiscordUserID] = member
+
+    def remove_member(self, event_id: int, user_id: int):
+        with self._lock:
+            joined = self.joined.get(event_id)
+            if joined is not None:
+                joined.pop(user_id, None)
+
+
+event_index = EventIndex()
+
+
+def mark_events_done(current_time=datetime.now(), conn=None) -> int:
+    if conn is None:
+        conn = pool.get()
     try:
+        closed = conn.execute(
+            "SELECT EventID FROM Events WHERE EventStartingAt < ? AND IsDone=0",
+            (str(current_time),),
+        ).fetchall()
         events_changed = conn.execute(
             "Update Events SET IsDone=1 WHERE EventStartingAt < ?", (str(current_time),)
         ).rowcount
     finally:
         conn.commit()
+    for (event_id,) in closed:
+        event_index.forget_joined(event_id)
     return events_changed
 
 
 def add_member_to_event(
-    event: Event, member_to_add: DiscordMember, conn=connect(), host=False
+    event: Event, member_to_add: DiscordMember, conn=None, host=False
 ):
+    if conn is None:
+        conn = pool.get()
     logger.debug(f"Adding {member_to_add.DiscordUserID} to {event.EventID}")
     try:
         conn.execute(
@@ -727,11 +1166,12 @@ def add_member_to_event(
         )
     finally:
         conn.commit()
+    event_index.add_member(event.EventID, member_to_add)
 
 
-def remove_member_from_event(
-    event: Event, member_to_remove: DiscordMember, conn=connect()
-):
+def remove_member_from_event(event: Event, member_to_remove: DiscordMember, conn=None):
+    if conn is None:
+        conn = pool.get()
     logger.debug(f"Removing {member_to_remove.DiscordUserID} from {event.EventID}")
     try:
         conn.execute(
@@ -740,9 +1180,12 @@ def remove_member_from_event(
         )
     finally:
         conn.commit()
+    event_index.remove_member(event.EventID, member_to_remove.DiscordUserID)
 
 
-def add_event_updated_message(message_id, channel_id, event_id, conn=connect()):
+def add_event_updated_message(message_id, channel_id, event_id, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute(
             "UPDATE Events SET UpdatedMessageID=?, UpdatedChannelID=? WHERE EventID=?",
@@ -750,9 +1193,12 @@ def add_event_updated_message(message_id, channel_id, event_id, conn=connect()):
         )
     finally:
         conn.commit()
+    event_index.set_message(message_id, event_id)
 
 
-def set_specific_event_channel(event_id: int, specific_channel=None, conn=connect()):
+def set_specific_event_channel(event_id: int, specific_channel=None, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute(
             "UPDATE Events SET SpecificChannelID=? WHERE EventID=?",
@@ -762,21 +1208,27 @@ def set_specific_event_channel(event_id: int, specific_channel=None, conn=connec
         conn.commit()
 
 
-def get_config(key, conn=connect()) -> list[int]:
+def get_config(key, conn=None) -> list[int]:
+    if conn is None:
+        conn = pool.get()
     values = conn.execute(
         "SELECT ConfigValue FROM Config WHERE ConfigKey=?", (key,)
     ).fetchall()
     return [x[0] for x in values]
 
 
-def delete_config(key, conn=connect()):
+def delete_config(key, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute("DELETE FROM Config WHERE ConfigKey=?", (key,))
     finally:
         conn.commit()
 
 
-def insert_or_update_config(key, value, conn=connect()):
+def insert_or_update_config(key, value, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         rows_changed = conn.execute(
             "UPDATE OR IGNORE Config SET ConfigValue=? WHERE ConfigKey=?", (value, key)
@@ -811,8 +1263,10 @@ class CovidGuesser:
 
 
 def get_covid_guessers(
-    conn=connect(), guessed=False, discord_user_id=None, guild_id=None
+    conn=None, guessed=False, discord_user_id=None, guild_id=None
 ) -> list[CovidGuesser]:
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT  CG.UniqueMemberID, CG.TotalPointsAmount, CG.GuessCount, CG.NextGuess, CG.TempPoints,
                         DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester
                 FROM CovidGuessing CG
@@ -850,7 +1304,9 @@ def get_covid_guessers(
     return guessers
 
 
-def clear_covid_guesses(users: list[CovidGuesser], increment=True, conn=connect()):
+def clear_covid_guesses(users: list[CovidGuesser], increment=True, conn=None):
+    if conn is None:
+        conn = pool.get()
     for guesser in users:
         points_gotten = guesser.TempPoints
         if points_gotten is None:
@@ -876,7 +1332,9 @@ def clear_covid_guesses(users: list[CovidGuesser], increment=True, conn=connect(
             conn.commit()
 
 
-def insert_or_update_covid_guess(member: DiscordMember, guess: int, conn=connect()):
+def insert_or_update_covid_guess(member: DiscordMember, guess: int, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         rows_changed = conn.execute(
             "UPDATE OR IGNORE CovidGuessing SET NextGuess=? WHERE UniqueMemberID=?",
@@ -922,15 +1380,122 @@ class Quote:
         return str(self.QuoteID)
 
 
-def get_quote(
-    quote_ID, guild_id, conn=connect(), row_id=None, random=False
-) -> Quote | None:
+class QuoteSampler:
+    """
+    The QuoteIDs of every guild kept in memory, so a random quote can be picked in
+    constant time instead of sorting the whole Quotes table with ORDER BY RANDOM().
+    Besides the pool of each guild, there is a pool per quoted name and per quoted member.
+    """
+
+    def __init__(self):
+        self.pools: dict[tuple, list[int]] = {}
+        self.positions: dict[tuple, dict[int, int]] = {}  # pool key -> QuoteID -> index
+        self.quote_keys: dict[int, tuple] = {}  # QuoteID -> pool keys the quote is in
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(guild_id: int, name: str, unique_member_id: int | None) -> tuple:
+        keys = [("guild", guild_id), ("name", guild_id, name.lower())]
+        if unique_member_id is not None:
+            keys.append(("member", guild_id, unique_member_id))
+        return tuple(keys)
+
+    def load(self, conn=None):
+        if conn is None:
+            conn = pool.get()
+        rows = conn.execute(
+            "SELECT QuoteID, DiscordGuildID, Name, UniqueMemberID FROM Quotes"
+        ).fetchall()
+        with self._lock:
+            self.pools = {}
+            self.positions = {}
+            self.quote_keys = {}
+            for row in rows:
+                self._add(*row)
+            self.loaded = True
+
+    def reset(self):
+        """
+        Forces the QuoteIDs to be reloaded on the next sample
+        """
+        with self._lock:
+            self.loaded = False
+
+    def _add(self, quote_id: int, guild_id: int, name: str, unique_member_id):
+        if quote_id in self.quote_keys:
+            return
+        keys = self._keys(guild_id, str(name), unique_member_id)
+        self.quote_keys[quote_id] = keys
+        for key in keys:
+            ids = self.pools.setdefault(key, [])
+            self.positions.setdefault(key, {})[quote_id] = len(ids)
+            ids.append(quote_id)
+
+    def add(self, quote_id: int, guild_id: int, name: str, unique_member_id=None):
+        with self._lock:
+            if self.loaded:
+                self._add(quote_id, guild_id, name, unique_member_id)
+
+    def remove(self, quote_id: int):
+        with self._lock:
+            keys = self.quote_keys.pop(quote_id, ())
+            for key in keys:
+                # swaps the last QuoteID into the removed spot, so removing is O(1) as well
+                ids = self.pools[key]
+                positions = self.positions[key]
+                index = positions.pop(quote_id)
+                last = ids.pop()
+                if last != quote_id:
+                    ids[index] = last
+                    positions[last] = index
+                if len(ids) == 0:
+                    del self.pools[key]
+                    del self.positions[key]
+
+    def sample(
+        self, guild_id: int, name: str | None = None, unique_member_id=None
+    ) -> int | None:
+        """
+        :return: a uniformly random QuoteID of the guild, optionally only from the given
+            name or member. None if there is no such quote.
+        """
+        if not self.loaded:
+            self.load()
+        if unique_member_id is not None:
+            key = ("member", guild_id, unique_member_id)
+        elif name is not None:
+            key = ("name", guild_id, name.lower())
+        else:
+            key = ("guild", guild_id)
+        with self._lock:
+            ids = self.pools.get(key)
+            if not ids:
+                return None
+            return ids[randrange(len(ids))]
+
+
+quote_sampler = QuoteSampler()
+
+
+def get_quote(quote_ID, guild_id, conn=None, row_id=None, random=False) -> Quote | None:
+    if conn is None:
+        conn = pool.get()
     values = "QuoteID, Quote, Name, UniqueMemberID, CreatedAt, AddedByUniqueMemberID, DiscordGuildID, AmountBattled, AmountWon, Elo"
     if random:
-        row = conn.execute(
-            f"SELECT {values} FROM Quotes WHERE DiscordGuildID=? ORDER BY RANDOM() LIMIT 1",
-            (guild_id,),
-        ).fetchone()
+        # retries in case the sampler still had a QuoteID that was deleted without it knowing
+        row = None
+        for _ in range(5):
+            quote_ID = quote_sampler.sample(guild_id)
+            if quote_ID is None:
+                break
+            row = conn.execute(
+                f"SELECT {values} FROM Quotes WHERE QuoteID=? AND DiscordGuildID=?",
+                (quote_ID, guild_id),
+            ).fetchone()
+            if row is not None:
+                break
+            quote_sampler.remove(quote_ID)
     elif row_id is not None:
         row = conn.execute(
             f"SELECT {values} FROM Quotes WHERE ROWID=? AND DiscordGuildID=?",
@@ -957,25 +1522,18 @@ def get_quote(
     )
 
 
-def get_quotes(
+def _quote_filter(
     discord_user_id=None,
     unique_member_id=None,
     name=None,
     quote=None,
     guild_id=None,
-    conn: sqlite3.Connection | None = connect(),
-    random=False,
-    limit=None,
-    rank_by_elo=False,
-) -> list[Quote]:
-    if not conn:
-        conn = connect()
-    sql = """   SELECT  Q.QuoteID, Q.Quote, Q.Name, Q.UniqueMemberID, Q.CreatedAt, Q.AddedByUniqueMemberID, Q.DiscordGuildID,
-                        DM.UniqueMemberID, DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester,
-                        Q.AmountBattled, Q.AmountWon, Q.Elo
-                FROM Quotes Q
-                LEFT JOIN DiscordMembers DM on Q.UniqueMemberID = DM.UniqueMemberID
-                WHERE true"""
+    quote_id=None,
+) -> tuple[str, list]:
+    """
+    :return: (WHERE clause, values) for the Quotes Q joined with the DiscordMembers DM
+    """
+    sql = " WHERE true"
     values = []
     if discord_user_id is not None:
         sql += " AND DM.DiscordUserID=?"
@@ -993,13 +1551,78 @@ def get_quotes(
     if guild_id is not None:
         sql += " AND Q.DiscordGuildID=?"
         values.append(guild_id)
+    if quote_id is not None:
+        sql += " AND Q.QuoteID=?"
+        values.append(quote_id)
+    return sql, values
+
+
+def count_quotes(
+    discord_user_id=None,
+    unique_member_id=None,
+    name=None,
+    guild_id=None,
+    conn=None,
+) -> int:
+    if conn is None:
+        conn = pool.get()
+    where, values = _quote_filter(
+        discord_user_id, unique_member_id, name, None, guild_id
+    )
+    sql = """   SELECT COUNT(*)
+                FROM Quotes Q
+                LEFT JOIN DiscordMembers DM on Q.UniqueMemberID = DM.UniqueMemberID"""
+    return conn.execute(sql + where, values).fetchone()[0]
+
+
+def get_quotes(
+    discord_user_id=None,
+    unique_member_id=None,
+    name=None,
+    quote=None,
+    guild_id=None,
+    conn: sqlite3.Connection | None = None,
+    random=False,
+    limit=None,
+    rank_by_elo=False,
+    quote_id=None,
+    offset=0,
+) -> list[Quote]:
+    """
+    :param random: only returns a single random quote out of all matching quotes
+    """
+    if conn is None:
+        conn = pool.get()
+    if random and quote is None and discord_user_id is None:
+        quote_id = quote_sampler.sample(guild_id, name, unique_member_id)
+        if quote_id is not None:
+            quotes = get_quotes(quote_id=quote_id, guild_id=guild_id, conn=conn)
+            if len(quotes) > 0:
+                return quotes
+            quote_sampler.remove(quote_id)
+        elif name is None or ("%" not in name and "_" not in name):
+            return []
+        # the name can contain LIKE wildcards, which only the query below can match
+    sql = """   SELECT  Q.QuoteID, Q.Quote, Q.Name, Q.UniqueMemberID, Q.CreatedAt, Q.AddedByUniqueMemberID, Q.DiscordGuildID,
+                        DM.UniqueMemberID, DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester,
+                        Q.AmountBattled, Q.AmountWon, Q.Elo
+                FROM Quotes Q
+                LEFT JOIN DiscordMembers DM on Q.UniqueMemberID = DM.UniqueMemberID"""
+    where, values = _quote_filter(
+        discord_user_id, unique_member_id, name, quote, guild_id, quote_id
+    )
+    sql += where
     if random:
         sql += " ORDER BY RANDOM()"
-    if rank_by_elo:
-        sql += " ORDER BY Q.Elo DESC"
+    elif rank_by_elo:
+        # ordered by ID as well, so pages of quotes with the same Elo don't overlap
+        sql += " ORDER BY Q.Elo DESC, Q.QuoteID"
+    else:
+        # without an order the pages could overlap or skip quotes
+        sql += " ORDER BY Q.QuoteID"
     if limit is not None:
-        sql += " LIMIT ?"
-        values.append(limit)
+        sql += " LIMIT ? OFFSET ?"
+        values += [limit, offset]
     result = conn.execute(sql, values).fetchall()
     quotes = []
     for row in result:
@@ -1030,9 +1653,352 @@ def get_quotes(
     return quotes
 
 
+def _fts_query(text: str) -> str:
+    """
+    Turns user input into an FTS5 query matching all words, where the last word can be
+    the start of a longer word. Each word is quoted, so FTS5 operators are taken literally.
+    """
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if len(words) == 0:
+        return ""
+    return " ".join(words) + "*"
+
+
+def search_quotes(
+    text: str, guild_id: int, limit=None, offset=0, conn=None
+) -> list[tuple[Quote, str]]:
+    """
+    Searches the quotes of a guild using the full-text index, best matches first.
+    :return: list of (quote, snippet of the quote with the matches in bold)
+    """
+    if conn is None:
+        conn = pool.get()
+    query = _fts_query(text)
+    if len(query) == 0:
+        return []
+    # the CROSS JOIN makes sqlite look up the matches in the index first instead of
+    # scanning all quotes of the guild and checking each of them against the index
+    sql = """   SELECT  Q.QuoteID, Q.Quote, Q.Name, Q.UniqueMemberID, Q.CreatedAt, Q.AddedByUniqueMemberID,
+                        Q.DiscordGuildID, Q.AmountBattled, Q.AmountWon, Q.Elo,
+                        snippet(QuotesFTS, 0, '**', '**', ' [...] ', 48)
+                FROM QuotesFTS
+                CROSS JOIN Quotes Q on Q.QuoteID = QuotesFTS.rowid
+                WHERE QuotesFTS MATCH ? AND Q.DiscordGuildID=?
+                ORDER BY QuotesFTS.rank
+                LIMIT ? OFFSET ?"""
+    rows = conn.execute(
+        sql, (query, guild_id, -1 if limit is None else limit, offset)
+    ).fetchall()
+    return [(Quote(*row[:10]), row[10]) for row in rows]
+
+
+class BattleWeights:
+    """
+    Draws a quote of a guild with the battle weight `max_battles + 1 - AmountBattled`
+    in O(log n), so quotes that battled less are picked more often.
+
+    Every quote keeps its slot in two Fenwick trees, one counting the quotes and one
+    summing their AmountBattled. The weight of a range of slots is
+    `(max_battles + 1) * count - battles`, so a new max_battles doesn't change any
+    stored value and Elo changes don't move any slot.
+    """
+
+    def __init__(self, quotes: list[Quote]):
+        # slot -> QuoteID, None for the slots of removed quotes
+        self.quote_ids: list[int | None] = [q.QuoteID for q in quotes]
+        self.slots = {q.QuoteID: i for i, q in enumerate(quotes)}  # QuoteID -> slot
+        self.battled = {q.QuoteID: q.AmountBattled for q in quotes}
+        self.free_slots: list[int] = []
+        self.battle_amounts = Counter(self.battled.values())
+        self.max_battles = max(self.battle_amounts, default=0)
+        self.total_battles = sum(self.battled.values())
+        # 1-indexed trees built in O(n)
+        self.counts = [0] + [1] * len(quotes)
+        self.battles = [0] + [q.AmountBattled for q in quotes]
+        for i in range(1, len(self.counts)):
+            parent = i + (i & -i)
+            if parent < len(self.counts):
+                self.counts[parent] += self.counts[i]
+                self.battles[parent] += self.battles[i]
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _add(self, slot: int, count: int, battles: int):
+        i = slot + 1
+        while i < len(self.counts):
+            self.counts[i] += count
+            self.battles[i] += battles
+            i += i & -i
+
+    def _prefix(self, tree: list[int], i: int) -> int:
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _new_slot(self) -> int:
+        if len(self.free_slots) > 0:
+            return self.free_slots.pop()
+        # a new node covers the slots (i - lowbit(i), i], which are all already in the tree
+        i = len(self.counts)
+        low = i - (i & -i)
+        self.counts.append(
+            self._prefix(self.counts, i - 1) - self._prefix(self.counts, low)
+        )
+        self.battles.append(
+            self._prefix(self.battles, i - 1) - self._prefix(self.battles, low)
+        )
+        self.quote_ids.append(None)
+        return i - 1
+
+    def _set_battled(self, quote_id: int, battled: int | None):
+        old = self.battled.pop(quote_id, None)
+        if battled is not None:
+            self.battled[quote_id] = battled
+            self.total_battles += battled
+            self.battle_amounts[battled] += 1
+            self.max_battles = max(self.max_battles, battled)
+        if old is not None:
+            self.total_battles -= old
+            self.battle_amounts[old] -= 1
+            if self.battle_amounts[old] == 0:
+                del self.battle_amounts[old]
+                if old == self.max_battles:
+                    # only happens when the quote with the most battles is removed
+                    self.max_battles = max(self.battle_amounts, default=0)
+
+    def add(self, quote: Quote):
+        if quote.QuoteID in self.slots:
+            return
+        slot = self._new_slot()
+        self.slots[quote.QuoteID] = slot
+        self.quote_ids[slot] = quote.QuoteID
+        self._set_battled(quote.QuoteID, quote.AmountBattled)
+        self._add(slot, 1, quote.AmountBattled)
+
+    def remove(self, quote_id: int):
+        slot = self.slots.pop(quote_id, None)
+        if slot is None:
+            return
+        self._add(slot, -1, -self.battled[quote_id])
+        self._set_battled(quote_id, None)
+        self.quote_ids[slot] = None
+        self.free_slots.append(slot)
+
+    def update(self, quote_id: int, battled: int):
+        slot = self.slots.get(quote_id)
+        if slot is None:
+            return
+        self._add(slot, 0, battled - self.battled[quote_id])
+        self._set_battled(quote_id, battled)
+
+    def draw(self) -> int:
+        """
+        :return: The QuoteID of a quote drawn by its battle weight
+        """
+        if len(self.slots) == 0:
+            raise IndexError("There are no quotes to draw from")
+        tokens = self.max_battles + 1
+        size = len(self.counts) - 1
+        total = tokens * len(self.slots) - self.total_battles
+        while True:
+            target = uniform(0, total)
+            # descends the tree to the first slot whose cumulative weight is above the target
+            pos = 0
+            step = 1 << size.bit_length()
+            while step > 0:
+                nxt = pos + step
+                if nxt <= size:
+                    weight = tokens * self.counts[nxt] - self.battles[nxt]
+                    if weight <= target:
+                        target -= weight
+                        pos = nxt
+                step >>= 1
+            # only fails if the float rounding landed on the total itself
+            if pos < size and self.quote_ids[pos] is not None:
+                return self.quote_ids[pos]
+
+
+class QuoteRanking:
+    """
+    The quotes of every guild kept in memory sorted by Elo. Ranks are found with
+    a binary search instead of loading and sorting all quotes of the guild, and
+    a battle only moves the two battling quotes to their new place.
+    """
+
+    def __init__(self):
+        # DiscordGuildID -> sorted (-Elo, QuoteID)
+        self.keys: dict[int, list[tuple]] = {}
+        self.weights: dict[int, BattleWeights] = {}  # DiscordGuildID -> BattleWeights
+        self.quotes: dict[int, Quote] = {}  # QuoteID -> Quote
+        self.loaded = False
+        # incremented whenever a quote is added, removed or rated. Each guild keeps
+        # the version of its last change, so anything created from the quotes of a
+        # guild can tell if it's outdated without being affected by other guilds
+        self.version = 0
+        self.guild_versions: dict[int, int] = {}  # DiscordGuildID -> version
+        self.reset_version = 0  # version of the last change to all guilds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(quote: Quote) -> tuple:
+        return -quote.Elo, quote.QuoteID
+
+    def _changed(self, guild_id: int | None):
+        """
+        Marks the quotes of the guild as changed. None if the guild isn't known.
+        """
+        self.version += 1
+        if guild_id is None:
+            self.reset_version = self.version
+        else:
+            self.guild_versions[guild_id] = self.version
+
+    def get_version(self, guild_id: int) -> int:
+        return max(self.guild_versions.get(guild_id, 0), self.reset_version)
+
+    def load(self, conn=None):
+        quotes = get_quotes(conn=conn)
+        with self._lock:
+            self.quotes = {q.QuoteID: q for q in quotes}
+            self.keys = {}
+            for q in quotes:
+                self.keys.setdefault(q.DiscordGuildID, []).append(self._key(q))
+            for keys in self.keys.values():
+                keys.sort()
+            quotes_per_guild: dict[int, list[Quote]] = {}
+            for q in quotes:
+                quotes_per_guild.setdefault(q.DiscordGuildID, []).append(q)
+            self.weights = {
+                guild_id: BattleWeights(guild_quotes)
+                for guild_id, guild_quotes in quotes_per_guild.items()
+            }
+            self.loaded = True
+
+    def reset(self):
+        """
+        Forces the quotes to be reloaded on the next lookup
+        """
+        with self._lock:
+            self.loaded = False
+            self._changed(None)
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def _remove(self, quote: Quote):
+        keys = self.keys[quote.DiscordGuildID]
+        del keys[bisect_left(keys, self._key(quote))]
+
+    def add(self, quote: Quote):
+        with self._lock:
+            self._changed(quote.DiscordGuildID)
+            if not self.loaded or quote.QuoteID in self.quotes:
+                return
+            self.quotes[quote.QuoteID] = quote
+            insort(self.keys.setdefault(quote.DiscordGuildID, []), self._key(quote))
+            if quote.DiscordGuildID not in self.weights:
+                self.weights[quote.DiscordGuildID] = BattleWeights([])
+            self.weights[quote.DiscordGuildID].add(quote)
+
+    def remove(self, quote_id: int):
+        with self._lock:
+            quote = self.quotes.pop(quote_id, None)
+            if quote is None:
+                self._changed(None)
+                return
+            self._changed(quote.DiscordGuildID)
+            self._remove(quote)
+            self.weights[quote.DiscordGuildID].remove(quote_id)
+
+    def update(self, quote_id: int, battles_amount: int, battles_won: int, elo):
+        with self._lock:
+            quote = self.quotes.get(quote_id)
+            if quote is None:
+                self._changed(None)
+                return
+            self._changed(quote.DiscordGuildID)
+            self._remove(quote)
+            # a copy, as the old object might still be in use by a running battle
+            quote = copy.copy(quote)
+            quote.AmountBattled = battles_amount
+            quote.AmountWon = battles_won
+            quote.Elo = elo
+            self.quotes[quote_id] = quote
+            insort(self.keys[quote.DiscordGuildID], self._key(quote))
+            self.weights[quote.DiscordGuildID].update(quote_id, battles_amount)
+
+    def rank(self, quote_id: int) -> int:
+        """
+        :return: The rank of the quote in its guild starting at 1, or -1 if the quote doesn't exist
+        """
+        self._ensure_loaded()
+        with self._lock:
+            quote = self.quotes.get(quote_id)
+            if quote is None:
+                return -1
+            return bisect_left(self.keys[quote.DiscordGuildID], self._key(quote)) + 1
+
+    def count(self, guild_id: int) -> int:
+        self._ensure_loaded()
+        return len(self.keys.get(guild_id, []))
+
+    def draw_battle_rank(self, guild_id: int) -> int:
+        """
+        Draws a quote of the guild by its battle weight in O(log n)
+        :return: The rank of the drawn quote starting at 1
+        """
+        self._ensure_loaded()
+        with self._lock:
+            weights = self.weights.get(guild_id)
+            if weights is None:
+                raise IndexError("The guild has no quotes")
+            quote = self.quotes[weights.draw()]
+            return bisect_left(self.keys[guild_id], self._key(quote)) + 1
+
+    def get_quote(self, guild_id: int, rank: int) -> Quote:
+        """
+        :return: The quote with the given rank starting at 1
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self.quotes[self.keys[guild_id][rank - 1][1]]
+
+    def get_quotes(self, guild_id: int, limit=None, offset=0) -> list[Quote]:
+        """
+        :return: The quotes of the guild ordered by Elo, highest first
+        """
+        self._ensure_loaded()
+        with self._lock:
+            keys = self.keys.get(guild_id, [])
+            end = len(keys) if limit is None else offset + limit
+            return [self.quotes[quote_id] for _, quote_id in keys[offset:end]]
+
+
+quote_ranking = QuoteRanking()
+
+
+def count_quote_search(text: str, guild_id: int, conn=None) -> int:
+    if conn is None:
+        conn = pool.get()
+    query = _fts_query(text)
+    if len(query) == 0:
+        return 0
+    sql = """   SELECT COUNT(*)
+                FROM QuotesFTS
+                CROSS JOIN Quotes Q on Q.QuoteID = QuotesFTS.rowid
+                WHERE QuotesFTS MATCH ? AND Q.DiscordGuildID=?"""
+    return conn.execute(sql, (query, guild_id)).fetchone()[0]
+
+
 def get_members_by_name(
-    name, guild_id, discord_user_id=None, conn=connect()
+    name, guild_id, discord_user_id=None, conn=None
 ) -> list[DiscordMember]:
+    if conn is None:
+        conn = pool.get()
     values = [guild_id]
     if discord_user_id is not None:
         fill = "DM.DiscordUserID=?"
@@ -1063,8 +2029,10 @@ def add_quote(
     member: DiscordMember | None,
     added_by: DiscordMember,
     guild_id,
-    conn=connect(),
+    conn=None,
 ) -> Quote | None:
+    if conn is None:
+        conn = pool.get()
     unique_member_id = None
     if member is not None:
         unique_member_id = member.UniqueMemberID
@@ -1076,24 +2044,36 @@ def add_quote(
         ).lastrowid
     finally:
         conn.commit()
-    return get_quote(-1, guild_id=guild_id, row_id=row_id, conn=conn)
+    quote_sampler.add(row_id, guild_id, name, unique_member_id)
+    quote = get_quote(-1, guild_id=guild_id, row_id=row_id, conn=conn)
+    if quote is not None:
+        quote_ranking.add(quote)
+    return quote
 
 
-def delete_quote(quote_id, conn=connect()):
+def delete_quote(quote_id, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute("DELETE FROM Quotes WHERE QuoteID=?", (quote_id,))
     finally:
         conn.commit()
+    quote_sampler.remove(int(quote_id))
+    quote_ranking.remove(int(quote_id))
 
 
-def delete_quote_to_remove(quote_id, conn=connect()):
+def delete_quote_to_remove(quote_id, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute("DELETE FROM main.QuotesToRemove WHERE QuoteID=?", (quote_id,))
     finally:
         conn.commit()
 
 
-def get_quote_aliases(conn=connect()) -> dict[str, str]:
+def get_quote_aliases(conn=None) -> dict[str, str]:
+    if conn is None:
+        conn = pool.get()
     result = conn.execute("SELECT NameFrom, NameTo FROM QuoteAliases").fetchall()
     aliases = {}
     for row in result:
@@ -1101,10 +2081,12 @@ def get_quote_aliases(conn=connect()) -> dict[str, str]:
     return aliases
 
 
-def get_quote_stats(guild_id: int, conn=connect()) -> tuple[int, int, int]:
+def get_quote_stats(guild_id: int, conn=None) -> tuple[int, int, int]:
     """
     :return: (total_quotes, total_names)
     """
+    if conn is None:
+        conn = pool.get()
     total_quotes = conn.execute(
         "SELECT COUNT(*) FROM Quotes WHERE DiscordGuildID = ?", (guild_id,)
     ).fetchone()
@@ -1123,30 +2105,52 @@ def update_quote_battle(
     battles_amount,
     battles_won,
     elo,
-    conn: sqlite3.Connection | None = connect(),
+    conn: sqlite3.Connection | None = None,
 ):
-    if not conn:
-        conn = connect()
+    if conn is None:
+        conn = pool.get()
     sql = "UPDATE Quotes SET AmountBattled=?, AmountWon=?, Elo=? WHERE QuoteID=?"
     try:
         conn.execute(sql, (battles_amount, battles_won, elo, quote_id))
     finally:
         conn.commit()
+    quote_ranking.update(quote_id, battles_amount, battles_won, elo)
 
 
-def get_favorite_quotes_of_user(member: discord.Member, conn=connect()) -> list[Quote]:
+def get_favorite_quotes_of_user(
+    member: discord.Member, conn=None, limit=None, offset=0
+) -> list[Quote]:
+    if conn is None:
+        conn = pool.get()
     dm = get_or_create_discord_member(member, 0, conn)
     sql = """   SELECT Q.QuoteID, Q.Quote, Q.Name, Q.UniqueMemberID,
                        Q.CreatedAt, Q.AddedByUniqueMemberID, Q.DiscordGuildID,
                        Q.AmountBattled, Q.AmountWon, Q.Elo
                 FROM FavoriteQuotes FQ
                 INNER JOIN Quotes Q on FQ.QuoteID = Q.QuoteID
-                WHERE FQ.UniqueMemberID = ?"""
-    rows = conn.execute(sql, (dm.UniqueMemberID,))
+                WHERE FQ.UniqueMemberID = ?
+                ORDER BY FQ.FavoriteID
+                LIMIT ? OFFSET ?"""
+    rows = conn.execute(
+        sql, (dm.UniqueMemberID, -1 if limit is None else limit, offset)
+    )
     return [Quote(*q) for q in rows]
 
 
-def add_favorite_quote(member: discord.Member, quote_id: int, conn=connect()):
+def count_favorite_quotes_of_user(member: discord.Member, conn=None) -> int:
+    if conn is None:
+        conn = pool.get()
+    dm = get_or_create_discord_member(member, 0, conn)
+    sql = """   SELECT COUNT(*)
+                FROM FavoriteQuotes FQ
+                INNER JOIN Quotes Q on FQ.QuoteID = Q.QuoteID
+                WHERE FQ.UniqueMemberID = ?"""
+    return conn.execute(sql, (dm.UniqueMemberID,)).fetchone()[0]
+
+
+def add_favorite_quote(member: discord.Member, quote_id: int, conn=None):
+    if conn is None:
+        conn = pool.get()
     dm = get_or_create_discord_member(member, 0, conn)
     try:
         conn.execute(
@@ -1157,7 +2161,9 @@ def add_favorite_quote(member: discord.Member, quote_id: int, conn=connect()):
         conn.commit()
 
 
-def remove_favorite_quote(member: discord.Member, quote_id: int, conn=connect()):
+def remove_favorite_quote(member: discord.Member, quote_id: int, conn=None):
+    if conn is None:
+        conn = pool.get()
     dm = get_or_create_discord_member(member, 0, conn)
     try:
         conn.execute(
@@ -1177,7 +2183,9 @@ class Name:
         self.member = member
 
 
-def get_quoted_names(guild: discord.Guild, conn=connect()) -> list[Name]:
+def get_quoted_names(guild: discord.Guild, conn=None) -> list[Name]:
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT  COUNT(*), DM.UniqueMemberID, DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester,
                         Q.QuoteID, Q.Quote, Q.Name, Q.UniqueMemberID, Q.CreatedAt, Q.AddedByUniqueMemberID, Q.DiscordGuildID,
                         Q.AmountBattled, Q.AmountWon, Q.Elo
@@ -1204,7 +2212,9 @@ class QuoteToRemove:
         self.Reason = reason
 
 
-def get_quotes_to_remove(guild_id, conn=connect()) -> list[QuoteToRemove]:
+def get_quotes_to_remove(guild_id, conn=None) -> list[QuoteToRemove]:
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT  DM.UniqueMemberID, DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester, --Quote Member
                         Q.QuoteID, Q.Quote, Q.Name, Q.UniqueMemberID, Q.CreatedAt, Q.AddedByUniqueMemberID, Q.DiscordGuildID, Q.AmountBattled,
                         Q.AmountWon, Q.Elo, -- Quote
@@ -1225,7 +2235,9 @@ def get_quotes_to_remove(guild_id, conn=connect()) -> list[QuoteToRemove]:
     return quotes_to_remove
 
 
-def get_quotes_to_remove_name(guild_id, conn=connect()) -> list[QuoteToRemove]:
+def get_quotes_to_remove_name(guild_id, conn=None) -> list[QuoteToRemove]:
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT  Q.QuoteID, Q.Quote, Q.Name, Q.UniqueMemberID, Q.CreatedAt, Q.AddedByUniqueMemberID, Q.DiscordGuildID, Q.AmountBattled,
                         Q.AmountWon, Q.Elo, -- Quote
                         REP.UniqueMemberID, REP.DiscordUserID, REP.DiscordGuildID, REP.JoinedAt, REP.Nickname, REP.Semester, -- Reporter
@@ -1243,9 +2255,9 @@ def get_quotes_to_remove_name(guild_id, conn=connect()) -> list[QuoteToRemove]:
     return quotes_to_remove
 
 
-def insert_quote_to_remove(
-    quote_id, reason: str, member: DiscordMember, conn=connect()
-):
+def insert_quote_to_remove(quote_id, reason: str, member: DiscordMember, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         # UniqueMemberID is the reporter's unique ID in this case
         conn.execute(
@@ -1256,7 +2268,9 @@ def insert_quote_to_remove(
         conn.commit()
 
 
-def get_reputations(member: discord.Member, conn=connect()) -> list[tuple[bool, str]]:
+def get_reputations(member: discord.Member, conn=None) -> list[tuple[bool, str]]:
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT R.IsPositive, R.ReputationMessage
                 FROM Reputations R
                 INNER JOIN DiscordMembers DM on R.UniqueMemberID = DM.UniqueMemberID
@@ -1269,7 +2283,9 @@ def get_reputations(member: discord.Member, conn=connect()) -> list[tuple[bool,
     return reputations
 
 
-def get_most_recent_time(member: DiscordMember, conn=connect()):
+def get_most_recent_time(member: DiscordMember, conn=None):
+    if conn is None:
+        conn = pool.get()
     result = conn.execute(
         "SELECT CreatedAt from Reputations WHERE AddedByUniqueMemberID=? ORDER BY CreatedAt DESC",
         (member.UniqueMemberID,),
@@ -1285,8 +2301,10 @@ def add_reputation(
     receiver: DiscordMember,
     reputation_message: str,
     is_positive: bool,
-    conn=connect(),
+    conn=None,
 ):
+    if conn is None:
+        conn = pool.get()
     sql = "INSERT INTO Reputations(UniqueMemberID, ReputationMessage, AddedByUniqueMemberID, IsPositive) VALUES (?,?,?,?)"
     try:
         conn.execute(
@@ -1308,22 +2326,26 @@ class VoiceLevel:
         self.experience = experience
 
 
-def get_voice_level(member: discord.Member, conn=connect()) -> VoiceLevel:
+def get_voice_level(member: discord.Member, conn=None) -> VoiceLevel:
+    if conn is None:
+        conn = pool.get()
     sql = """   SELECT VL.ExperienceAmount, DM.UniqueMemberID, DM.DiscordUserID, DM.DiscordGuildID, DM.JoinedAt, DM.Nickname, DM.Semester
                 FROM VoiceLevels VL
                 INNER JOIN DiscordMembers DM on VL.UniqueMemberID = DM.UniqueMemberID
                 WHERE DM.DiscordUserID=? AND DM.DiscordGuildID=?"""
     result = conn.execute(sql, (member.id, member.guild.id)).fetchone()
     if result is None:
-        insert_or_update_voice_level(member, conn=connect())
+        insert_or_update_voice_level(member, conn=conn)
         return get_voice_level(member, conn)
     ret_member = DiscordMember(*result[1:])
     return VoiceLevel(ret_member, result[0])
 
 
 def insert_or_update_voice_level(
-    member: discord.Member, experience_amount=0, conn=connect()
+    member: discord.Member, experience_amount=0, conn=None
 ):
+    if conn is None:
+        conn = pool.get()
     discord_member = get_or_create_discord_member(member, conn=conn)
     sql = """   UPDATE OR IGNORE VoiceLevels
                 SET ExperienceAmount = ExperienceAmount + ?
@@ -1344,14 +2366,40 @@ def insert_or_update_voice_level(
             conn.commit()
 
 
+def add_voice_levels(experience: list[tuple[discord.Member, int]], conn=None):
+    """
+    Adds experience to multiple members in a single transaction
+    :param experience: list of (member, experience amount) pairs
+    """
+    if conn is None:
+        conn = pool.get()
+    values = []
+    for member, amount in experience:
+        discord_member = get_or_create_discord_member(member, conn=conn)
+        values.append((discord_member.UniqueMemberID, amount))
+    if len(values) == 0:
+        return
+    sql = """   INSERT INTO VoiceLevels(UniqueMemberID, ExperienceAmount) VALUES (?,?)
+                ON CONFLICT(UniqueMemberID) DO UPDATE SET ExperienceAmount = ExperienceAmount + excluded.ExperienceAmount"""
+    try:
+        conn.executemany(sql, values)
+        conn.commit()
+    except Exception:
+        # either all xp is written or none, so it can be retried
+        conn.rollback()
+        raise
+
+
 def get_command_level(
     command_name: str,
     user_id: int,
     role_ids: list[int],
     channel_id: int,
     guild_id: int,
-    conn=connect(),
+    conn=None,
 ) -> int:
+    if conn is None:
+        conn = pool.get()
     command_name = command_name.lower()
     role_or_msg = " OR ID = ?" * len(role_ids)
     result = conn.execute(
@@ -1406,8 +2454,34 @@ class CommandLevel:
             elif tag == "USER":
                 self.user_levels[ID] = perm_level
 
-
-def get_all_command_levels(command_name: str, conn=connect()) -> CommandLevel:
+    def get_level(
+        self, user_id: int, role_ids: list[int], channel_id: int, guild_id: int
+    ) -> int:
+        """
+        Same hierarchy as get_command_level: USER > ROLE > CHANNEL > GUILD.
+        If a single role allows the command, the command is allowed for all roles.
+        """
+        user_level = self.user_levels.get(user_id, 0)
+        if user_level != 0:
+            return user_level
+        role_level = 0
+        for role_id in role_ids:
+            level = self.role_levels.get(role_id, 0)
+            if level == 1:
+                return 1
+            if level != 0:
+                role_level = level
+        if role_level != 0:
+            return role_level
+        channel_level = self.channel_levels.get(channel_id, 0)
+        if channel_level != 0:
+            return channel_level
+        return self.guild_levels.get(guild_id, 0)
+
+
+def get_all_command_levels(command_name: str, conn=None) -> CommandLevel:
+    if conn is None:
+        conn = pool.get()
     command_name = command_name.lower()
     result = conn.execute(
         "SELECT ID, PermissionLevel, Tag FROM CommandPermissions WHERE CommandName=?",
@@ -1416,13 +2490,62 @@ def get_all_command_levels(command_name: str, conn=connect()) -> CommandLevel:
     return CommandLevel(command_name, result)
 
 
+class PermissionIndex:
+    """
+    All command permissions kept in memory, so the permission check before
+    every command doesn't have to query the db
+    """
+
+    def __init__(self):
+        self.commands: dict[str, CommandLevel] = {}
+        self.loaded = False
+
+    def load(self, conn=None):
+        if conn is None:
+            conn = pool.get()
+        rows = conn.execute(
+            "SELECT CommandName, ID, PermissionLevel, Tag FROM CommandPermissions"
+        ).fetchall()
+        grouped: dict[str, list] = {}
+        for row in rows:
+            grouped.setdefault(row[0], []).append(row[1:])
+        self.commands = {
+            name: CommandLevel(name, args) for name, args in grouped.items()
+        }
+        self.loaded = True
+
+    def reload_command(self, command_name: str, conn=None):
+        command_level = get_all_command_levels(command_name, conn)
+        self.commands[command_level.name] = command_level
+
+    def get_level(
+        self,
+        command_name: str,
+        user_id: int,
+        role_ids: list[int],
+        channel_id: int,
+        guild_id: int,
+    ) -> int:
+        if not self.loaded:
+            self.load()
+        command_level = self.commands.get(command_name.lower())
+        if command_level is None:
+            return 0
+        return command_level.get_level(user_id, role_ids, channel_id, guild_id)
+
+
+permission_index = PermissionIndex()
+
+
 def insert_or_update_command_level(
     command_name: str,
     ID: int,
     permission_level: int,
     object_being_added: str,
-    conn=connect(),
+    conn=None,
 ):
+    if conn is None:
+        conn = pool.get()
     command_name = command_name.lower()
     if permission_level == 0:
         # delete entry if perm level is 0
@@ -1433,6 +2556,7 @@ def insert_or_update_command_level(
             )
         finally:
             conn.commit()
+        permission_index.reload_command(command_name, conn)
         return
     sql = """   UPDATE OR IGNORE CommandPermissions
                 SET PermissionLevel = ?
@@ -1449,6 +2573,7 @@ def insert_or_update_command_level(
             )
         finally:
             conn.commit()
+    permission_index.reload_command(command_name, conn)
 
 
 ##########################
@@ -1466,12 +2591,13 @@ def add_course(
     role_id: int,
     link: str | None = None,
 ):
-    conn = connect()
+    conn = pool.get()
     sql = "INSERT INTO Courses(Abbreviation, Name, GuildId, DiscordChannelId, DiscordRoleId, Link) VALUES (?,?,?,?,?,?)"
     try:
         conn.execute(sql, (abbreviation, name, guild_id, channel_id, role_id, link))
     finally:
         conn.commit()
+    lecture_timetable.reset()
 
 
 def update_course(
@@ -1482,21 +2608,23 @@ def update_course(
     role_id: int,
     link: str | None = None,
 ):
-    conn = connect()
+    conn = pool.get()
     sql = "UPDATE Courses SET Name=?, Link=?, Abbreviation=?, channel_id=?, role_id=? WHERE CourseId=?"
     try:
         conn.execute(sql, (name, link, abbreviation, channel_id, role_id, course_id))
     finally:
         conn.commit()
+    lecture_timetable.reset()
 
 
 def delete_course(course_id: int):
-    conn = connect()
+    conn = pool.get()
     sql = "DELETE FROM Courses WHERE CourseId=?"
     try:
         conn.execute(sql, (course_id,))
     finally:
         conn.commit()
+    lecture_timetable.reset()
 
 
 def weekday_to_id(day: str):
@@ -1523,7 +2651,7 @@ def add_lecture(
     secondary_link: str | None = None,
     on_site_location: str | None = None,
 ):
-    conn = connect()
+    conn = pool.get()
     sql = "SELECT CourseId FROM Courses WHERE GuildId = ? AND Abbreviation = ?"
     res = conn.execute(sql, (guild_id, abbreviation)).fetchone()
     if not res:
@@ -1547,6 +2675,7 @@ def add_lecture(
         )
     finally:
         conn.commit()
+    lecture_timetable.reset()
     return True
 
 
@@ -1560,7 +2689,7 @@ def update_lecture(
     secondary_link: str | None = None,
     on_site_location: str | None = None,
 ):
-    conn = connect()
+    conn = pool.get()
     sql = "SELECT CourseId FROM Courses WHERE GuildId = ? AND Abbreviation = ?"
     res = conn.execute(sql, (guild_id, abbreviation)).fetchone()
     if not res:
@@ -1584,10 +2713,11 @@ def update_lecture(
         )
     finally:
         conn.commit()
+    lecture_timetable.reset()
 
 
 def get_abbreviations(guild_id: int, cur=""):
-    conn = connect()
+    conn = pool.get()
     sql = "SELECT Abbreviation FROM Courses WHERE GuildId = ? AND Abbreviation LIKE ?"
     res = conn.execute(sql, (guild_id, cur + "%")).fetchall()
     res = [x[0] for x in res]
@@ -1595,21 +2725,21 @@ def get_abbreviations(guild_id: int, cur=""):
 
 
 def get_course_ids(guild_id: int, cur=""):
-    conn = connect()
+    conn = pool.get()
     sql = "SELECT CourseId, Abbreviation FROM Courses WHERE GuildId = ? AND CourseId+'' LIKE ?"
     res = conn.execute(sql, (guild_id, cur + "%")).fetchall()
     return res
 
 
 def get_courses(guild_id: int):
-    conn = connect()
+    conn = pool.get()
     sql = "SELECT CourseId, Abbreviation, GuildId, Name, Link, DiscordChannelId, DiscordRoleId FROM Courses WHERE GuildId=?"
     res = conn.execute(sql, (guild_id,))
     return res.fetchall()
 
 
 def get_single_course(course_id: int, guild_id=-1):
-    conn = connect()
+    conn = pool.get()
     sql = "SELECT CourseId, Abbreviation, GuildId, Name, Link FROM Courses WHERE CourseId=?"
     values = [course_id]
     if guild_id != -1:
@@ -1620,7 +2750,7 @@ def get_single_course(course_id: int, guild_id=-1):
 
 
 def get_single_lecture(lecture_id: int, guild_id=-1):
-    conn = connect()
+    conn = pool.get()
     sql = """SELECT Abbreviation, DayId, HourFrom, MinuteFrom, StreamLink, SecondaryLink, OnSiteLocation
     FROM Lectures l
     INNER JOIN Courses c USING (CourseId)
@@ -1633,7 +2763,7 @@ def get_single_lecture(lecture_id: int, guild_id=-1):
 
 
 def get_lectures(abbreviation: str, guild_id: int):
-    conn = connect()
+    conn = pool.get()
     sql = """SELECT LectureId, DayId, HourFrom, MinuteFrom, StreamLink, SecondaryLink, OnSiteLocation, Name
     FROM Lectures l
     INNER JOIN Courses c USING (CourseId)
@@ -1642,7 +2772,7 @@ def get_lectures(abbreviation: str, guild_id: int):
 
 
 def get_lecture_id(abbreviation: str, guild_id: int) -> int | None:
-    conn = connect()
+    conn = pool.get()
     sql = """SELECT LectureId
     FROM Lectures l
     INNER JOIN Courses c USING (CourseId)
@@ -1652,45 +2782,102 @@ def get_lecture_id(abbreviation: str, guild_id: int) -> int | None:
 
 
 def delete_lecture(lecture_id: int):
-    conn = connect()
+    conn = pool.get()
     sql = "DELETE FROM Lectures WHERE LectureId=?"
     try:
         conn.execute(sql, (lecture_id,))
     finally:
         conn.commit()
+    lecture_timetable.reset()
 
 
 def get_lecture_ids(guild_id: int, cur=""):
-    conn = connect()
+    conn = pool.get()
     sql = "SELECT LectureId, Abbreviation FROM Lectures INNER JOIN Courses USING (CourseId) WHERE GuildId = ? AND LectureId+'' LIKE ?"
     res = conn.execute(sql, (guild_id, cur + "%")).fetchall()
     return res
 
 
-def get_lectures_by_time(day: str, hour: int, minute: int):
-    conn = connect()
-    sql = """SELECT c.Name, c.DiscordRoleId, c.DiscordChannelId, c.Link, l.StreamLink, l.SecondaryLink, l.OnSiteLocation, l.CourseId
-        FROM Courses c
-        INNER JOIN Lectures l USING (CourseId)
-        WHERE l.HourFrom=? AND l.MinuteFrom=? AND l.DayId=?
+class LectureTimetable:
+    """
+    All lectures of the week kept in memory by their start time, so the lecture
+    updates don't have to query the db at every possible start time.
+    The timetable is rebuilt on the next lookup after a course or lecture changes.
+    Listeners are called after every change, for example to reschedule the lecture updates.
+    """
+
+    def __init__(self):
+        # (DayId, HourFrom, MinuteFrom) -> rows in the format of get_lectures_by_time
+        self.lectures: dict[tuple[int, int, int], list[tuple]] = {}
+        self.listeners: list = []
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, conn=None):
+        if conn is None:
+            conn = pool.get()
+        sql = """SELECT l.DayId, l.HourFrom, l.MinuteFrom, c.Name, c.DiscordRoleId, c.DiscordChannelId, c.Link,
+                        l.StreamLink, l.SecondaryLink, l.OnSiteLocation, l.CourseId
+            FROM Courses c
+            INNER JOIN Lectures l USING (CourseId)
+            ORDER BY l.LectureId"""
+        rows = conn.execute(sql).fetchall()
+        with self._lock:
+            self.lectures = {}
+            for row in rows:
+                self.lectures.setdefault(tuple(row[:3]), []).append(tuple(row[3:]))
+            self.loaded = True
+
+    def reset(self):
+        """
+        Forces the timetable to be rebuilt on the next lookup
+        """
+        with self._lock:
+            self.loaded = False
+        for listener in self.listeners:
+            listener()
+
+    def get(self, day_id: int, hour: int, minute: int) -> list[tuple]:
+        if not self.loaded:
+            self.load()
+        return list(self.lectures.get((day_id, hour, minute), []))
+
+    def get_times(self) -> list[tuple[int, int]]:
         """
-    users = conn.execute(sql, (hour, minute, weekday_to_id(day))).fetchall()
-    return users
+        :return: sorted (hour, minute) of every time at which a lecture starts on any weekday
+        """
+        if not self.loaded:
+            self.load()
+        # DayId 7 is "None", which is never announced
+        return sorted({(h, m) for day_id, h, m in self.lectures if day_id < 7})
+
+
+lecture_timetable = LectureTimetable()
+
+
+def get_lectures_by_time(day: str, hour: int, minute: int):
+    return lecture_timetable.get(weekday_to_id(day), hour, minute)
 
 
-def get_steal_emote_servers(user_id: int, conn=connect()) -> list[int]:
+def get_steal_emote_servers(user_id: int, conn=None) -> list[int]:
+    if conn is None:
+        conn = pool.get()
     sql = """SELECT GuildID FROM StealEmote WHERE UserID = ?"""
     user_ids = conn.execute(sql, (user_id,)).fetchall()
     return [x[0] for x in user_ids]
 
 
-def add_steal_emote_server(user_id: int, guild_id: int, conn=connect()):
+def add_steal_emote_server(user_id: int, guild_id: int, conn=None):
+    if conn is None:
+        conn = pool.get()
     sql = """INSERT INTO StealEmote(UserID, GuildID) VALUES (?, ?)"""
     conn.execute(sql, (user_id, guild_id))
     conn.commit()
 
 
-def remove_steal_emote_server(user_id: int, guild_id: int, conn=connect()):
+def remove_steal_emote_server(user_id: int, guild_id: int, conn=None):
+    if conn is None:
+        conn = pool.get()
     sql = """DELETE FROM StealEmote WHERE UserID = ? AND GuildID = ?"""
     conn.execute(sql, (user_id, guild_id))
     conn.commit()
@@ -1707,9 +2894,9 @@ class MessageLimit:
         return self.first_message_at + 86400  # 24 hours later
 
 
-def get_message_limit(
-    user_id: int, channel_id: int, conn=connect()
-) -> MessageLimit | None:
+def get_message_limit(user_id: int, channel_id: int, conn=None) -> MessageLimit | None:
+    if conn is None:
+        conn = pool.get()
     sql = """SELECT UserID, ChannelID, MessageCount, FirstMessageAt FROM LimitMessages WHERE UserID = ? AND ChannelID = ?"""
     results = conn.execute(sql, (user_id, channel_id)).fetchone()
     if results is None:
@@ -1722,7 +2909,9 @@ def get_message_limit(
     )
 
 
-def get_all_message_limits(user_id: int, conn=connect()) -> list[MessageLimit]:
+def get_all_message_limits(user_id: int, conn=None) -> list[MessageLimit]:
+    if conn is None:
+        conn = pool.get()
     sql = """SELECT UserID, ChannelID, MessageCount, FirstMessageAt FROM LimitMessages WHERE UserID = ?"""
     results = conn.execute(sql, (user_id,)).fetchall()
     limits = []
@@ -1738,7 +2927,9 @@ def get_all_message_limits(user_id: int, conn=connect()) -> list[MessageLimit]:
     return limits
 
 
-def increment_message_limit(user_id: int, channel_id: int, amount=1, conn=connect()):
+def increment_message_limit(user_id: int, channel_id: int, amount=1, conn=None):
+    if conn is None:
+        conn = pool.get()
     sql = """UPDATE LimitMessages SET MessageCount = MessageCount + ? WHERE UserID = ? AND ChannelID = ?"""
     try:
         rows_changed = conn.execute(sql, (amount, user_id, channel_id)).rowcount
@@ -1752,8 +2943,10 @@ def increment_message_limit(user_id: int, channel_id: int, amount=1, conn=connec
 
 
 def reset_message_limit(
-    user_id: int, channel_id: int, first_message_at: int, reset_amount=0, conn=connect()
+    user_id: int, channel_id: int, first_message_at: int, reset_amount=0, conn=None
 ):
+    if conn is None:
+        conn = pool.get()
     sql = """UPDATE LimitMessages SET MessageCount = ?, FirstMessageAt = ? WHERE UserID = ? AND ChannelID = ?"""
     try:
         conn.execute(sql, (reset_amount, first_message_at, user_id, channel_id))
@@ -1761,14 +2954,18 @@ def reset_message_limit(
         conn.commit()
 
 
-def delete_message_limits(channel_id: int, conn=connect()):
+def delete_message_limits(channel_id: int, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute("DELETE FROM LimitMessages WHERE ChannelID=?", (channel_id,))
     finally:
         conn.commit()
 
 
-def get_channel_limit(channel_id, conn=connect()) -> int | None:
+def get_channel_limit(channel_id, conn=None) -> int | None:
+    if conn is None:
+        conn = pool.get()
     result = conn.execute(
         "SELECT MessageLimit FROM MessageLimitChannels WHERE ChannelID=?", (channel_id,)
     ).fetchone()
@@ -1783,7 +2980,9 @@ class MessageLimitChannel:
     message_limit: int
 
 
-def get_message_limit_channels(conn=connect()) -> dict[int, MessageLimitChannel]:
+def get_message_limit_channels(conn=None) -> dict[int, MessageLimitChannel]:
+    if conn is None:
+        conn = pool.get()
     results = conn.execute(
         "SELECT ChannelID, MessageLimit FROM MessageLimitChannels"
     ).fetchall()
@@ -1793,7 +2992,9 @@ def get_message_limit_channels(conn=connect()) -> dict[int, MessageLimitChannel]
     return channels
 
 
-def insert_or_update_message_limit_channel(channel_id, limit_amount, conn=connect()):
+def insert_or_update_message_limit_channel(channel_id, limit_amount, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         rows_changed = conn.execute(
             "UPDATE OR IGNORE MessageLimitChannels SET MessageLimit=? WHERE ChannelID=?",
@@ -1808,7 +3009,9 @@ def insert_or_update_message_limit_channel(channel_id, limit_amount, conn=connec
         conn.commit()
 
 
-def delete_message_channel_limit(channel_id, conn=connect()):
+def delete_message_channel_limit(channel_id, conn=None):
+    if conn is None:
+        conn = pool.get()
     try:
         conn.execute(
             "DELETE FROM MessageLimitChannels WHERE ChannelID=?", (channel_id,)
@@ -219,7 +219,9 @@ all_tables = [
 ]
 
 
-def create_tables(conn=connect()):
+def create_tables(conn=None):
+    if conn is None:
+        conn = connect()
     try:
         for table in all_tables:
             conn.execute(table)
@@ -230,6 +232,69 @@ def create_tables(conn=connect()):
         conn.close()
 
 
+# Schema changes on top of the tables above. Every migration is run exactly once and in order.
+# The version of the last applied migration is stored in the user_version of the db.
+migrations = [
+    # 1: indexes for the hot lookup paths
+    [
+        "CREATE INDEX IF NOT EXISTS idx_discordmembers_user_guild ON DiscordMembers(DiscordUserID, DiscordGuildID)",
+        "CREATE INDEX IF NOT EXISTS idx_userstatistics_member ON UserStatistics(UniqueMemberID)",
+        "CREATE INDEX IF NOT EXISTS idx_quotes_guild_elo ON Quotes(DiscordGuildID, Elo)",
+        "CREATE INDEX IF NOT EXISTS idx_quotes_guild_name ON Quotes(DiscordGuildID, Name)",
+        "CREATE INDEX IF NOT EXISTS idx_commandpermissions_command_id ON CommandPermissions(CommandName, ID)",
+        "CREATE INDEX IF NOT EXISTS idx_lectures_time ON Lectures(DayId, HourFrom, MinuteFrom)",
+    ],
+    # 2: full-text index of the quotes. The triggers keep it in sync with the Quotes table
+    # and only fire if the text changes, so Elo updates don't touch the index.
+    [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS QuotesFTS USING fts5(
+            Quote, content='Quotes', content_rowid='QuoteID', tokenize='unicode61'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON Quotes BEGIN
+            INSERT INTO QuotesFTS(rowid, Quote) VALUES (new.QuoteID, new.Quote);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON Quotes BEGIN
+            INSERT INTO QuotesFTS(QuotesFTS, rowid, Quote) VALUES ('delete', old.QuoteID, old.Quote);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS quotes_fts_update AFTER UPDATE OF Quote ON Quotes BEGIN
+            INSERT INTO QuotesFTS(QuotesFTS, rowid, Quote) VALUES ('delete', old.QuoteID, old.Quote);
+            INSERT INTO QuotesFTS(rowid, Quote) VALUES (new.QuoteID, new.Quote);
+        END""",
+        "INSERT INTO QuotesFTS(QuotesFTS) VALUES ('rebuild')",
+    ],
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn=None) -> int:
+    """
+    Applies all migrations that haven't been applied to the db yet
+    :return: The schema version of the db
+    """
+    if conn is None:
+        conn = connect()
+    try:
+        version = get_schema_version(conn)
+        for i, statements in enumerate(migrations[version:], start=version + 1):
+            try:
+                conn.execute("BEGIN")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {i}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"Applied migration {i}")
+            version = i
+        return version
+    finally:
+        conn.close()
+
+
 def get_table_name(table: str) -> str:
     spl = table.replace('"', "").split(" ")
     return spl[spl.index("(\n") - 1]  # gets the word right before the opening bracket
@@ -263,7 +328,9 @@ def compare_headers(table: str, header: list[str]):
             )
 
 
-def check_columns(conn=connect()):
+def check_columns(conn=None):
+    if conn is None:
+        conn = connect()
     for table in all_tables:
         name = get_table_name(table)
         conn.row_factory = sqlite3.Row
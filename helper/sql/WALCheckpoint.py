@@ -0,0 +1,49 @@
+"""
+Writes the WAL file back into the db file every SQLITE_CHECKPOINT_INTERVAL seconds.
+
+The checkpoints belong to the storage and not to any cog, so the loop is started
+and stopped by the bot itself. Reloading a cog can't stop it and let the WAL
+file grow:
+
+    from helper.sql import WALCheckpoint
+    WALCheckpoint.start()
+"""
+
+from discord.ext import tasks
+
+from helper.log import log
+from helper.sql import AsyncSQLFunctions, SQLFunctions
+
+
+async def checkpoint():
+    """
+    Writes the WAL file back into the db file, so the db file is complete by itself
+    """
+    try:
+        busy, frames, checkpointed, duration = await AsyncSQLFunctions.checkpoint_wal()
+    except Exception as e:
+        log(f"WAL checkpoint failed: {e}", warning=True)
+        return
+    log(
+        f"WAL checkpoint: {checkpointed}/{frames} frames in {round(duration * 1000, 2)}ms"
+        + (" (busy)" if busy else ""),
+        print_it=False,
+        warning=bool(busy),
+    )
+
+
+@tasks.loop(seconds=300)
+async def background_checkpoint():
+    await checkpoint()
+
+
+def start():
+    background_checkpoint.change_interval(
+        seconds=SQLFunctions.StorageConfig.from_env().checkpoint_interval
+    )
+    if not background_checkpoint.is_running():
+        background_checkpoint.start()
+
+
+def stop():
+    background_checkpoint.cancel()